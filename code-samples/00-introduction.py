@@ -1,31 +1,45 @@
-from semantic_kernel import Kernel
-from semantic_kernel.connectors.ai.open_ai import AzureChatCompletion
 from semantic_kernel.functions import KernelArguments
 import os
+import sys
 import asyncio
 import time
-from dotenv import load_dotenv
 
-kernel = Kernel()
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from helpers.response_cache import ResponseCache
+from helpers.kernel_factory import KernelFactory
+from helpers.streaming import print_stream
 
-load_dotenv()
+#the service and the parsed prompt templates come from the process wide factory, see helpers/kernel_factory.py
+factory = KernelFactory.default()
+service_id = factory.service_id
+kernel = factory.create_kernel(prompt_plugins=["basic_plugin"])
 
-service_id = "default"
-kernel.add_service(
-    AzureChatCompletion(service_id=service_id,
-                        api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-                        deployment_name=os.getenv("AZURE_OPENAI_CHAT_COMPLETION_MODEL"),
-                        endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
-    )
-)
+plugin = kernel.get_plugin("basic_plugin")
 
-plugin = kernel.add_plugin(parent_directory = "../plugins/prompt_templates/", plugin_name = "basic_plugin")
+#repeated calls with the same rendered prompt and settings are answered from the cache instead of the LLM,
+#basic_plugin-greeting runs at temperature 0.7, which the default policy would bypass, so it is opted in explicitly
+response_cache = ResponseCache(
+    disk_path=os.path.join(
+        os.getenv("RESPONSE_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".response_cache")),
+        "responses.bin",
+    ),
+    include={"basic_plugin-greeting"},
+).register(kernel)
 
 greeting_function = plugin["greeting"]
 
 async def greeting():
     return await kernel.invoke(greeting_function, KernelArguments(name="kuljot", age="18"))
 
-greeting_response =  asyncio.run(greeting())
+#with STREAM_OUTPUT set the greeting is printed token by token while the model is still writing it
+async def greeting_stream():
+    return await print_stream(kernel.invoke_stream(greeting_function, KernelArguments(name="kuljot", age="18")))
 
-print(greeting_response)
\ No newline at end of file
+if os.getenv("STREAM_OUTPUT"):
+    stream_stats = asyncio.run(greeting_stream())
+    print(f"time to first token: {stream_stats['time_to_first_chunk_ms']} ms, total: {stream_stats['total_ms']} ms")
+else:
+    greeting_response =  asyncio.run(greeting())
+
+    print(greeting_response)
+print(f"response cache: {response_cache.report()}")
\ No newline at end of file
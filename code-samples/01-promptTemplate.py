@@ -1,27 +1,42 @@
-from semantic_kernel import Kernel
-from semantic_kernel.connectors.ai.open_ai import AzureChatCompletion
 from semantic_kernel.functions import KernelArguments
 import os
-from dotenv import load_dotenv
+import sys
 import asyncio
-kernel = Kernel()
 
-service_id = "default"
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from helpers.response_cache import ResponseCache
+from helpers.kernel_factory import KernelFactory
+from helpers.streaming import print_stream
 
-load_dotenv()
-kernel.add_service(
-    AzureChatCompletion(service_id=service_id,
-                        api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-                        deployment_name=os.getenv("AZURE_OPENAI_CHAT_COMPLETION_MODEL"),
-                        endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
-    )
-)
+#the service and the parsed prompt templates come from the process wide factory, see helpers/kernel_factory.py
+factory = KernelFactory.default()
+service_id = factory.service_id
+kernel = factory.create_kernel(prompt_plugins=["basic_plugin"])
 
-plugin = kernel.add_plugin(parent_directory="../plugins/prompt_templates/", plugin_name="basic_plugin")
+plugin = kernel.get_plugin("basic_plugin")
+
+#repeated calls with the same rendered prompt and settings are answered from the cache instead of the LLM,
+#basic_plugin-contact_information runs at temperature 0.7, which the default policy would bypass, so it is opted in explicitly
+response_cache = ResponseCache(
+    disk_path=os.path.join(
+        os.getenv("RESPONSE_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".response_cache")),
+        "responses.bin",
+    ),
+    include={"basic_plugin-contact_information"},
+).register(kernel)
 
 contact_function = plugin["contact_information"]
 
 async def contact():
     return await kernel.invoke(contact_function, KernelArguments(name="kuljot", contact_number="1234567890", email_id="hello@gmail.com", address="1234, 5th Avenue, New York, NY 10001"))
 
-print(asyncio.run(contact()))
+#with STREAM_OUTPUT set the answer is printed token by token while the model is still writing it
+async def contact_stream():
+    return await print_stream(kernel.invoke_stream(contact_function, KernelArguments(name="kuljot", contact_number="1234567890", email_id="hello@gmail.com", address="1234, 5th Avenue, New York, NY 10001")))
+
+if os.getenv("STREAM_OUTPUT"):
+    stream_stats = asyncio.run(contact_stream())
+    print(f"time to first token: {stream_stats['time_to_first_chunk_ms']} ms, total: {stream_stats['total_ms']} ms")
+else:
+    print(asyncio.run(contact()))
+print(f"response cache: {response_cache.report()}")
@@ -1,5 +1,6 @@
 import asyncio
 import os
+import sys
 from dotenv import load_dotenv
 from semantic_kernel.connectors.ai.open_ai import AzureChatCompletion
 from semantic_kernel import Kernel
@@ -8,20 +9,28 @@ from typing import Annotated
 
 from semantic_kernel.functions.kernel_function_decorator import kernel_function
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from helpers.mock_chat_completion import MockChatCompletion
+from helpers.math_plugin import BatchMath
+
 kernel = Kernel()
 load_dotenv()
 
 service_id = "default"
-kernel.add_service(
-    AzureChatCompletion(service_id=service_id,
-                        api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-                        deployment_name=os.getenv("AZURE_OPENAI_CHAT_COMPLETION_MODEL"),
-                        endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
+if os.getenv("MOCK_CHAT_COMPLETION"):
+    #offline run against the local stand-in service, see helpers/mock_chat_completion.py
+    kernel.add_service(MockChatCompletion.from_env(service_id))
+else:
+    kernel.add_service(
+        AzureChatCompletion(service_id=service_id,
+                            api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+                            deployment_name=os.getenv("AZURE_OPENAI_CHAT_COMPLETION_MODEL"),
+                            endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
+        )
     )
-)
 
 
-class Math:
+class Math(BatchMath):
     """
     Description: MathPlugin provides a set of functions to make Math calculations.
 
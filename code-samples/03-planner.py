@@ -1,56 +1,61 @@
-from semantic_kernel import Kernel
 import os
+import sys
 import asyncio
-from semantic_kernel.connectors.ai.open_ai import AzureChatCompletion
-from dotenv import load_dotenv
 from semantic_kernel.planners import SequentialPlanner
-kernel = Kernel()
+from semantic_kernel.functions import KernelArguments
 
-service_id = "default"
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from helpers.summarise import MapReduceSummariser
+from helpers.plan_cache import PlanCache, CachedSequentialPlanner
+from helpers.kernel_factory import KernelFactory
 
-load_dotenv()
-kernel.add_service(
-    AzureChatCompletion(service_id=service_id,
-                        api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-                        deployment_name=os.getenv("AZURE_OPENAI_CHAT_COMPLETION_MODEL"),
-                        endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
-    )
-)
+#the service and the parsed prompt templates come from the process wide factory, see helpers/kernel_factory.py
+factory = KernelFactory.default()
+service_id = factory.service_id
+kernel = factory.create_kernel(prompt_plugins=["writerPlugin"])
 
-planner = SequentialPlanner(
+#plans are cached per goal template and plugin manifest, a repeated goal skips the planning LLM call
+planner = CachedSequentialPlanner(
+    SequentialPlanner(kernel, service_id),
     kernel,
-    service_id
+    PlanCache(path=os.getenv("PLAN_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".plan_cache")))
 )
 
-kernel.add_plugin(parent_directory="../plugins/prompt_templates/", plugin_name="writerPlugin")
-
 for plugin_name, plugin in kernel.plugins.items():
     for function_name, function in plugin.functions.items():
         print(f"Plugin: {plugin_name}, Function: {function_name}")
         
-text=" "
-        
-with open("../data/chatgpt.txt", "r") as file:
-    chatgpt = file.read()
-    text = text+chatgpt
-    
-    
-goal = f"summarise this text: {text} and email it to sam@gmail.com "
-        
-async def call_planner():
-    return await planner.create_plan(goal)
+#the document is summarised chunk by chunk (map) and the partial summaries are summarised again (reduce),
+#so the planner prompt only carries a reference to the summary instead of the whole document
+summariser = MapReduceSummariser(
+    kernel,
+    kernel.plugins["writerPlugin"]["summarise"],
+    chunk_tokens=3000,
+    max_concurrency=4,
+    model=os.getenv("AZURE_OPENAI_CHAT_COMPLETION_MODEL")
+)
+
+#one event loop for the whole sample: the factory's service and its connection pool belong to the loop that
+#first uses them, see helpers/kernel_factory.py
+async def main():
+    summary = await summariser.summarise_file("../data/chatgpt.txt")
+
+    print(f"Summarised the document: {summariser.stats}")
+
+    goal = "email the summary of the document that is stored in the variable $summary to sam@gmail.com "
+
+    sequential_plan = await planner.create_plan(goal)
 
-sequential_plan = asyncio.run(call_planner())
+    print(f"Plan cache: {planner.cache.stats}")
 
-print("The plan's steps are:")
-for step in sequential_plan._steps:
-    print(
-        f"- {step.description.replace('.', '') if step.description else 'No description'} using {step.metadata.fully_qualified_name} with parameters: {step.parameters}"
-    )
+    print("The plan's steps are:")
+    for step in sequential_plan._steps:
+        print(
+            f"- {step.description.replace('.', '') if step.description else 'No description'} using {step.metadata.fully_qualified_name} with parameters: {step.parameters}"
+        )
 
-async def generate_answer():
-    return await sequential_plan.invoke(kernel)
+    return await sequential_plan.invoke(kernel, KernelArguments(summary=summary))
 
-result = asyncio.run(generate_answer())
+result = asyncio.run(main())
 
-print(result)
+print(result)
\ No newline at end of file
@@ -1,23 +1,55 @@
-from openai import AzureOpenAI
 import os
-from openai import AzureOpenAI
-import dotenv
+import sys
+import functools
+import tempfile
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+#imported first, so STARTUP_PROFILE=1 sees every import below
+from helpers.startup_profile import profiler
+
 from dotenv import load_dotenv
-import msal
-import requests
-from msal import PublicClientApplication
-from azure.identity import DefaultAzureCredential
-from semantic_kernel import Kernel
-from semantic_kernel.connectors.ai.open_ai import AzureChatCompletion
 from semantic_kernel import Kernel
 from typing import Annotated
 import asyncio
+from semantic_kernel.contents import ChatHistory
 from semantic_kernel.functions.kernel_function_decorator import kernel_function
+from graph_client import GraphClient, EventStore, EVENT_FIELDS
+from graph_projection import project_events
+from graph_auth import GraphTokenProvider, DEFAULT_CACHE_PATH
+from helpers.single_flight import SingleFlight, normalised_key
 
 load_dotenv()
 
 class TokenManager:
     token: str = "" #data member to store the bearer access token
+
+#one pooled keep-alive session for every Graph call, and a local copy of the calendar kept up to date with delta queries
+graph_client = GraphClient(lambda: TokenManager.token)
+event_store = EventStore(os.getenv("GRAPH_EVENT_STORE", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".graph_events.json")))
+
+#users asking the same question at the same time share one answer, and every question asked while the calendar
+#is being synced waits for that sync instead of starting its own
+single_flight = SingleFlight(functions={"Graphplugin-ListCalendarEvents": normalised_key("user_query")})
+    
+@functools.cache
+def chat_service():
+    """
+    the chat service (with its connection pool) is built on first use only, for the kernel and the calendar answer:
+    MockChatCompletion when MOCK_CHAT_COMPLETION is set, see helpers/mock_chat_completion.py
+    """
+    if os.getenv("MOCK_CHAT_COMPLETION"):
+        from helpers.mock_chat_completion import MockChatCompletion
+        
+        return MockChatCompletion.from_env("default")
+    
+    from semantic_kernel.connectors.ai.open_ai import AzureChatCompletion
+    
+    with profiler.measure("AzureChatCompletion"):
+        return AzureChatCompletion(service_id="default",
+                                   api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+                                   deployment_name=os.getenv("AZURE_OPENAI_CHAT_COMPLETION_MODEL"),
+                                   endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
+        )
     
 class GraphPlugin:
     """
@@ -30,7 +62,7 @@ class GraphPlugin:
         description="To list the calendar events of the user such as meetings etc.",
         name = "ListCalendarEvents"
     )
-    def ListCalenderEvents(
+    async def ListCalenderEvents(
         self,
         user_query: Annotated[str, "the query of the user"]
     ) -> Annotated[str, "the output is a string variable"]:
@@ -38,15 +70,21 @@ class GraphPlugin:
         print("ListCalendarEvents function called")
         print("fetching answer .........")
         
-        url="https://graph.microsoft.com/v1.0/me/events?$select=subject,body,bodyPreview,organizer,attendees,start,end,location"
-        
-        headers = {
-            "Authorization": f"Bearer {TokenManager.token}",
-            "Content-Type": "application/json"
-        }
+        #only the events that changed since the last query are downloaded, every page of the calendar is followed
+        #the events of this sync, a sync started by another query meanwhile does not change them
+        events = await single_flight.do(
+            "calendar", lambda: asyncio.to_thread(event_store.sync, graph_client, EVENT_FIELDS), name="calendar sync"
+        )
+        print(f"calendar sync: {event_store.last_sync}")
         
-        get_url_response = requests.get(url, headers=headers)
-        responseString = get_url_response.json()
+        #keep only the fields the query needs, most relevant events first, cut to the prompt token budget
+        responseString, projection_report = project_events(
+            events,
+            user_query,
+            token_budget=int(os.getenv("GRAPH_PROMPT_TOKEN_BUDGET", "2000")),
+            model=os.getenv("AZURE_OPENAI_CHAT_COMPLETION_MODEL")
+        )
+        print(f"calendar prompt size: {projection_report['tokens_before']} -> {projection_report['tokens_after']} tokens ({projection_report['events_kept']}/{projection_report['events_in']} events)")
         
         systemMessage = f"You are a helpful AI assistant meant to assist the user by answering their queries related to knowing the calendar events in \
         the microsoft graph API. you will be presented with the user query that the user asked and a JSON response of the graph API. Extract \
@@ -54,66 +92,72 @@ class GraphPlugin:
         
         systemPrompt = f"The user query is: {user_query}. The JSON response from the graph API is: {responseString}. Extract information from the JSON response based on the user query and present it to the user in a readable format."
         
-        client = AzureOpenAI(
-            azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
-            api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-            api_version="2024-02-15-preview"
-        )
+        chatHistory = ChatHistory(system_message=systemMessage)
+        chatHistory.add_user_message(systemPrompt)
         
-        chatResponse = client.chat.completions.create(
-            model = os.getenv("AZURE_OPENAI_CHAT_COMPLETION_MODEL"),
-            messages = [
-                {
-                    "role": "system",
-                    "content": systemMessage
-                },
-                {
-                  "role": "user",
-                  "content":systemPrompt
-                }
-            ]
-        )
+        service = chat_service()
+        chatResponse = await service.get_chat_message_content(chatHistory, service.get_prompt_execution_settings_class()())
         
-        return chatResponse.choices[0].message.content
+        return str(chatResponse)
+    
+async def ask(user_input: str):
+    kernel = Kernel()
+    kernel.add_service(chat_service())
+    
+    graphPlugin = kernel.add_plugin(GraphPlugin() , "Graphplugin")
+    single_flight.register(kernel)
+    calenderFunction = graphPlugin["ListCalendarEvents"]
+    finalResult = await kernel.invoke(calenderFunction, user_query=user_input) #invoke the function "ListCalendarEvents" with the user query
+    
+    print("-----------------")
+    print(finalResult)
+    print(f"Coalesced calls: {single_flight.report()}")
+
+async def ask_offline(user_input: str):
+    """MOCK_CHAT_COMPLETION run: a local fake Graph calendar instead of the tenant, no sign-in, a throwaway event store"""
+    from fake_graph_server import FakeGraphServer
+    
+    global graph_client, event_store
+    with FakeGraphServer() as server, tempfile.TemporaryDirectory() as store_dir:
+        server.add_event("1", subject="team standup", start="2025-01-06T09:00:00")
+        server.add_event("2", subject="design review", start="2025-01-07T14:00:00", location={"displayName": "Room 4"})
+        server.add_event("3", subject="1:1 with sam", start="2025-01-08T11:00:00")
+        
+        graph_client = GraphClient(lambda: "mock-token", endpoint=server.endpoint)
+        event_store = EventStore(os.path.join(store_dir, "graph_events.json"))
+        try:
+            await ask(user_input)
+        finally:
+            graph_client.close()
     
 async def main():
     user_input = input("enter the user query") #take the user queries like "List the calendar events", "what was the last meeting", etc.
     
+    if os.getenv("MOCK_CHAT_COMPLETION"):
+        await ask_offline(user_input)
+        return
+    
     client_id = os.getenv("AZURE_OPENAI_CLIENT_ID") #fill in the client id in the .env file
     tenantId = os.getenv("AZURE_OPENAI_TENANT_ID") #fill in the tenant id in the .env file
    
     authority = f"https://login.microsoftonline.com/{tenantId}"
     scopes = ["User.Read", "Calendars.Read", "Calendars.ReadWrite"]
     
-    app=msal.PublicClientApplication(
-        client_id,
-        authority=authority,
-        client_credential=None
-    )
-    
-    flow = app.initiate_device_flow(scopes=scopes)
-    print(flow["message"])
-    result = app.acquire_token_by_device_flow(flow)
-    
-    TokenManager.token = result["access_token"]
-    
-    kernel = Kernel()
-    
-    service_id = "default"
-    kernel.add_service(
-        AzureChatCompletion(service_id=service_id,
-                            api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-                            deployment_name=os.getenv("AZURE_OPENAI_CHAT_COMPLETION_MODEL"),
-                            endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
+    #the token cache is kept on disk, so the device code flow only runs on the very first start
+    with profiler.measure("GraphTokenProvider"):
+        token_provider = GraphTokenProvider(
+            client_id,
+            authority,
+            scopes,
+            cache_path=os.getenv("GRAPH_TOKEN_CACHE", DEFAULT_CACHE_PATH)
         )
-    )
     
-    graphPlugin = kernel.add_plugin(GraphPlugin() , "Graphplugin")
-    calenderFunction = graphPlugin["ListCalendarEvents"]
-    finalResult = await kernel.invoke(calenderFunction, user_query=user_input) #invoke the function "ListCalendarEvents" with the user query
+    TokenManager.token = token_provider.acquire()
     
-    print("-----------------")
-    print(finalResult)
+    #refresh the token in the background before it expires so long runs never stall on auth
+    token_provider.start_background_refresh(on_refresh=lambda token: setattr(TokenManager, "token", token))
+    
+    await ask(user_input)
     
 if (__name__=="__main__"):
     asyncio.run(main())
\ No newline at end of file
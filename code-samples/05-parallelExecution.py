@@ -4,17 +4,35 @@ import sys
 import time
 from typing import Annotated
 import math
-from semantic_kernel.connectors.ai.function_choice_behavior import FunctionChoiceBehavior
-from semantic_kernel.connectors.ai.open_ai.services.open_ai_chat_completion import OpenAIChatCompletion
 from semantic_kernel.connectors.ai.prompt_execution_settings import PromptExecutionSettings
 from semantic_kernel.functions.kernel_arguments import KernelArguments
 from semantic_kernel.functions.kernel_function_decorator import kernel_function
-from semantic_kernel.connectors.ai.open_ai import AzureChatCompletion
-from semantic_kernel.kernel import Kernel
-from dotenv import load_dotenv
 from semantic_kernel.planners import SequentialPlanner
 import os
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from helpers.plan_cache import PlanCache, CachedSequentialPlanner
+from helpers.kernel_factory import KernelFactory
+from helpers.plan_executor import ParallelPlanExecutor
+from helpers.instrumentation import KernelInstrumentation
+from helpers.math_plugin import BatchMath
+from helpers.function_index import FunctionIndex
+
+_instrumentation = None
+
+
+def get_instrumentation() -> KernelInstrumentation:
+    """
+    Every function invocation and model request as spans and histograms, in ../.telemetry/spans.jsonl or sent
+    to the OTLP collector at OTEL_EXPORTER_OTLP_ENDPOINT. Created on first use, importing the sample opens no files.
+    """
+    global _instrumentation
+    if _instrumentation is None:
+        _instrumentation = KernelInstrumentation.from_env(
+            default_path=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".telemetry", "spans.jsonl")
+        )
+    return _instrumentation
+
 
 def set_up_logging():
     """Set up logging to verify the kernel execute the functions in parallel"""
@@ -32,7 +50,7 @@ def set_up_logging():
     root_logger.addHandler(handler)
     
     
-class Math:
+class Math(BatchMath):
     """
     Description: MathPlugin provides a set of functions to make Math calculations.
 
@@ -100,21 +118,12 @@ class Math:
 
 
 async def parallel_execution():
-    kernel = Kernel()
-    load_dotenv()
-
-    service_id = "default"
-    kernel.add_service(
-        AzureChatCompletion(service_id=service_id,
-                            api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-                            deployment_name=os.getenv("AZURE_OPENAI_CHAT_COMPLETION_MODEL"),
-                            endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
-        )
-    )
-    
-    kernel.add_plugin(Math(), "MathPlugin")
+    #the service, its connection pool and the parsed prompt templates are shared by every kernel of the process
+    factory = KernelFactory.default()
+    kernel = factory.create_kernel(prompt_plugins=["basic_plugin"], plugins={"MathPlugin": Math})
+    get_instrumentation().instrument(kernel)
 
-    plugin = kernel.add_plugin(parent_directory="../plugins/prompt_templates/", plugin_name="basic_plugin")
+    plugin = kernel.get_plugin("basic_plugin")
 
     contact_function = plugin["greeting"]
     
@@ -124,12 +133,16 @@ async def parallel_execution():
     
     
     
+    #only the functions relevant to the query are advertised to the model, not every function of every plugin
+    function_index = FunctionIndex(kernel, top_k=8)
+    print(f"advertised functions: {function_index.select(query1)}")
+
     arguments = KernelArguments(
         settings=PromptExecutionSettings(
             # Set the function_choice_behavior to auto to let the model
             # decide which function to use, and let the kernel automatically
             # execute the functions.
-            function_choice_behavior=FunctionChoiceBehavior.Auto(),
+            function_choice_behavior=function_index.behavior(query1),
         )
     )
     
@@ -142,46 +155,53 @@ async def parallel_execution():
     
     
 async def sequential_execution():
-    kernel = Kernel()
-    load_dotenv()
-
-    service_id = "default"
-    kernel.add_service(
-        AzureChatCompletion(service_id=service_id,
-                            api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-                            deployment_name=os.getenv("AZURE_OPENAI_CHAT_COMPLETION_MODEL"),
-                            endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
-        )
-    )
-    
-    kernel.add_plugin(Math(), "MathPlugin")
+    #the service, its connection pool and the parsed prompt templates are shared by every kernel of the process
+    factory = KernelFactory.default()
+    service_id = factory.service_id
+    kernel = factory.create_kernel(prompt_plugins=["basic_plugin"], plugins={"MathPlugin": Math})
+    get_instrumentation().instrument(kernel)
 
-    plugin = kernel.add_plugin(parent_directory="../plugins/prompt_templates/", plugin_name="basic_plugin")
+    plugin = kernel.get_plugin("basic_plugin")
 
     contact_function = plugin["greeting"]
     
     #query which will execute in sequence
     query1 = "greet kuljot who is of age 19 and tell me how much is 10 divided by 2"
     
-    planner = SequentialPlanner(
-    kernel,
-    service_id
+    #the name and the numbers of the query are templated out, so the same kind of query reuses the cached plan
+    planner = CachedSequentialPlanner(
+        SequentialPlanner(kernel, service_id),
+        kernel,
+        PlanCache(
+            path=os.getenv("PLAN_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".plan_cache")),
+            variable_patterns=[r"greet (\w+)"]
+        )
     )
     
     sequential_plan = await planner.create_plan(query1)
     
+    print(f"Plan cache: {planner.cache.stats}")
+    
     print("The plan's steps are:")
     for step in sequential_plan._steps:
         print(
             f"- {step.description.replace('.', '') if step.description else 'No description'} using {step.metadata.fully_qualified_name} with parameters: {step.parameters}"
         )
     
-    result = await sequential_plan.invoke(kernel)
+    #steps that do not depend on each other (the greeting and the division) run at the same time
+    result = await ParallelPlanExecutor(kernel).invoke(sequential_plan)
     
+    print(ParallelPlanExecutor.format_timings(result))
     print(result)
     
    
 if __name__ == "__main__":
     set_up_logging()
 
-    asyncio.run(parallel_execution())
\ No newline at end of file
+    try:
+        asyncio.run(parallel_execution())
+    finally:
+        #exports the spans still buffered and closes the telemetry files, also when the run failed
+        instrumentation = get_instrumentation()
+        print(instrumentation.format_summary())
+        instrumentation.shutdown()
\ No newline at end of file
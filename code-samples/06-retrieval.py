@@ -0,0 +1,47 @@
+import asyncio
+import json
+import os
+import sys
+
+from semantic_kernel.connectors.ai.function_choice_behavior import FunctionChoiceBehavior
+from semantic_kernel.connectors.ai.prompt_execution_settings import PromptExecutionSettings
+from semantic_kernel.functions import KernelArguments
+
+SAMPLES_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(SAMPLES_DIR, ".."))
+from helpers.kernel_factory import KernelFactory
+from helpers.vector_store import HashingEmbedding, RetrievalPlugin, VectorStore
+
+#the files under data/ are cut into passages, embedded and kept in ../.vector_store; a second run only embeds
+#the files that changed since the first. The model looks up the passages it needs with retrieval-Search
+#instead of getting whole documents pasted into its prompt
+store = VectorStore(
+    os.path.join(SAMPLES_DIR, "..", "data"),
+    store_dir=os.getenv("VECTOR_STORE_DIR"),
+    embedding=HashingEmbedding(dim=1024),
+)
+
+
+async def main():
+    print(f"Index update: {store.update()}, {len(store)} passages")
+
+    factory = KernelFactory.default()
+    kernel = factory.create_kernel(plugins={"retrieval": RetrievalPlugin(store, top_k=3)})
+
+    question = "When was ChatGPT launched and who developed it?"
+
+    #the passages a prompt would carry for the question
+    for hit in store.search([question], top_k=3)[0]:
+        print(f"{hit['score']:.3f} {hit['file']}: {hit['text'][:80]}...")
+
+    settings = PromptExecutionSettings(service_id=factory.service_id, function_choice_behavior=FunctionChoiceBehavior.Auto())
+    result = await kernel.invoke_prompt(
+        "Answer the question using the passages of the documents you can search for. Question: {{$question}}",
+        arguments=KernelArguments(question=question, settings=settings),
+    )
+    print(result)
+    print(json.dumps(store.stats))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
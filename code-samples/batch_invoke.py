@@ -0,0 +1,53 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+
+SAMPLES_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(SAMPLES_DIR, ".."))
+from helpers.batch_runner import BatchRunner, RateLimiter
+from helpers.kernel_factory import KernelFactory
+
+#runs a prompt function over every record of a JSONL file within the deployment's quota, for example
+#   python batch_invoke.py --input greetings.jsonl --output greetings.out.jsonl --function basic_plugin-greeting --tpm 240000 --rpm 1440
+#every record's fields are the function's arguments: {"name": "kuljot", "age": "18"}
+#an interrupted run picks up where it stopped when it is started again with the same --output
+
+
+async def main(args):
+    plugin_name, function_name = args.function.split("-", 1)
+
+    factory = KernelFactory.default()
+    kernel = factory.create_kernel(prompt_plugins=[plugin_name])
+
+    runner = BatchRunner(
+        kernel,
+        kernel.get_function(plugin_name, function_name),
+        RateLimiter(tpm=args.tpm, rpm=args.rpm),
+        concurrency=args.concurrency,
+        max_retries=args.max_retries,
+        on_progress=lambda stats: print(f"progress: {json.dumps(stats)}", file=sys.stderr),
+        progress_every=args.progress_every,
+    )
+    return await runner.run(args.input, args.output, restart=args.restart)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Invoke a prompt function for every record of a JSONL file.")
+    parser.add_argument("--input", required=True, help="JSONL file, one object of function arguments per line")
+    parser.add_argument("--output", required=True, help="JSONL file the results are appended to, also the checkpoint")
+    parser.add_argument("--function", default="basic_plugin-greeting", help="<plugin>-<function> under plugins/prompt_templates")
+    parser.add_argument("--tpm", type=int, default=int(os.getenv("AZURE_OPENAI_TPM", "0")) or None, help="tokens per minute quota of the deployment")
+    parser.add_argument("--rpm", type=int, default=int(os.getenv("AZURE_OPENAI_RPM", "0")) or None, help="requests per minute quota of the deployment")
+    parser.add_argument("--concurrency", type=int, default=16, help="invocations in flight at the same time")
+    parser.add_argument("--max-retries", type=int, default=6, help="retries of a record after 429s, timeouts and 5xx errors")
+    parser.add_argument("--progress-every", type=int, default=1000, help="print the stats every this many records")
+    parser.add_argument("--restart", action="store_true", help="start over instead of resuming from --output")
+    args = parser.parse_args()
+
+    #throttled attempts are retried by the runner, the kernel's error log of every attempt is noise here
+    logging.getLogger("semantic_kernel.functions.kernel_function").setLevel(logging.CRITICAL)
+
+    print(json.dumps(asyncio.run(main(args)), indent=2))
@@ -0,0 +1,214 @@
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+from dotenv import load_dotenv
+from semantic_kernel import Kernel
+from semantic_kernel.connectors.ai.function_choice_behavior import FunctionChoiceBehavior
+from semantic_kernel.connectors.ai.open_ai import AzureChatCompletion
+from semantic_kernel.connectors.ai.prompt_execution_settings import PromptExecutionSettings
+from semantic_kernel.functions import KernelArguments
+from semantic_kernel.planners import SequentialPlanner
+
+SAMPLES_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(SAMPLES_DIR, ".."))
+from helpers.function_index import FunctionIndex
+from helpers.metering import ChatCompletionMeter
+from helpers.mock_chat_completion import MockChatCompletion
+from helpers.plan_cache import PlanCache, CachedSequentialPlanner
+from helpers.plan_executor import ParallelPlanExecutor
+
+# the Math plugin of the parallel execution sample, so both strategies see exactly the same functions
+_spec = importlib.util.spec_from_file_location("parallel_execution_sample", os.path.join(SAMPLES_DIR, "05-parallelExecution.py"))
+parallel_execution_sample = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(parallel_execution_sample)
+
+# queries that need more than one function, so the strategies can differ in how they call them
+DEFAULT_CORPUS = [
+    "greet kuljot who is of age 19 and tell me how much is 10 divided by 2",
+    "how much is 12 multiplied by 3 and what is the sqrt of 81",
+    "add 4 and 5, subtract 3 from 20 and divide 9 by 3",
+    "greet maria who is of age 31 and take the sqrt of 144",
+    "multiply 7 by 6 and add 10 to 15",
+    "divide 100 by 4, multiply 3 by 3 and subtract 1 from 2",
+]
+
+
+def load_corpus(path: str) -> list:
+    """One query per line; lines of a .jsonl file are objects with a "query" field."""
+    with open(path, "r", encoding="utf-8") as file:
+        lines = [line.strip() for line in file if line.strip()]
+    if path.endswith(".jsonl"):
+        return [json.loads(line)["query"] for line in lines]
+    return lines
+
+
+def create_kernel(service_id: str = "default") -> Kernel:
+    kernel = Kernel()
+    if os.getenv("MOCK_CHAT_COMPLETION"):
+        kernel.add_service(MockChatCompletion.from_env(service_id))
+    else:
+        kernel.add_service(
+            AzureChatCompletion(service_id=service_id,
+                                api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+                                deployment_name=os.getenv("AZURE_OPENAI_CHAT_COMPLETION_MODEL"),
+                                endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
+            )
+        )
+    kernel.add_plugin(parallel_execution_sample.Math(), "MathPlugin")
+    kernel.add_plugin(parent_directory=os.path.join(SAMPLES_DIR, "..", "plugins", "prompt_templates"), plugin_name="basic_plugin")
+    return kernel
+
+
+async def run_auto(kernel: Kernel, query: str, service_id: str, function_index: FunctionIndex = None):
+    #with a function index only the functions relevant to the query are advertised
+    behavior = function_index.behavior(query) if function_index else FunctionChoiceBehavior.Auto()
+    arguments = KernelArguments(settings=PromptExecutionSettings(service_id=service_id, function_choice_behavior=behavior))
+    return await kernel.invoke_prompt(query, arguments=arguments)
+
+
+async def run_planner(kernel: Kernel, meter: ChatCompletionMeter, query: str, planner, executor: ParallelPlanExecutor = None):
+    plan = await planner.create_plan(query)
+    # the steps are counted as they run, like the tool calls of the auto strategies
+    with meter.plan_steps(plan):
+        if executor is None:
+            # Plan.invoke runs the steps one after the other
+            return await plan.invoke(kernel)
+        return await executor.invoke(plan)
+
+
+def percentiles(values: list) -> dict:
+    if not values:
+        return {}
+    if len(values) == 1:
+        cuts = values * 99
+    else:
+        cuts = statistics.quantiles(values, n=100, method="inclusive")
+    return {
+        "p50": round(cuts[49], 2),
+        "p95": round(cuts[94], 2),
+        "p99": round(cuts[98], 2),
+        "mean": round(statistics.fmean(values), 2),
+        "min": round(min(values), 2),
+        "max": round(max(values), 2),
+    }
+
+
+def summarise(samples: list) -> dict:
+    succeeded = [sample for sample in samples if sample["error"] is None]
+
+    def total(name):
+        return sum(sample["counters"][name] for sample in succeeded)
+
+    runs = len(succeeded) or 1
+    return {
+        "queries": len(samples),
+        "errors": len(samples) - len(succeeded),
+        "latency_ms": percentiles([sample["latency_ms"] for sample in succeeded]),
+        "llm_round_trips": {"total": total("llm_round_trips"), "per_query": round(total("llm_round_trips") / runs, 2)},
+        "tool_calls": {
+            "total": total("tool_calls"),
+            "parallel": total("parallel_tool_calls"),
+            "serial": total("serial_tool_calls"),
+            "rounds": total("tool_rounds"),
+        },
+        "tokens": {
+            "prompt": total("prompt_tokens"),
+            "completion": total("completion_tokens"),
+            "per_query": round((total("prompt_tokens") + total("completion_tokens")) / runs, 1),
+        },
+    }
+
+
+async def benchmark(corpus: list, strategies: list, runs: int = 1, concurrency: int = 1, plan_cache: bool = False) -> dict:
+    service_id = "default"
+    results = {}
+    service_name = None
+
+    for strategy in strategies:
+        # a fresh kernel per strategy, so neither profits from the other's warm caches
+        kernel = create_kernel(service_id)
+        meter = ChatCompletionMeter(kernel.get_service(service_id)).attach(kernel)
+        service_name = type(kernel.get_service(service_id)).__name__
+
+        planner = SequentialPlanner(kernel, service_id)
+        if plan_cache:
+            planner = CachedSequentialPlanner(planner, kernel, PlanCache())
+
+        function_index = FunctionIndex(kernel, top_k=8, excluded_plugins=(SequentialPlanner.RESTRICTED_PLUGIN_NAME,))
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def measure(query: str, run: int):
+            async with semaphore:
+                with meter.track() as counters:
+                    start = time.perf_counter()
+                    error = None
+                    try:
+                        if strategy == "auto":
+                            await run_auto(kernel, query, service_id)
+                        elif strategy == "auto-pruned":
+                            await run_auto(kernel, query, service_id, function_index)
+                        elif strategy == "planner":
+                            await run_planner(kernel, meter, query, planner)
+                        else:
+                            await run_planner(kernel, meter, query, planner, ParallelPlanExecutor(kernel))
+                    except Exception as e:
+                        error = f"{type(e).__name__}: {e}"
+                    latency_ms = (time.perf_counter() - start) * 1000
+            return {"query": query, "run": run, "latency_ms": round(latency_ms, 2), "counters": counters, "error": error}
+
+        samples = await asyncio.gather(*[measure(query, run) for run in range(runs) for query in corpus])
+        results[strategy] = {**summarise(samples), "samples": samples}
+        if plan_cache and strategy.startswith("planner"):
+            results[strategy]["plan_cache"] = dict(planner.cache.stats)
+
+    return {
+        "config": {
+            "service": service_name,
+            "corpus_size": len(corpus),
+            "runs": runs,
+            "concurrency": concurrency,
+            "plan_cache": plan_cache,
+            "python": platform.python_version(),
+        },
+        "strategies": results,
+    }
+
+
+if __name__ == "__main__":
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Compare auto function calling with SequentialPlanner execution.")
+    parser.add_argument("--corpus", help="file with one query per line (or .jsonl with a query field)")
+    parser.add_argument("--strategies", nargs="+", choices=["auto", "auto-pruned", "planner", "planner-dag"], default=["auto", "auto-pruned", "planner", "planner-dag"])
+    parser.add_argument("--runs", type=int, default=3, help="how often every query is run")
+    parser.add_argument("--concurrency", type=int, default=1, help="queries in flight at the same time")
+    parser.add_argument("--plan-cache", action="store_true", help="plan with CachedSequentialPlanner")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    parser.add_argument("--no-samples", action="store_true", help="leave the per query samples out of the report")
+    args = parser.parse_args()
+
+    report = asyncio.run(
+        benchmark(
+            load_corpus(args.corpus) if args.corpus else DEFAULT_CORPUS,
+            args.strategies,
+            runs=args.runs,
+            concurrency=args.concurrency,
+            plan_cache=args.plan_cache,
+        )
+    )
+    if args.no_samples:
+        for strategy in report["strategies"].values():
+            strategy.pop("samples")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
@@ -0,0 +1,203 @@
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import random
+import sys
+import time
+
+import numpy as np
+from dotenv import load_dotenv
+from semantic_kernel import Kernel
+from semantic_kernel.connectors.ai.function_choice_behavior import FunctionChoiceBehavior
+from semantic_kernel.connectors.ai.open_ai import AzureChatCompletion
+from semantic_kernel.connectors.ai.prompt_execution_settings import PromptExecutionSettings
+from semantic_kernel.contents import FunctionResultContent
+from semantic_kernel.filters import FilterTypes
+from semantic_kernel.functions import KernelArguments
+
+SAMPLES_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(SAMPLES_DIR, ".."))
+from helpers.metering import ChatCompletionMeter
+from helpers.mock_chat_completion import MockChatCompletion, MockReply, lognormal
+
+#the Math plugin of the samples: the scalar functions plus the BatchMath ones
+_spec = importlib.util.spec_from_file_location("parallel_execution_sample", os.path.join(SAMPLES_DIR, "05-parallelExecution.py"))
+parallel_execution_sample = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(parallel_execution_sample)
+
+#compares the three ways the Math plugin can answer a request with many calculations, for example
+#   MOCK_CHAT_COMPLETION=1 python benchmark_math.py --calculations 50 --latency-ms 600
+#scalar: one tool call per calculation (Add, Subtract, ...), batch: one call per operation (AddBatch, ...),
+#expression: one EvaluateAll call. Against the mock the model's side is scripted: the scalar model asks for
+#--calls-per-turn calls per round trip, like a real model asking for parallel tool calls; against Azure OpenAI
+#the model only sees the functions of the strategy and decides itself
+
+SCALAR = {"+": "Add", "-": "Subtract", "*": "Multiply", "/": "Divide", "sqrt": "Sqrt"}
+STRATEGY_FUNCTIONS = {
+    "scalar": ["Add", "Subtract", "Multiply", "Divide", "Sqrt"],
+    "batch": ["AddBatch", "SubtractBatch", "MultiplyBatch", "DivideBatch", "SqrtBatch"],
+    "expression": ["Evaluate", "EvaluateAll"],
+}
+
+
+def calculations(count: int, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    result = []
+    for _ in range(count):
+        operation = rng.choice(list(SCALAR))
+        first = round(rng.uniform(1, 1000), 2)
+        second = round(rng.uniform(1, 100), 2)
+        result.append((operation, first, None if operation == "sqrt" else second))
+    return result
+
+
+def expression(calculation) -> str:
+    operation, first, second = calculation
+    return f"sqrt({first})" if operation == "sqrt" else f"{first} {operation} {second}"
+
+
+def expected(calculation) -> float:
+    operation, first, second = calculation
+    return {"+": first + (second or 0), "-": first - (second or 0), "*": first * (second or 0)}.get(
+        operation, np.sqrt(first) if operation == "sqrt" else first / second
+    )
+
+
+def scripted_model(strategy: str, work: list, calls_per_turn: int):
+    """A mock responder that asks for the tool calls of the strategy, then answers with the results."""
+
+    def plan():
+        if strategy == "scalar":
+            return [
+                (f"MathPlugin-{SCALAR[operation]}", {"number1": first} if second is None else {"number1": first, "number2": second})
+                for operation, first, second in work
+            ]
+        if strategy == "batch":
+            calls = []
+            for operation, name in SCALAR.items():
+                operands = [(first, second) for op, first, second in work if op == operation]
+                if operands:
+                    arguments = {"numbers1": [first for first, _ in operands]}
+                    if operation != "sqrt":
+                        arguments["numbers2"] = [second for _, second in operands]
+                    calls.append((f"MathPlugin-{name}Batch", arguments))
+            return calls
+        return [("MathPlugin-EvaluateAll", {"expressions": [expression(calculation) for calculation in work]})]
+
+    calls = plan()
+    per_turn = calls_per_turn if strategy == "scalar" else len(calls)
+
+    def respond(request):
+        done = sum(isinstance(item, FunctionResultContent) for message in request.chat_history.messages for item in message.items)
+        if done < len(calls):
+            return MockReply(function_calls=calls[done:done + per_turn])
+        return MockReply(f"All {len(work)} calculations are done.")
+
+    return respond
+
+
+def create_kernel(strategy: str, work: list, args) -> Kernel:
+    kernel = Kernel()
+    if os.getenv("MOCK_CHAT_COMPLETION"):
+        kernel.add_service(
+            MockChatCompletion(
+                service_id="default",
+                latency=lognormal(args.latency_ms / 1000, 0.3),
+                rules=[scripted_model(strategy, work, args.calls_per_turn)],
+                seed=1,
+            )
+        )
+    else:
+        kernel.add_service(
+            AzureChatCompletion(service_id="default",
+                                api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+                                deployment_name=os.getenv("AZURE_OPENAI_CHAT_COMPLETION_MODEL"),
+                                endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
+            )
+        )
+    kernel.add_plugin(parallel_execution_sample.Math(), "MathPlugin")
+    return kernel
+
+
+async def run(strategy: str, work: list, args) -> dict:
+    kernel = create_kernel(strategy, work, args)
+    meter = ChatCompletionMeter(kernel.get_service("default")).attach(kernel)
+
+    results = []
+    execution = [0.0]
+
+    async def record(context, next):
+        #only the Math functions, not the prompt that calls them
+        if context.function.plugin_name != "MathPlugin":
+            return await next(context)
+        start = time.perf_counter()
+        await next(context)
+        execution[0] += time.perf_counter() - start
+        value = context.result.value if context.result is not None else None
+        results.extend(value if isinstance(value, list) else [value])
+
+    kernel.add_filter(FilterTypes.FUNCTION_INVOCATION, record)
+
+    query = "Compute every one of these and list the results in order: " + "; ".join(expression(calculation) for calculation in work)
+    arguments = KernelArguments(
+        settings=PromptExecutionSettings(
+            service_id="default",
+            function_choice_behavior=FunctionChoiceBehavior.Auto(
+                filters={"included_functions": [f"MathPlugin-{name}" for name in STRATEGY_FUNCTIONS[strategy]]}
+            ),
+        )
+    )
+    start = time.perf_counter()
+    with meter.track() as counters:
+        await kernel.invoke_prompt(query, arguments=arguments)
+    elapsed = time.perf_counter() - start
+
+    report = {
+        "latency_ms": round(elapsed * 1000, 1),
+        "llm_round_trips": counters["llm_round_trips"],
+        "tool_calls": counters["tool_calls"],
+        "tokens": counters["prompt_tokens"] + counters["completion_tokens"],
+        "function_execution_ms": round(execution[0] * 1000, 3),
+    }
+    if os.getenv("MOCK_CHAT_COMPLETION"):
+        #the scripted calls follow the order of the operations for batch, put the expectations in the same order
+        if strategy == "batch":
+            ordered = [calculation for operation in SCALAR for calculation in work if calculation[0] == operation]
+        else:
+            ordered = work
+        report["correct"] = len(results) == len(ordered) and bool(
+            np.allclose([float(value) for value in results], [expected(calculation) for calculation in ordered])
+        )
+    return report
+
+
+async def main(args) -> dict:
+    work = calculations(args.calculations, args.seed)
+    report = {
+        "config": {
+            "service": "MockChatCompletion" if os.getenv("MOCK_CHAT_COMPLETION") else "AzureChatCompletion",
+            "calculations": args.calculations,
+            "calls_per_turn": args.calls_per_turn,
+            "latency_ms": args.latency_ms,
+        },
+        "strategies": {},
+    }
+    for strategy in args.strategies:
+        report["strategies"][strategy] = await run(strategy, work, args)
+    return report
+
+
+if __name__ == "__main__":
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Scalar vs batch vs expression tool calls of the Math plugin.")
+    parser.add_argument("--calculations", type=int, default=50, help="calculations in the request")
+    parser.add_argument("--strategies", nargs="+", choices=list(STRATEGY_FUNCTIONS), default=list(STRATEGY_FUNCTIONS))
+    parser.add_argument("--calls-per-turn", type=int, default=10, help="tool calls the scripted scalar model asks for per round trip")
+    parser.add_argument("--latency-ms", type=float, default=600, help="median latency of a mock round trip")
+    parser.add_argument("--seed", type=int, default=7, help="seed of the generated calculations")
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(main(args)), indent=2))
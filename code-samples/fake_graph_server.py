@@ -0,0 +1,217 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+
+class FakeGraphServer:
+    """
+    Description: a local stand-in for the calendar part of the Microsoft Graph API, so GraphClient paging and
+    EventStore delta sync can be exercised without a tenant or a token.
+
+    Supported:
+        GET /v1.0/me/events                      -> paged with @odata.nextLink ($skip)
+        GET /v1.0/me/calendarView/delta          -> paged with $skiptoken, last page carries @odata.deltaLink
+        GET /v1.0/me/calendarView/delta?$deltatoken=N -> only the events changed/removed since N
+
+    Page size follows the "Prefer: odata.maxpagesize=N" header like the real service. expire_delta_tokens() makes
+    every delta token handed out so far answer 410 Gone, fail_after(n) answers 500 after n more requests.
+
+    Usage:
+        with FakeGraphServer() as server:
+            server.add_event("1", subject="standup")
+            graph_client = GraphClient(lambda: "token", endpoint=server.endpoint)
+    """
+
+    def __init__(self, default_page_size: int = 10):
+        self.default_page_size = default_page_size
+        self.events = {}
+        self.version = 0
+        self.changes = []  # (version, event id)
+        self.request_count = 0
+        self.expired_before = 0  # delta tokens below this version answer 410
+        self.failures_after = None  # requests left before every request answers 500
+        self._lock = threading.Lock()
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self._httpd.server_address
+        return f"http://{host}:{port}/v1.0"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def add_event(self, event_id: str, subject: str, start: str = "2025-01-01T09:00:00", **fields):
+        with self._lock:
+            self.version += 1
+            self.events[event_id] = {
+                "id": event_id,
+                "subject": subject,
+                "start": {"dateTime": start, "timeZone": "UTC"},
+                "end": {"dateTime": start, "timeZone": "UTC"},
+                **fields,
+            }
+            self.changes.append((self.version, event_id))
+
+    def update_event(self, event_id: str, **fields):
+        with self._lock:
+            self.version += 1
+            self.events[event_id].update(fields)
+            self.changes.append((self.version, event_id))
+
+    def remove_event(self, event_id: str):
+        with self._lock:
+            self.version += 1
+            self.events.pop(event_id)
+            self.changes.append((self.version, event_id))
+
+    def expire_delta_tokens(self):
+        with self._lock:
+            self.expired_before = self.version + 1
+
+    def fail_after(self, requests: int = None):
+        """Answer 500 to every request after the next `requests` ones; None stops failing."""
+        with self._lock:
+            self.failures_after = requests
+
+    def _page(self, items: list, offset: int, page_size: int, next_params: dict, path: str, final: dict) -> dict:
+        page = {"value": items[offset:offset + page_size]}
+        if offset + page_size < len(items):
+            page["@odata.nextLink"] = f"{self.endpoint}{path}?{urlencode({**next_params, '$skip': offset + page_size})}"
+        else:
+            page.update(final)
+        return page
+
+    def _list_events(self, query: dict, page_size: int) -> dict:
+        offset = int(query.get("$skip", 0))
+        items = sorted(self.events.values(), key=lambda event: event["id"])
+        return self._page(items, offset, page_size, {}, "/me/events", {})
+
+    def _delta(self, query: dict, page_size: int) -> dict:
+        offset = int(query.get("$skip", 0))
+
+        if "$deltatoken" in query:
+            since = int(query["$deltatoken"])
+            changed_ids = {event_id for version, event_id in self.changes if version > since}
+            items = [
+                self.events[event_id] if event_id in self.events else {"id": event_id, "@removed": {"reason": "deleted"}}
+                for event_id in sorted(changed_ids)
+            ]
+            next_params = {"$deltatoken": since}
+        else:
+            items = sorted(self.events.values(), key=lambda event: event["id"])
+            next_params = {key: value for key, value in query.items() if key != "$skip"}
+
+        delta_link = f"{self.endpoint}/me/calendarView/delta?{urlencode({'$deltatoken': self.version})}"
+        return self._page(items, offset, page_size, next_params, "/me/calendarView/delta", {"@odata.deltaLink": delta_link})
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with server._lock:
+                    server.request_count += 1
+
+                    if not self.headers.get("Authorization", "").startswith("Bearer "):
+                        return self._send(401, {"error": {"code": "InvalidAuthenticationToken"}})
+
+                    if server.failures_after is not None:
+                        if server.failures_after <= 0:
+                            return self._send(500, {"error": {"code": "InternalServerError"}})
+                        server.failures_after -= 1
+
+                    url = urlparse(self.path)
+                    query = {key: values[0] for key, values in parse_qs(url.query).items()}
+                    if "$deltatoken" in query and int(query["$deltatoken"]) < server.expired_before:
+                        return self._send(410, {"error": {"code": "SyncStateNotFound"}})
+                    page_size = server.default_page_size
+                    prefer = self.headers.get("Prefer", "")
+                    if "odata.maxpagesize=" in prefer:
+                        page_size = int(prefer.split("odata.maxpagesize=")[1].split(",")[0])
+
+                    if url.path == "/v1.0/me/events":
+                        return self._send(200, server._list_events(query, page_size))
+                    if url.path == "/v1.0/me/calendarView/delta":
+                        return self._send(200, server._delta(query, page_size))
+
+                    return self._send(404, {"error": {"code": "ResourceNotFound"}})
+
+            def _send(self, status: int, body: dict):
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+if __name__ == "__main__":
+    # quick self check of GraphClient paging and EventStore delta sync against the stand-in server
+    import os
+    import tempfile
+
+    import requests
+
+    from graph_client import EventStore, GraphClient
+
+    with FakeGraphServer() as server, tempfile.TemporaryDirectory() as temp_dir:
+        for i in range(25):
+            server.add_event(f"{i:03d}", subject=f"meeting {i}")
+
+        graph_client = GraphClient(lambda: "token", endpoint=server.endpoint, page_size=10)
+
+        events = list(graph_client.iter_items("/me/events"))
+        assert len(events) == 25, len(events)
+
+        event_store = EventStore(os.path.join(temp_dir, "events.json"))
+        assert len(event_store.sync(graph_client)) == 25
+        assert event_store.last_sync["mode"] == "full" and event_store.last_sync["pages"] == 3
+
+        server.update_event("003", subject="moved meeting")
+        server.remove_event("004")
+        server.add_event("100", subject="new meeting")
+
+        # a fresh store instance picks up the persisted deltaLink and only downloads the 3 changes
+        event_store = EventStore(os.path.join(temp_dir, "events.json"))
+        events = event_store.sync(graph_client)
+        assert event_store.last_sync == {"mode": "delta", "pages": 1, "changed": 2, "removed": 1}, event_store.last_sync
+        assert len(events) == 25
+        assert event_store.events["003"]["subject"] == "moved meeting"
+        assert "004" not in event_store.events
+
+        # a full sync that fails on its second page leaves the previous events, window and deltaLink untouched
+        before = (dict(event_store.events), event_store.window, event_store.delta_link)
+        event_store.window = None  # as if the window moved
+        server.fail_after(1)
+        try:
+            event_store.sync(graph_client)
+            raise AssertionError("the failing sync should raise")
+        except requests.HTTPError:
+            pass
+        server.fail_after(None)
+        assert (event_store.events, event_store.delta_link) == (before[0], before[2])
+        assert event_store.window is None
+        event_store.window = before[1]
+
+        # an expired delta token (410 Gone) falls back to a full sync
+        server.add_event("101", subject="after expiry")
+        server.expire_delta_tokens()
+        events = event_store.sync(graph_client)
+        assert event_store.last_sync["mode"] == "full", event_store.last_sync
+        assert len(events) == 26 and "101" in event_store.events
+
+        print(f"ok - {server.request_count} requests served")
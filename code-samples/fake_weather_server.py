@@ -0,0 +1,169 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+
+class FakeWeatherServer:
+    """
+    Description: a local stand-in for wttr.in, the API behind weather_openapi.json, so the weather plugin can be
+    exercised without the network.
+
+    Supported:
+        GET /{location}?format=j1 -> a small j1 shaped report (current_condition, nearest_area)
+        GET /{unknown location}   -> 404
+
+    Every request waits latency seconds, like a remote service would. requests lists the (location, query) of
+    every request served, as the server decoded them.
+
+    Usage:
+        with FakeWeatherServer() as server:
+            weather = OpenApiPlugin.from_file("weather_openapi.json", plugin_name="weather", base_url=server.endpoint)
+    """
+
+    def __init__(self, latency: float = 0.0, unknown_locations=("nowhere",)):
+        self.latency = latency
+        self.unknown_locations = {location.casefold() for location in unknown_locations}
+        self.request_count = 0
+        self.requests = []
+        self._lock = threading.Lock()
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self._httpd.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    @staticmethod
+    def report(location: str) -> dict:
+        # the same location always gets the same weather
+        seed = sum(location.casefold().encode("utf-8"))
+        return {
+            "current_condition": [
+                {
+                    "temp_C": str(seed % 35),
+                    "humidity": str(40 + seed % 50),
+                    "windspeedKmph": str(seed % 30),
+                    "weatherDesc": [{"value": ["Sunny", "Partly cloudy", "Light rain", "Overcast"][seed % 4]}],
+                }
+            ],
+            "nearest_area": [{"areaName": [{"value": location}]}],
+        }
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = {key: values[0] for key, values in parse_qs(url.query).items()}
+                location = unquote(url.path.lstrip("/"))
+                with server._lock:
+                    server.request_count += 1
+                    server.requests.append((location, query))
+                time.sleep(server.latency)
+
+                if not location or location.casefold() in server.unknown_locations:
+                    return self._send(404, "Unknown location")
+                if query.get("format") == "j1":
+                    return self._send(200, json.dumps(server.report(location)), "application/json")
+                condition = server.report(location)["current_condition"][0]
+                return self._send(200, f"{location}: {condition['weatherDesc'][0]['value']} +{condition['temp_C']}°C")
+
+            def _send(self, status: int, body: str, content_type: str = "text/plain"):
+                payload = body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+if __name__ == "__main__":
+    # quick self check of the weather plugin generated from weather_openapi.json against the stand-in server
+    import asyncio
+    import os
+    import sys
+    import tempfile
+
+    SAMPLES_DIR = os.path.dirname(os.path.abspath(__file__))
+    sys.path.append(os.path.join(SAMPLES_DIR, ".."))
+    from semantic_kernel import Kernel
+
+    from helpers.openapi_plugin import OpenApiPlugin, load_spec
+
+    spec_path = os.path.join(SAMPLES_DIR, "..", "Agent_Framework", "SequentialOrchestration", "weather_openapi.json")
+
+    async def main(server: FakeWeatherServer, cache_dir: str):
+        weather = OpenApiPlugin.from_file(spec_path, plugin_name="weather", cache_dir=cache_dir, base_url=server.endpoint)
+        assert os.listdir(cache_dir), "the resolved spec is cached on disk"
+        assert load_spec(spec_path, cache_dir) is weather.spec
+
+        kernel = Kernel()
+        kernel.add_plugin(weather.plugin())
+        function = kernel.get_function("weather", "GetCurrentWeather")
+        assert [parameter.name for parameter in function.metadata.parameters] == ["location", "format"]
+        assert [parameter.is_required for parameter in function.metadata.parameters] == [True, False]
+
+        # ten concurrent lookups of four cities (spelled differently) reach the server once per city
+        cities = ["Mumbai", "Paris", "mumbai", " Paris ", "Tokyo", "Lima", "Tokyo", "Lima", "Mumbai", "Paris"]
+        for city in cities[:4]:
+            await kernel.invoke(function, location=city)
+        results = await asyncio.gather(*[kernel.invoke(function, location=city) for city in cities])
+        assert json.loads(str(results[0]))["nearest_area"][0]["areaName"][0]["value"] == "Mumbai"
+        assert server.request_count <= 6, server.request_count
+
+        # the location goes into the path (quoted, surrounding blanks removed), format into the query string
+        # with the default of the spec when it is not given
+        await kernel.invoke(function, location=" New York/NY ")
+        assert server.requests[-1] == ("New York/NY", {"format": "j1"}), server.requests[-1]
+        await kernel.invoke(function, location="Oslo", format="3")
+        assert server.requests[-1] == ("Oslo", {"format": "3"}), server.requests[-1]
+
+        # a repeated lookup is answered from the cache, the server is not asked again
+        count, hits = server.request_count, weather.cache.stats["hits"]
+        result = await kernel.invoke(function, location="oslo", format="3")
+        assert str(result).startswith("Oslo: "), str(result)
+        assert (server.request_count, weather.cache.stats["hits"]) == (count, hits + 1)
+
+        # the documented 404 comes back as its description and is not cached
+        result = await kernel.invoke(function, location="nowhere")
+        assert str(result) == "404: Location not found", str(result)
+        count = server.request_count
+        await kernel.invoke(function, location="nowhere")
+        assert server.request_count == count + 1
+        assert server.requests[-1] == ("nowhere", {"format": "j1"})
+
+        await weather.aclose()
+
+        # an entry older than ttl seconds is fetched again
+        short_lived = OpenApiPlugin.from_file(spec_path, plugin_name="weather", cache_dir=cache_dir, base_url=server.endpoint, ttl=0.2)
+        lookup = short_lived.functions()[0]
+        await lookup.invoke(kernel, location="Lima")
+        await lookup.invoke(kernel, location="Lima")
+        assert (short_lived.request_count, short_lived.cache.stats["hits"]) == (1, 1), short_lived.stats
+        await asyncio.sleep(0.3)
+        await lookup.invoke(kernel, location="Lima")
+        assert (short_lived.request_count, short_lived.cache.stats["expired"]) == (2, 1), short_lived.stats
+        await short_lived.aclose()
+        return weather.stats
+
+    with FakeWeatherServer(latency=0.05) as server, tempfile.TemporaryDirectory() as temp_dir:
+        stats = asyncio.run(main(server, temp_dir))
+        print(f"ok - {server.request_count} requests served, {stats}")
@@ -0,0 +1,137 @@
+import atexit
+import os
+import shelve
+import threading
+import time
+from typing import Callable
+
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".graph_plugin_token_cache.json")
+
+
+class GraphTokenProvider:
+    """
+    Description: GraphTokenProvider signs the user in for the Microsoft Graph API once and keeps them signed in.
+
+    - the MSAL token cache (access + refresh token) is serialized to a file, so a new process signs in with
+      acquire_token_silent instead of the device code flow
+    - MSAL's HTTP metadata (authority discovery) is cached next to it, so a warm start does not go to the network
+    - a background thread refreshes the access token a few minutes before it expires, so long running workers
+      always have a valid token
+
+    Usage:
+        token_provider = GraphTokenProvider(client_id, authority, scopes)
+        TokenManager.token = token_provider.acquire()
+        token_provider.start_background_refresh(on_refresh=lambda token: setattr(TokenManager, "token", token))
+    """
+
+    def __init__(
+        self,
+        client_id: str,
+        authority: str,
+        scopes: list,
+        cache_path: str = DEFAULT_CACHE_PATH,
+        refresh_margin: int = 300,
+    ):
+        self.scopes = scopes
+        self.cache_path = cache_path
+        self.refresh_margin = refresh_margin
+
+        # msal is only imported by processes that actually sign in
+        import msal
+
+        self.cache = msal.SerializableTokenCache()
+        if os.path.exists(cache_path):
+            with open(cache_path, "r") as file:
+                self.cache.deserialize(file.read())
+
+        self._http_cache = shelve.open(f"{cache_path}.http")
+        atexit.register(self._http_cache.close)
+
+        self.app = msal.PublicClientApplication(
+            client_id,
+            authority=authority,
+            token_cache=self.cache,
+            http_cache=self._http_cache,
+        )
+
+        self.token = None
+        self.expires_at = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._refresh_thread = None
+
+    def _persist(self):
+        if not self.cache.has_state_changed:
+            return
+
+        # the cache holds a refresh token, so it is only readable by the current user
+        temp_path = f"{self.cache_path}.tmp"
+        descriptor = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(descriptor, "w") as file:
+            file.write(self.cache.serialize())
+        os.replace(temp_path, self.cache_path)
+
+    def _accept(self, result: dict) -> str:
+        if not result or "access_token" not in result:
+            error = (result or {}).get("error_description") or (result or {}).get("error") or "no token"
+            raise RuntimeError(f"Could not acquire a Microsoft Graph token: {error}")
+
+        self.token = result["access_token"]
+        self.expires_at = time.time() + int(result.get("expires_in", 0))
+        self._persist()
+        return self.token
+
+    def _acquire_silent(self, force_refresh: bool = False):
+        accounts = self.app.get_accounts()
+        if not accounts:
+            return None
+        return self.app.acquire_token_silent(self.scopes, account=accounts[0], force_refresh=force_refresh)
+
+    def acquire(self, interactive: bool = True) -> str:
+        """Return a valid access token: cached, silently refreshed, or (first start only) via device code flow."""
+        with self._lock:
+            if self.token and time.time() < self.expires_at - self.refresh_margin:
+                return self.token
+
+            result = self._acquire_silent()
+
+            if not result and interactive:
+                flow = self.app.initiate_device_flow(scopes=self.scopes)
+                print(flow["message"])
+                result = self.app.acquire_token_by_device_flow(flow)
+
+            return self._accept(result)
+
+    def refresh(self) -> str:
+        """Redeem the refresh token for a new access token before the current one expires."""
+        with self._lock:
+            return self._accept(self._acquire_silent(force_refresh=True))
+
+    def start_background_refresh(self, on_refresh: Callable[[str], None] = None):
+        if self._refresh_thread:
+            return
+
+        def refresh_loop():
+            retry_delay = 5
+            while True:
+                wait = max(self.expires_at - self.refresh_margin - time.time(), 0)
+                if self._stop.wait(wait):
+                    return
+                try:
+                    token = self.refresh()
+                    retry_delay = 5
+                    if on_refresh:
+                        on_refresh(token)
+                except Exception as e:
+                    # the current token is still valid for refresh_margin seconds, keep trying until then
+                    print(f"Graph token refresh failed, retrying in {retry_delay}s: {e}")
+                    if self._stop.wait(retry_delay):
+                        return
+                    retry_delay = min(retry_delay * 2, 60)
+
+        self._refresh_thread = threading.Thread(target=refresh_loop, name="graph-token-refresh", daemon=True)
+        self._refresh_thread.start()
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,205 @@
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Iterator
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+GRAPH_ENDPOINT = "https://graph.microsoft.com/v1.0"
+
+EVENT_FIELDS = "subject,body,bodyPreview,organizer,attendees,start,end,location"
+
+
+class GraphClient:
+    """
+    Description: GraphClient talks to the Microsoft Graph API over one pooled keep-alive session and follows
+    @odata.nextLink so that large collections are never silently cut off at the first page.
+
+    Usage:
+        graph_client = GraphClient(lambda: TokenManager.token)
+        for event in graph_client.iter_items("/me/events", params={"$select": EVENT_FIELDS}):
+            print(event["subject"])
+    """
+
+    def __init__(
+        self,
+        token_provider: Callable[[], str],
+        endpoint: str = GRAPH_ENDPOINT,
+        page_size: int = 50,
+        pool_size: int = 10,
+        timeout: float = 30,
+    ):
+        self.token_provider = token_provider
+        self.endpoint = endpoint.rstrip("/")
+        self.page_size = page_size
+        self.timeout = timeout
+
+        # one session for the whole process: TCP/TLS connections are kept alive and reused between calls,
+        # throttled (429) and unavailable (503/504) responses are retried honouring Retry-After
+        retry = Retry(
+            total=5,
+            backoff_factor=0.5,
+            status_forcelist=(429, 503, 504),
+            allowed_methods=("GET",),
+            respect_retry_after_header=True,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _headers(self) -> dict:
+        return {
+            "Authorization": f"Bearer {self.token_provider()}",
+            "Content-Type": "application/json",
+            "Prefer": f"odata.maxpagesize={self.page_size}",
+        }
+
+    def _url(self, path_or_url: str) -> str:
+        if path_or_url.startswith("http://") or path_or_url.startswith("https://"):
+            return path_or_url
+        return f"{self.endpoint}/{path_or_url.lstrip('/')}"
+
+    def iter_pages(self, path_or_url: str, params: dict = None) -> Iterator[dict]:
+        """Yield every page of a collection, requesting the next page only when the caller asks for it."""
+        url = self._url(path_or_url)
+
+        while url:
+            response = self.session.get(url, headers=self._headers(), params=params, timeout=self.timeout)
+            response.raise_for_status()
+            page = response.json()
+
+            yield page
+
+            # the nextLink already carries the query string of the original request
+            url = page.get("@odata.nextLink")
+            params = None
+
+    def iter_items(self, path_or_url: str, params: dict = None) -> Iterator[dict]:
+        for page in self.iter_pages(path_or_url, params=params):
+            yield from page.get("value", [])
+
+    def close(self):
+        self.session.close()
+
+
+class EventStore:
+    """
+    Description: EventStore keeps a local copy of the user's calendar in a JSON file and keeps it up to date
+    with Graph delta queries (/me/calendarView/delta). The first sync downloads the calendar window once,
+    every later sync only downloads the events that were added, changed or removed since the last deltaLink.
+
+    The calendar window is [today - past_days, today + future_days]. Delta tokens are bound to the window they
+    were created for, so a full sync runs again when the window moves (once a day), and when the service answers
+    410 Gone because the delta token expired. A sync is applied to a copy and only replaces the stored events,
+    window and deltaLink once its last page arrived.
+
+    Usage:
+        event_store = EventStore("graph_events.json")
+        events = event_store.sync(graph_client)
+    """
+
+    def __init__(self, path: str, past_days: int = 365, future_days: int = 365):
+        self.path = path
+        self.past_days = past_days
+        self.future_days = future_days
+
+        self.events = {}
+        self.delta_link = None
+        self.window = None
+        self.last_sync = {"mode": None, "pages": 0, "changed": 0, "removed": 0}
+
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                state = json.load(file)
+            if not isinstance(state, dict) or not isinstance(state.get("events", {}), dict):
+                raise ValueError("not an event store")
+        except (OSError, ValueError):
+            # edited by hand or written by an older version: start empty, the next sync is a full one
+            return
+
+        self.events = state.get("events", {})
+        self.delta_link = state.get("delta_link")
+        self.window = state.get("window")
+
+    def _save(self):
+        state = {"window": self.window, "delta_link": self.delta_link, "events": self.events}
+
+        # write to a temporary file first so an interrupted sync never leaves a half written store behind
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(state, file)
+        os.replace(temp_path, self.path)
+
+    def _current_window(self) -> list:
+        today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        start = today - timedelta(days=self.past_days)
+        end = today + timedelta(days=self.future_days)
+        return [start.strftime("%Y-%m-%dT%H:%M:%SZ"), end.strftime("%Y-%m-%dT%H:%M:%SZ")]
+
+    def sync(self, graph_client: GraphClient, fields: str = None) -> list:
+        """Bring the local store up to date and return all events in the window, as list_events(fields) right after the sync."""
+        window = self._current_window()
+
+        stats = None
+        if self.delta_link and self.window == window:
+            try:
+                events, delta_link, stats = self._apply(graph_client.iter_pages(self.delta_link), dict(self.events), "delta")
+            except requests.HTTPError as exc:
+                # 410 Gone: the delta token expired, only a full sync can bring the store up to date again
+                if exc.response is None or exc.response.status_code != 410:
+                    raise
+
+        if stats is None:
+            pages = graph_client.iter_pages(
+                "/me/calendarView/delta",
+                params={"startDateTime": window[0], "endDateTime": window[1]},
+            )
+            events, delta_link, stats = self._apply(pages, {}, "full")
+
+        # committed only once the last page arrived, a sync that fails halfway leaves the previous state as it was
+        self.events, self.window, self.delta_link = events, window, delta_link
+        self.last_sync = stats
+        self._save()
+
+        return self.list_events(fields)
+
+    @staticmethod
+    def _apply(pages: Iterator[dict], events: dict, mode: str):
+        """(events, deltaLink, stats) after applying every page to events."""
+        stats = {"mode": mode, "pages": 0, "changed": 0, "removed": 0}
+        delta_link = None
+
+        for page in pages:
+            stats["pages"] += 1
+
+            for event in page.get("value", []):
+                if "@removed" in event:
+                    events.pop(event["id"], None)
+                    stats["removed"] += 1
+                else:
+                    # delta pages can carry partial objects for updates, so merge instead of replacing
+                    events[event["id"]] = {**events.get(event["id"], {}), **event}
+                    stats["changed"] += 1
+
+            if "@odata.deltaLink" in page:
+                delta_link = page["@odata.deltaLink"]
+
+        return events, delta_link, stats
+
+    def list_events(self, fields: str = None) -> list:
+        """All stored events ordered by start time, optionally reduced to a comma separated list of fields."""
+        events = sorted(self.events.values(), key=lambda event: (event.get("start") or {}).get("dateTime", ""))
+        if fields:
+            # delta queries do not support $select, so the projection happens locally
+            names = fields.split(",")
+            events = [{name: event[name] for name in names if name in event} for event in events]
+        return events
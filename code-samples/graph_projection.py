@@ -0,0 +1,170 @@
+import html
+import json
+import re
+from datetime import datetime, timezone
+from html.parser import HTMLParser
+
+from helpers.tokens import count_tokens, get_encoding
+
+# which optional event fields a query needs, picked by keywords in the user query.
+# subject, start and end are always kept.
+FIELD_KEYWORDS = {
+    "attendees": ("attendee", "attending", "participant", "invite", "invited", "who", "with", "people", "guest"),
+    "organizer": ("organizer", "organiser", "organized", "organised", "host", "who", "owner"),
+    "location": ("where", "location", "room", "place", "venue", "address", "online", "teams"),
+    "body": ("about", "agenda", "detail", "details", "description", "topic", "notes", "body", "discuss", "content"),
+}
+
+WORD = re.compile(r"[a-z0-9]+")
+
+
+class _TextExtractor(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.parts = []
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ("script", "style", "head"):
+            self._skip += 1
+
+    def handle_endtag(self, tag):
+        if tag in ("script", "style", "head") and self._skip:
+            self._skip -= 1
+
+    def handle_data(self, data):
+        if not self._skip:
+            self.parts.append(data)
+
+
+def strip_html(text: str) -> str:
+    """Turn an HTML event body into plain text with collapsed whitespace."""
+    if not text:
+        return ""
+    extractor = _TextExtractor()
+    extractor.feed(text)
+    extractor.close()
+    return re.sub(r"\s+", " ", html.unescape(" ".join(extractor.parts))).strip()
+
+
+def to_prompt_json(value) -> str:
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+
+def needed_fields(user_query: str) -> set:
+    words = set(WORD.findall(user_query.lower()))
+    fields = {field for field, keywords in FIELD_KEYWORDS.items() if words.intersection(keywords)}
+    # a bare "list my events" style query gets the short preview instead of nothing
+    return fields or {"location", "organizer"}
+
+
+def _person(recipient: dict) -> str:
+    address = (recipient or {}).get("emailAddress") or {}
+    name = address.get("name") or ""
+    email = address.get("address") or ""
+    if name and email and name.lower() != email.lower():
+        return f"{name} <{email}>"
+    return name or email
+
+
+def project_event(event: dict, fields: set, body_chars: int = 400) -> dict:
+    """Keep only the parts of a Graph event the query needs, in a flat and compact shape."""
+    projected = {
+        "subject": event.get("subject") or "",
+        "start": (event.get("start") or {}).get("dateTime", ""),
+        "end": (event.get("end") or {}).get("dateTime", ""),
+    }
+
+    if "location" in fields:
+        location = (event.get("location") or {}).get("displayName")
+        if location:
+            projected["location"] = location
+
+    if "organizer" in fields:
+        organizer = _person(event.get("organizer"))
+        if organizer:
+            projected["organizer"] = organizer
+
+    if "attendees" in fields:
+        # the same person is often listed more than once (required + optional, different casing)
+        attendees = {}
+        for attendee in event.get("attendees") or []:
+            email = ((attendee.get("emailAddress") or {}).get("address") or "").lower()
+            person = _person(attendee)
+            if person and (email or person) not in attendees:
+                attendees[email or person] = person
+        if attendees:
+            projected["attendees"] = list(attendees.values())
+
+    if "body" in fields:
+        body = strip_html((event.get("body") or {}).get("content", "")) or event.get("bodyPreview") or ""
+        if body:
+            projected["body"] = body[:body_chars]
+
+    return projected
+
+
+def _start_time(event: dict):
+    try:
+        return datetime.fromisoformat(event["start"][:19]).replace(tzinfo=timezone.utc)
+    except (KeyError, ValueError):
+        return None
+
+
+def rank_events(events: list, user_query: str) -> list:
+    """Order projected events by term overlap with the query, closest to now first on ties."""
+    query_words = set(WORD.findall(user_query.lower()))
+    now = datetime.now(timezone.utc)
+
+    def score(event):
+        words = WORD.findall(to_prompt_json(event).lower())
+        overlap = sum(1 for word in words if word in query_words)
+        # subject matches count more than matches somewhere in the body
+        overlap += 2 * len(query_words.intersection(WORD.findall(event["subject"].lower())))
+        start = _start_time(event)
+        distance = abs((start - now).total_seconds()) if start else float("inf")
+        return (-overlap, distance)
+
+    return sorted(events, key=score)
+
+
+def project_events(events: list, user_query: str, token_budget: int = 2000, model: str = None):
+    """
+    Pre-processing stage between the Graph response and the prompt: project, dedupe, rank and cut the events
+    down to token_budget tokens, best ranked first, skipping an event that does not fit for smaller ones that do. Returns the JSON to put into the prompt and a report with the prompt size
+    before and after.
+    """
+    encoding = get_encoding(model)
+    fields = needed_fields(user_query)
+
+    ranked = rank_events([project_event(event, fields) for event in events], user_query)
+
+    kept = []
+    used = count_tokens("[]", encoding)
+    # no event costs less than one with an empty subject, start and end
+    smallest = count_tokens(to_prompt_json({"subject": "", "start": "", "end": ""}), encoding) + 1
+    for event in ranked:
+        if token_budget - used < smallest:
+            break
+        # +1 for the separating comma
+        cost = count_tokens(to_prompt_json(event), encoding) + 1
+        if used + cost > token_budget:
+            # only this event is too big, smaller lower ranked ones may still fit
+            continue
+        kept.append(event)
+        used += cost
+
+    # hand the events to the model in chronological order, ranking only decides what is kept
+    kept.sort(key=lambda event: event["start"])
+    projected_json = to_prompt_json(kept)
+
+    report = {
+        "events_in": len(events),
+        "events_kept": len(kept),
+        "fields": sorted(fields),
+        "tokens_before": count_tokens(to_prompt_json(events), encoding),
+        "tokens_after": count_tokens(projected_json, encoding),
+        "token_budget": token_budget,
+    }
+
+    return projected_json, report
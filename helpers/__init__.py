@@ -0,0 +1 @@
+"""Shared building blocks for the code samples, the agent notebooks and the multi-agent systems."""
@@ -0,0 +1,332 @@
+import asyncio
+import email.utils
+import json
+import os
+import random
+import time
+
+from semantic_kernel import Kernel
+from semantic_kernel.functions import KernelArguments, KernelFunction
+
+
+def estimate_tokens(text: str) -> int:
+    """Characters / 4, the estimate Azure OpenAI itself uses to charge a request against the TPM quota."""
+    return len(text) // 4 + 1
+
+
+def status_code(exc: BaseException):
+    """HTTP status of the request that failed, found on exc or on the exception it was raised from."""
+    while exc is not None:
+        response = getattr(exc, "response", None)
+        status = getattr(exc, "status_code", None) or getattr(response, "status_code", None)
+        if status is not None:
+            return status
+        exc = exc.__cause__ or exc.__context__
+    return None
+
+
+def retry_after(exc: BaseException, default: float = None):
+    """
+    Seconds to wait before retrying, if exc (or an exception it was raised from) is a throttling or transient
+    server error: the Retry-After(-ms) header of the response when there is one, default otherwise. None means
+    the error is not worth retrying.
+    """
+    while exc is not None:
+        response = getattr(exc, "response", None)
+        status = getattr(exc, "status_code", None) or getattr(response, "status_code", None)
+        if status in (429, 500, 502, 503, 504):
+            headers = getattr(response, "headers", None) or {}
+            if headers.get("retry-after-ms"):
+                return float(headers["retry-after-ms"]) / 1000
+            value = headers.get("retry-after")
+            if value:
+                try:
+                    return float(value)
+                except ValueError:
+                    # an HTTP date instead of seconds
+                    return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+            return default
+        if status is not None:
+            return None
+        if type(exc).__name__ in ("APITimeoutError", "APIConnectionError"):
+            return default
+        exc = exc.__cause__ or exc.__context__
+    return None
+
+
+class TokenBucket:
+    """
+    A bucket that refills per_minute units per minute and holds at most burst units. Azure OpenAI enforces its
+    quotas over short windows (RPM over 10 seconds), so the default burst is a sixth of the minute's quota.
+    """
+
+    def __init__(self, per_minute: float, burst: float = None):
+        self.rate = per_minute / 60
+        self.capacity = burst or max(1.0, per_minute / 6)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: float, now: float) -> float:
+        """Seconds until amount units are available (amounts above the capacity wait for a full bucket)."""
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.level
+        return missing / self.rate if missing > 0 else 0.0
+
+    def take(self, amount: float):
+        self.level -= min(amount, self.capacity)
+
+    def drain(self, now: float):
+        self._refill(now)
+        self.level = min(self.level, 0.0)
+
+
+class RateLimiter:
+    """
+    Description: RateLimiter keeps requests within a deployment's tokens per minute and requests per minute quota.
+
+    acquire(tokens) waits until both buckets have room, callers are served first come first served so a large
+    request is not starved by small ones. After a 429, pause(seconds) holds every caller back for the Retry-After
+    time and empties the buckets, so the waiting requests do not all fire at once when the pause ends.
+
+    Usage:
+        limiter = RateLimiter(tpm=240_000, rpm=1_440)
+        await limiter.acquire(estimated_tokens)
+    """
+
+    def __init__(self, tpm: int = None, rpm: int = None):
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens: int = 0):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                wait = max(
+                    self.paused_until - now,
+                    self.tokens.delay(tokens, now) if self.tokens else 0.0,
+                    self.requests.delay(1, now) if self.requests else 0.0,
+                )
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+
+            if self.tokens:
+                self.tokens.take(tokens)
+            if self.requests:
+                self.requests.take(1)
+
+    def pause(self, seconds: float):
+        now = time.monotonic()
+        self.paused_until = max(self.paused_until, now + seconds)
+        for bucket in (self.tokens, self.requests):
+            if bucket:
+                bucket.drain(now)
+
+
+def completed_lines(output_path: str) -> set:
+    """
+    Line numbers a previous run wrote a result for to an output file. A line cut off by a crash is removed from
+    the file, so the run can append to it again, and so are the errors: those lines are run again.
+    """
+    if not os.path.exists(output_path):
+        return set()
+
+    done = set()
+    failed = 0
+    with open(output_path, "rb+") as file:
+        valid_length = 0
+        for line in file:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                output = json.loads(line)
+                number = output["line"]
+            except (ValueError, KeyError):
+                break
+            if "error" in output:
+                failed += 1
+            else:
+                done.add(number)
+            valid_length += len(line)
+        file.truncate(valid_length)
+
+    if failed:
+        # the results are copied to a new file that replaces the old one, a crash meanwhile leaves the old one
+        temp_path = output_path + ".tmp"
+        with open(output_path, "rb") as file, open(temp_path, "wb") as temp_file:
+            for line in file:
+                if "error" not in json.loads(line):
+                    temp_file.write(line)
+        os.replace(temp_path, output_path)
+    return done
+
+
+def _usage(result) -> dict:
+    """Token usage reported by the model for a prompt function's result, empty when there is none."""
+    for metadata in (result.metadata or {}).get("metadata", []) if result is not None else []:
+        usage = metadata.get("usage")
+        if usage is not None:
+            return {"prompt_tokens": usage.prompt_tokens or 0, "completion_tokens": usage.completion_tokens or 0}
+    return {}
+
+
+class BatchRunner:
+    """
+    Description: BatchRunner invokes one kernel function for every record of a JSONL file, as fast as the
+    deployment's quota allows and no faster.
+
+    - records are read from the file as they are needed, at most concurrency invocations are in flight
+    - every invocation first takes its estimated tokens (rendered prompt + max_tokens) and one request from the
+      RateLimiter, so the batch runs at the quota instead of into it
+    - a 429 pauses the limiter for the Retry-After time and the record is retried, as are timeouts and 5xx
+      errors, up to max_retries times with jittered exponential backoff when the server gives no Retry-After
+    - every finished record is appended to the output file right away: {"line", "result", "usage"} or
+      {"line", "error"}, a line that is not valid JSON gets an error too. The output file is the checkpoint, a second run with the same output skips the lines
+      that have a result in it and runs the failed ones again
+
+    Every record's fields become the function's arguments, record_arguments(record) can map them differently.
+
+    Usage:
+        runner = BatchRunner(kernel, kernel.get_function("basic_plugin", "greeting"), RateLimiter(tpm=240_000, rpm=1_440))
+        stats = await runner.run("greetings.jsonl", "greetings.out.jsonl")
+    """
+
+    def __init__(
+        self,
+        kernel: Kernel,
+        function: KernelFunction,
+        limiter: RateLimiter = None,
+        concurrency: int = 16,
+        max_retries: int = 6,
+        record_arguments=None,
+        token_estimator=estimate_tokens,
+        on_progress=None,
+        progress_every: int = 1000,
+    ):
+        self.kernel = kernel
+        self.function = function
+        self.limiter = limiter or RateLimiter()
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.record_arguments = record_arguments or (lambda record: KernelArguments(**record))
+        self.token_estimator = token_estimator
+        self.on_progress = on_progress
+        self.progress_every = progress_every
+        self.max_tokens = self._max_tokens(function)
+        self.stats = {}
+
+    @staticmethod
+    def _max_tokens(function: KernelFunction) -> int:
+        for settings in (getattr(function, "prompt_execution_settings", None) or {}).values():
+            max_tokens = getattr(settings, "max_tokens", None) or settings.extension_data.get("max_tokens")
+            if max_tokens:
+                return int(max_tokens)
+        return 0
+
+    async def _estimate(self, arguments: KernelArguments) -> int:
+        if not self.function.is_prompt:
+            return 0
+        prompt = await self.function.prompt_template.render(self.kernel, arguments)
+        return self.token_estimator(prompt) + self.max_tokens
+
+    async def _invoke(self, record: dict) -> dict:
+        arguments = self.record_arguments(record)
+        tokens = await self._estimate(arguments)
+        self.stats["estimated_tokens"] += tokens
+
+        attempt = 0
+        while True:
+            await self.limiter.acquire(tokens)
+            try:
+                # function.invoke instead of kernel.invoke: the kernel logs every failed attempt as an error
+                result = await self.function.invoke(self.kernel, arguments)
+                return {"result": str(result), "usage": _usage(result)}
+            except Exception as exc:
+                wait = retry_after(exc, default=min(60.0, 2.0 ** attempt) * random.uniform(0.5, 1.5))
+                if wait is None or attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                self.stats["retries"] += 1
+                if status_code(exc) == 429:
+                    self.stats["throttled"] += 1
+                self.limiter.pause(wait)
+
+    async def run(self, input_path: str, output_path: str, restart: bool = False) -> dict:
+        if restart and os.path.exists(output_path):
+            os.remove(output_path)
+        done = completed_lines(output_path)
+
+        self.stats = {
+            "records": 0,
+            "skipped": 0,
+            "succeeded": 0,
+            "failed": 0,
+            "retries": 0,
+            "throttled": 0,
+            "estimated_tokens": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+        }
+        start = time.perf_counter()
+        queue = asyncio.Queue(maxsize=self.concurrency * 2)
+
+        with open(input_path, "r", encoding="utf-8") as input_file, open(output_path, "a", encoding="utf-8") as output_file:
+
+            async def read():
+                for number, line in enumerate(input_file):
+                    if not line.strip():
+                        continue
+                    self.stats["records"] += 1
+                    if number in done:
+                        self.stats["skipped"] += 1
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except ValueError as exc:
+                        # recorded like a failed call, so the rest of the batch runs and a resume retries the line
+                        output_file.write(json.dumps({"line": number, "error": f"{type(exc).__name__}: {exc}"}) + "\n")
+                        output_file.flush()
+                        self.stats["failed"] += 1
+                        continue
+                    await queue.put((number, record))
+                for _ in range(self.concurrency):
+                    await queue.put(None)
+
+            async def work():
+                while (item := await queue.get()) is not None:
+                    number, record = item
+                    try:
+                        output = {"line": number, **await self._invoke(record)}
+                        self.stats["succeeded"] += 1
+                        self.stats["prompt_tokens"] += output["usage"].get("prompt_tokens", 0)
+                        self.stats["completion_tokens"] += output["usage"].get("completion_tokens", 0)
+                    except Exception as exc:
+                        output = {"line": number, "error": f"{type(exc).__name__}: {exc}"}
+                        self.stats["failed"] += 1
+
+                    output_file.write(json.dumps(output, ensure_ascii=False) + "\n")
+                    output_file.flush()
+
+                    finished = self.stats["succeeded"] + self.stats["failed"]
+                    if self.on_progress and finished % self.progress_every == 0:
+                        self.on_progress(self.report(start))
+
+            await asyncio.gather(read(), *[work() for _ in range(self.concurrency)])
+
+        return self.report(start)
+
+    def report(self, start: float) -> dict:
+        elapsed = time.perf_counter() - start
+        finished = self.stats["succeeded"] + self.stats["failed"]
+        return {
+            **self.stats,
+            "elapsed_s": round(elapsed, 2),
+            "records_per_s": round(finished / elapsed, 2) if elapsed else 0.0,
+            "estimated_tpm": round(self.stats["estimated_tokens"] / elapsed * 60) if elapsed else 0,
+        }
@@ -0,0 +1,207 @@
+import asyncio
+import logging
+import time
+from typing import Any, Callable
+
+from pydantic import Field, PrivateAttr
+from semantic_kernel.connectors.ai.chat_completion_client_base import ChatCompletionClientBase
+from semantic_kernel.connectors.ai.prompt_execution_settings import PromptExecutionSettings
+from semantic_kernel.contents import AuthorRole, ChatHistory, ChatMessageContent, FunctionResultContent
+from semantic_kernel.contents.history_reducer.chat_history_reducer import ChatHistoryReducer
+from semantic_kernel.contents.history_reducer.chat_history_reducer_utils import SUMMARY_METADATA_KEY
+
+from helpers.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_INSTRUCTIONS = """Summarise the conversation above for the assistant that continues it. Start from the earlier
+summary if there is one and fold the new turns into it. Keep names, numbers, decisions, open questions and the user's
+preferences; drop greetings and repetition. Write at most 200 words."""
+
+# role, name and message framing the chat format adds to every message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def message_text(message: ChatMessageContent) -> str:
+    """The text of a message as the model sees it, including function calls and results."""
+    if message.content:
+        return message.content
+    return " ".join(
+        str(getattr(item, "result", None) or getattr(item, "arguments", None) or getattr(item, "name", None) or "")
+        for item in message.items
+    )
+
+
+def is_summary(message: ChatMessageContent) -> bool:
+    return bool(message.metadata) and SUMMARY_METADATA_KEY in message.metadata
+
+
+class TokenBudgetChatHistory(ChatHistoryReducer):
+    """
+    Description: TokenBudgetChatHistory is a chat history that stays within a token budget however long the
+    conversation gets.
+
+    The token count is kept up to date as messages are added (every message is counted once). When it passes
+    max_tokens, the older turns are compacted into one rolling summary in the background while the conversation
+    goes on: system messages and the most recent turns (at least keep_recent messages, up to half of
+    target_tokens) are kept as they are, everything before them plus the previous summary is summarised by the
+    chat service into a new summary message. A function call is never separated from its result.
+
+    It is a ChatHistoryReducer, so it can be the history of a ChatHistoryAgentThread and thread.reduce() waits
+    for (or runs) the compaction. For threads that live in a service (AzureAIAgentThread), keep a local copy
+    of the turns and send summary / recent_message_count() with the run instead.
+
+    Usage:
+        history = TokenBudgetChatHistory(service=chat_service, max_tokens=4000)
+        thread = ChatHistoryAgentThread(chat_history=history)
+        response = await agent.get_response(messages=user_input, thread=thread)
+        print(history.token_count, history.stats)
+    """
+
+    service: ChatCompletionClientBase = Field(..., exclude=True)
+    max_tokens: int = Field(default=4000, gt=0)
+    target_tokens: int | None = None
+    target_count: int = Field(default=4, gt=0, description="Recent messages that are always kept.")
+    auto_reduce: bool = True
+    summarization_instructions: str = SUMMARY_INSTRUCTIONS
+    token_counter: Callable[[str], int] = Field(default=count_tokens, exclude=True)
+
+    _message_tokens: dict = PrivateAttr(default_factory=dict)
+    _token_count: int = PrivateAttr(default=0)
+    _counted_messages: int = PrivateAttr(default=0)
+    _compaction: Any = PrivateAttr(default=None)
+    _stats: dict = PrivateAttr(default_factory=lambda: {"compactions": 0, "summarised_messages": 0, "failures": 0, "last_compaction_ms": None})
+
+    def __init__(self, service: ChatCompletionClientBase, max_tokens: int = 4000, keep_recent: int = 4, **kwargs):
+        super().__init__(service=service, max_tokens=max_tokens, target_count=keep_recent, **kwargs)
+
+    def __bool__(self) -> bool:
+        # an empty history is still this history, ChatHistoryAgentThread replaces a falsy one with a plain ChatHistory
+        return True
+
+    @property
+    def stats(self) -> dict:
+        return {**self._stats, "messages": len(self.messages), "tokens": self.token_count}
+
+    def _tokens(self, message: ChatMessageContent) -> int:
+        key = id(message)
+        if key not in self._message_tokens:
+            self._message_tokens[key] = self.token_counter(message_text(message)) + MESSAGE_OVERHEAD_TOKENS
+        return self._message_tokens[key]
+
+    def _recount(self):
+        self._message_tokens = {id(message): self._tokens(message) for message in self.messages}
+        self._token_count = sum(self._message_tokens.values())
+        self._counted_messages = len(self.messages)
+
+    @property
+    def token_count(self) -> int:
+        # messages added through add_message are counted as they come, anything else (clear, slicing) is recounted
+        if self._counted_messages != len(self.messages):
+            self._recount()
+        return self._token_count
+
+    def add_message(self, message, encoding: str | None = None, metadata: dict | None = None) -> None:
+        in_sync = self._counted_messages == len(self.messages)
+        super().add_message(message, encoding=encoding, metadata=metadata)
+        if in_sync:
+            self._token_count += self._tokens(self.messages[-1])
+            self._counted_messages += 1
+
+        if self.auto_reduce and self.token_count > self.max_tokens and not self.compacting:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                return  # no event loop to compact in, reduce() does it
+            self._compaction = loop.create_task(self._compact())
+
+    @property
+    def compacting(self) -> bool:
+        return self._compaction is not None and not self._compaction.done()
+
+    @property
+    def summary(self) -> str | None:
+        return next((message.content for message in self.messages if is_summary(message)), None)
+
+    def recent_message_count(self) -> int:
+        """Messages after the system messages and the summary, the turns the model sees verbatim."""
+        return sum(1 for message in self.messages if message.role != AuthorRole.SYSTEM and not is_summary(message))
+
+    def _boundary(self) -> int:
+        """Index of the first message that is kept verbatim."""
+        budget = (self.target_tokens or self.max_tokens * 3 // 4) // 2
+        index = len(self.messages)
+        kept_tokens = 0
+        kept = 0
+        while index > 0:
+            message = self.messages[index - 1]
+            if message.role == AuthorRole.SYSTEM or is_summary(message):
+                break
+            if kept >= self.target_count and kept_tokens + self._tokens(message) > budget:
+                break
+            kept_tokens += self._tokens(message)
+            kept += 1
+            index -= 1
+
+        # a function result needs the call before it
+        while index > 0 and index < len(self.messages) and (
+            self.messages[index].role == AuthorRole.TOOL
+            or any(isinstance(item, FunctionResultContent) for item in self.messages[index].items)
+        ):
+            index -= 1
+        return index
+
+    async def _compact(self) -> bool:
+        start = time.perf_counter()
+        boundary = self._boundary()
+        older = self.messages[:boundary]
+        to_summarise = [message for message in older if message.role != AuthorRole.SYSTEM and not is_summary(message)]
+        if not to_summarise:
+            return False
+        first_kept = self.messages[boundary] if boundary < len(self.messages) else None
+
+        conversation = ChatHistory()
+        if self.summary:
+            conversation.add_system_message(f"Summary of the conversation so far: {self.summary}")
+        for message in to_summarise:
+            conversation.add_message(ChatMessageContent(role=message.role, content=message_text(message), name=message.name))
+        conversation.add_user_message(self.summarization_instructions)
+
+        try:
+            summary = await self.service.get_chat_message_content(
+                chat_history=conversation,
+                settings=self.service.get_prompt_execution_settings_from_settings(PromptExecutionSettings()),
+            )
+        except Exception:
+            self._stats["failures"] += 1
+            logger.warning("Chat history compaction failed, the history stays as it is.", exc_info=True)
+            return False
+
+        # messages added while the summary was written stay; the summarised ones may have moved, not changed
+        if first_kept is None:
+            remainder = self.messages[len(older):]
+        else:
+            position = next((index for index, message in enumerate(self.messages) if message is first_kept), None)
+            if position is None:
+                return False  # the history was replaced meanwhile
+            remainder = self.messages[position:]
+
+        system = [message for message in older if message.role == AuthorRole.SYSTEM and not is_summary(message)]
+        summary_message = ChatMessageContent(
+            role=AuthorRole.ASSISTANT, content=summary.content if summary else "", metadata={SUMMARY_METADATA_KEY: True}
+        )
+        self.messages = [*system, summary_message, *remainder]
+        self._recount()
+
+        self._stats["compactions"] += 1
+        self._stats["summarised_messages"] += len(to_summarise)
+        self._stats["last_compaction_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        return True
+
+    async def reduce(self) -> "TokenBudgetChatHistory | None":
+        """Wait for a running compaction, or compact now when the history is over its budget."""
+        if self.compacting:
+            return self if await self._compaction else None
+        if self.token_count > self.max_tokens:
+            return self if await self._compact() else None
+        return None
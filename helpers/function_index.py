@@ -0,0 +1,161 @@
+import math
+import re
+from collections import Counter
+
+import numpy as np
+from semantic_kernel import Kernel
+from semantic_kernel.connectors.ai.function_choice_behavior import FunctionChoiceBehavior
+from semantic_kernel.functions import KernelFunction
+
+_WORD = re.compile(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])")
+_STOP_WORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "do", "for", "from", "give", "how", "in", "is", "it", "me",
+    "much", "my", "of", "on", "or", "please", "tell", "that", "the", "this", "to", "what", "who", "with", "you",
+}
+# words are compared by their first letters, so "divided" finds Divide and "greeting" finds greet
+STEM_LENGTH = 5
+# the words of a function's name say more about it than those of its description
+NAME_WEIGHT = 3
+
+
+def terms(text: str) -> list:
+    """Lower case word stems of text, camelCase and snake_case split, stop words dropped."""
+    return [word[:STEM_LENGTH] for word in (word.lower() for word in _WORD.findall(text or "")) if len(word) > 1 and word not in _STOP_WORDS]
+
+
+def function_terms(function: KernelFunction) -> Counter:
+    """What the index knows of a function: its name, plugin, description and the names and annotations of its parameters."""
+    counts = Counter(terms(function.name) * NAME_WEIGHT)
+    counts.update(terms(function.plugin_name))
+    counts.update(terms(function.description))
+    for parameter in function.metadata.parameters:
+        counts.update(terms(parameter.name))
+        counts.update(terms(parameter.description))
+    return counts
+
+
+class FunctionIndex:
+    """
+    Description: FunctionIndex picks the functions that are relevant to a request, so auto function calling
+    advertises those few instead of the schema of every function of every plugin.
+
+    Every function is indexed once by the words of its name, plugin, description and parameters (the Annotated
+    descriptions of native functions, the input variable descriptions of prompt functions), weighted by TF-IDF
+    into one normalised NumPy matrix. The index follows kernel.plugins: when a plugin is added or removed the
+    matrix is rebuilt, the words of functions that were indexed before are reused. A request is scored against
+    all functions with one matrix product and the top_k functions above min_score are advertised; functions in
+    always_include are always advertised. When nothing matches (a request worded outside the catalogue's
+    vocabulary), behavior() falls back to the fallback functions, by default the whole catalogue, like plain Auto().
+
+    Usage:
+        function_index = FunctionIndex(kernel, top_k=8)
+        settings = PromptExecutionSettings(function_choice_behavior=function_index.behavior(query))
+        result = await kernel.invoke_prompt(query, arguments=KernelArguments(settings=settings))
+    """
+
+    def __init__(
+        self,
+        kernel: Kernel,
+        top_k: int = 8,
+        min_score: float = 0.05,
+        always_include=(),
+        excluded_plugins=(),
+        fallback=None,
+    ):
+        self.kernel = kernel
+        self.top_k = top_k
+        self.min_score = min_score
+        self.always_include = list(always_include)
+        self.excluded_plugins = set(excluded_plugins)
+        self.fallback = list(fallback) if fallback is not None else None
+
+        self.names = []
+        self.vocabulary = {}
+        self.idf = np.zeros(0, dtype=np.float32)
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+        self._terms = {}  # fully qualified name -> Counter, kept across rebuilds
+        self._catalogue = None
+        self.stats = {"builds": 0, "queries": 0, "advertised": 0, "fallbacks": 0, "catalogue_size": 0}
+
+    def _catalogue_key(self) -> tuple:
+        return tuple(
+            (plugin_name, id(plugin), tuple(plugin.functions))
+            for plugin_name, plugin in self.kernel.plugins.items()
+            if plugin_name not in self.excluded_plugins
+        )
+
+    def refresh(self) -> "FunctionIndex":
+        """Rebuild the matrix if the kernel's plugins changed since the last build."""
+        catalogue = self._catalogue_key()
+        if catalogue == self._catalogue:
+            return self
+
+        functions = [
+            function
+            for plugin_name, plugin in self.kernel.plugins.items()
+            if plugin_name not in self.excluded_plugins
+            for function in plugin.functions.values()
+        ]
+        documents = []
+        for function in functions:
+            name = function.fully_qualified_name
+            if name not in self._terms:
+                self._terms[name] = function_terms(function)
+            documents.append(self._terms[name])
+
+        self.names = [function.fully_qualified_name for function in functions]
+        self.vocabulary = {term: column for column, term in enumerate(sorted({term for document in documents for term in document}))}
+        self.matrix = np.zeros((len(documents), len(self.vocabulary)), dtype=np.float32)
+        for row, document in enumerate(documents):
+            for term, count in document.items():
+                self.matrix[row, self.vocabulary[term]] = 1 + math.log(count)
+
+        document_frequency = np.count_nonzero(self.matrix, axis=0)
+        self.idf = (np.log((1 + len(documents)) / (1 + document_frequency)) + 1).astype(np.float32)
+        self.matrix *= self.idf
+        norms = np.linalg.norm(self.matrix, axis=1, keepdims=True)
+        self.matrix /= np.where(norms == 0, 1, norms)
+
+        self._catalogue = catalogue
+        self.stats["builds"] += 1
+        self.stats["catalogue_size"] = len(self.names)
+        return self
+
+    def rank(self, query: str) -> list:
+        """(fully qualified name, score) of every function that shares a word with the query, best first."""
+        self.refresh()
+        counts = Counter(term for term in terms(query) if term in self.vocabulary)
+        if not counts or not self.names:
+            return []
+
+        columns = np.fromiter((self.vocabulary[term] for term in counts), dtype=np.intp, count=len(counts))
+        weights = np.fromiter(((1 + math.log(count)) for count in counts.values()), dtype=np.float32, count=len(counts))
+        weights *= self.idf[columns]
+        weights /= np.linalg.norm(weights)
+        # only the query's columns take part, the product is as cheap as the query is short
+        scores = self.matrix[:, columns] @ weights
+
+        candidates = np.flatnonzero(scores > 0)
+        order = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(self.names[row], float(scores[row])) for row in order]
+
+    def select(self, query: str) -> list:
+        """Fully qualified names of the functions to advertise for the query."""
+        selected = [name for name, score in self.rank(query)[: self.top_k] if score >= self.min_score]
+        selected += [name for name in self.always_include if name not in selected]
+        self.stats["queries"] += 1
+        self.stats["advertised"] += len(selected)
+        return selected
+
+    def behavior(self, query: str, **kwargs) -> FunctionChoiceBehavior:
+        """FunctionChoiceBehavior.Auto limited to the selected functions, to the fallback ones when none was selected."""
+        selected = self.select(query)
+        if not selected:
+            self.stats["fallbacks"] += 1
+            if self.fallback is not None:
+                selected = self.fallback
+            elif self.excluded_plugins:
+                return FunctionChoiceBehavior.Auto(filters={"excluded_plugins": sorted(self.excluded_plugins)}, **kwargs)
+            else:
+                return FunctionChoiceBehavior.Auto(**kwargs)
+        return FunctionChoiceBehavior.Auto(filters={"included_functions": selected}, **kwargs)
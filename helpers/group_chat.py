@@ -0,0 +1,196 @@
+import asyncio
+import difflib
+import logging
+import time
+from typing import Callable
+
+from pydantic import Field, PrivateAttr
+from semantic_kernel.agents import Agent, AgentGroupChat
+from semantic_kernel.agents.strategies import TerminationStrategy
+from semantic_kernel.contents import AuthorRole, ChatMessageContent
+
+from helpers.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+
+def draft_similarity(previous: str, current: str, at_least: float = 0.0) -> float:
+    """
+    How much of a draft survived the revision, 0.0 (rewritten) to 1.0 (unchanged), compared word by word. A result
+    below at_least may be an upper bound only: quick_ratio is much cheaper than ratio and rules most revisions out.
+    """
+    if previous == current:
+        return 1.0
+    matcher = difflib.SequenceMatcher(None, previous.split(), current.split(), autojunk=False)
+    upper_bound = matcher.quick_ratio()
+    if upper_bound < at_least:
+        return upper_bound
+    return matcher.ratio()
+
+
+def message_usage(message: ChatMessageContent):
+    """Prompt + completion tokens the model reported for the message, None when it reported none."""
+    usage = (message.metadata or {}).get("usage")
+    if usage is None:
+        return None
+    return (getattr(usage, "prompt_tokens", 0) or 0) + (getattr(usage, "completion_tokens", 0) or 0)
+
+
+class ConvergenceTerminationStrategy(TerminationStrategy):
+    """
+    Description: ConvergenceTerminationStrategy ends a writer / reviewer group chat as soon as another round would
+    not be worth its cost, instead of only on the reviewer's approval or the iteration cap.
+
+    After every turn, in order of cost:
+    - budget: the chat has used max_tokens tokens (reported usage of every message, or an estimate of the prompt
+      and completion when the service reports none: an agent's turn reads the whole chat so far)
+    - convergence: the writer's new draft is at least similarity_threshold similar to its previous one, the
+      edits have converged and the reviewer would see the same article again
+    - approval: the approval strategy (a KernelFunctionTerminationStrategy, say) decides, only on the turns it
+      is scoped to, so the model is asked only when the cheap checks did not end the chat
+
+    reason says why the chat ended: "approved", "converged", "token_budget" or None. One instance per chat,
+    the reason and the token count belong to one article: reset() before the chat takes the next input.
+
+    Usage:
+        termination_strategy = ConvergenceTerminationStrategy(
+            writer_name=WRITER_NAME,
+            approval=KernelFunctionTerminationStrategy(agents=[agent_reviewer], function=termination_function, ...),
+            similarity_threshold=0.95,
+            max_tokens=20_000,
+            maximum_iterations=10,
+        )
+        chat = AgentGroupChat(agents=[agent_reviewer, agent_writer], termination_strategy=termination_strategy)
+    """
+
+    writer_name: str
+    approval: TerminationStrategy | None = None
+    similarity_threshold: float = Field(default=0.95, gt=0.0, le=1.0)
+    max_tokens: int | None = None
+    token_counter: Callable[[str], int] = Field(default=count_tokens, exclude=True)
+
+    reason: str | None = None
+    _tokens: int = PrivateAttr(default=0)
+    _counted: int = PrivateAttr(default=0)
+    _context: int = PrivateAttr(default=0)
+    _drafts_from: int = PrivateAttr(default=0)
+
+    @property
+    def tokens(self) -> int:
+        return self._tokens
+
+    def _count(self, history: list[ChatMessageContent]):
+        """Adds the messages since the last call to the token count, every message is counted once."""
+        if len(history) < self._counted:
+            self._tokens = self._counted = self._context = self._drafts_from = 0  # the chat was reset
+        for message in history[self._counted:]:
+            size = self.token_counter(message.content or "")
+            self._context += size
+            if message.role == AuthorRole.ASSISTANT:
+                reported = message_usage(message)
+                self._tokens += reported if reported is not None else self._context
+        self._counted = len(history)
+
+    def reset(self):
+        """Start on the next input: no reason, no tokens used and no drafts yet, the history before is kept out."""
+        self.reason = None
+        self._tokens = 0
+        self._drafts_from = self._counted
+
+    def drafts(self, history: list[ChatMessageContent]) -> list[str]:
+        return [message.content or "" for message in history[self._drafts_from:] if message.name == self.writer_name]
+
+    async def should_agent_terminate(self, agent: Agent, history: list[ChatMessageContent]) -> bool:
+        self._count(history)
+        if self.max_tokens and self._tokens >= self.max_tokens:
+            self.reason = "token_budget"
+            return True
+
+        if agent.name == self.writer_name:
+            drafts = self.drafts(history)
+            if len(drafts) >= 2:
+                similarity = draft_similarity(drafts[-2], drafts[-1], at_least=self.similarity_threshold)
+                if similarity >= self.similarity_threshold:
+                    self.reason = "converged"
+                    return True
+
+        if self.approval is not None and await self.approval.should_terminate(agent, history):
+            self.reason = "approved"
+            return True
+        return False
+
+
+class GroupChatRunner:
+    """
+    Description: GroupChatRunner writes many articles at the same time, each in its own group chat of the same
+    writer and reviewer agents.
+
+    Most of a group chat's time is spent waiting for the model, so running the chats one after another leaves the
+    deployment idle; here at most concurrency chats run at once. create_chat() makes a new AgentGroupChat (with
+    its own termination strategy) per article, the agents are shared, every chat keeps its own history and
+    agent threads.
+
+    Usage:
+        runner = GroupChatRunner(lambda: AgentGroupChat(agents=[agent_reviewer, agent_writer], ...), concurrency=8)
+        results = await runner.run(["Write an article about ...", "Write an article about ..."])
+        print(runner.report())
+    """
+
+    def __init__(self, create_chat: Callable[[], AgentGroupChat], writer_name: str = None, concurrency: int = 8):
+        self.create_chat = create_chat
+        self.writer_name = writer_name
+        self.concurrency = concurrency
+        self.results = []
+        self.elapsed = 0.0
+
+    async def _write(self, topic: str, semaphore: asyncio.Semaphore) -> dict:
+        async with semaphore:
+            chat = self.create_chat()
+            strategy = chat.termination_strategy
+            writer_name = self.writer_name or getattr(strategy, "writer_name", None)
+            start = time.perf_counter()
+            turns = 0
+            drafts = []
+            try:
+                await chat.add_chat_message(message=topic)
+                async for response in chat.invoke():
+                    if response is None or not response.name:
+                        continue
+                    turns += 1
+                    if response.name == writer_name:
+                        drafts.append(response.content)
+            except Exception as exc:
+                logger.warning(f"Group chat for {topic!r} failed: {exc}")
+                return {"topic": topic, "error": f"{type(exc).__name__}: {exc}", "turns": turns}
+
+            return {
+                "topic": topic,
+                "article": drafts[-1] if drafts else None,
+                "turns": turns,
+                "rounds": len(drafts),
+                "stop_reason": getattr(strategy, "reason", None) or ("approved" if chat.is_complete else "max_iterations"),
+                "tokens": getattr(strategy, "tokens", None),
+                "elapsed_s": round(time.perf_counter() - start, 2),
+            }
+
+    async def run(self, topics: list[str]) -> list[dict]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+        start = time.perf_counter()
+        self.results = await asyncio.gather(*[self._write(topic, semaphore) for topic in topics])
+        self.elapsed = time.perf_counter() - start
+        return self.results
+
+    def report(self) -> dict:
+        finished = [result for result in self.results if "error" not in result]
+        stop_reasons = {}
+        for result in finished:
+            stop_reasons[result["stop_reason"]] = stop_reasons.get(result["stop_reason"], 0) + 1
+        return {
+            "articles": len(self.results),
+            "failed": len(self.results) - len(finished),
+            "mean_rounds": round(sum(result["rounds"] for result in finished) / len(finished), 2) if finished else None,
+            "mean_chat_s": round(sum(result["elapsed_s"] for result in finished) / len(finished), 2) if finished else None,
+            "tokens": sum(result["tokens"] or 0 for result in finished),
+            "stop_reasons": stop_reasons,
+            "elapsed_s": round(self.elapsed, 2),
+        }
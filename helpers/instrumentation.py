@@ -0,0 +1,279 @@
+import contextvars
+import os
+import statistics
+import time
+from contextlib import contextmanager
+
+from opentelemetry.sdk.metrics import MeterProvider
+from opentelemetry.sdk.metrics.export import ConsoleMetricExporter, PeriodicExportingMetricReader
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+from opentelemetry.trace import Status, StatusCode
+from semantic_kernel import Kernel
+from semantic_kernel.connectors.ai.chat_completion_client_base import ChatCompletionClientBase
+from semantic_kernel.filters import FilterTypes, FunctionInvocationContext
+
+from helpers.service_hooks import wrap_chat_requests
+
+# the record of the kernel function the current task is running, model requests are counted on it
+_current_record = contextvars.ContextVar("kernel_instrumentation_record", default=None)
+
+
+def _otlp_exporters(endpoint: str):
+    try:
+        from opentelemetry.exporter.otlp.proto.http.metric_exporter import OTLPMetricExporter
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+    except ImportError as exc:
+        raise ImportError("exporting to an OTLP collector needs: pip install opentelemetry-exporter-otlp-proto-http") from exc
+
+    endpoint = endpoint.rstrip("/")
+    return OTLPSpanExporter(endpoint=f"{endpoint}/v1/traces"), OTLPMetricExporter(endpoint=f"{endpoint}/v1/metrics")
+
+
+def _file_exporters(path: str):
+    """
+    Spans and metrics as JSON lines, one file each, for reading with jq or loading into a notebook. The exporters
+    do not close their files, the caller does (after shutting the providers down).
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    root, _ = os.path.splitext(path)
+    span_file = open(path, "a", encoding="utf-8")
+    metric_file = open(f"{root}.metrics.jsonl", "a", encoding="utf-8")
+    return (
+        ConsoleSpanExporter(out=span_file, formatter=lambda span: span.to_json(indent=None) + "\n"),
+        ConsoleMetricExporter(out=metric_file, formatter=lambda metrics: metrics.to_json(indent=None) + "\n"),
+        [span_file, metric_file],
+    )
+
+
+class KernelInstrumentation:
+    """
+    Description: KernelInstrumentation records every kernel function invocation, native or prompt, as an
+    OpenTelemetry span and in histograms, so the hot path of a run can be found without reading logs.
+
+    Per invocation it records:
+    - wall time, and queue time: for prompt functions the time until the first model request is sent
+      (rendering, filters, waiting for a cache or a rate limiter)
+    - the model round trips made by the function itself and their prompt / completion tokens; every round trip
+      is a child span of the function's span, nested invocations (auto function calling, plan steps) get
+      their own spans
+    - cache hits of the ResponseCache
+
+    Spans and metrics go to an OTLP collector when otlp_endpoint is given (needs the
+    opentelemetry-exporter-otlp-proto-http package), otherwise to JSON lines files: path for the spans and
+    <path without extension>.metrics.jsonl for the metrics. summary() has the same numbers per function in
+    process. shutdown() (or leaving a with block) exports what is still buffered and closes the files.
+
+    Usage:
+        with KernelInstrumentation(path="../.telemetry/spans.jsonl") as instrumentation:
+            instrumentation.instrument(kernel)
+            await kernel.invoke(function, arguments)
+            print(instrumentation.format_summary())
+    """
+
+    def __init__(self, path: str = None, otlp_endpoint: str = None, service_name: str = "semantic-kernel-samples"):
+        self._files = []
+        self._closed = False
+        if otlp_endpoint:
+            span_exporter, metric_exporter = _otlp_exporters(otlp_endpoint)
+        else:
+            span_exporter, metric_exporter, self._files = _file_exporters(path or os.path.join(".telemetry", "spans.jsonl"))
+
+        resource = Resource.create({"service.name": service_name})
+        self.tracer_provider = TracerProvider(resource=resource)
+        self.tracer_provider.add_span_processor(BatchSpanProcessor(span_exporter))
+        self.meter_provider = MeterProvider(
+            resource=resource,
+            metric_readers=[PeriodicExportingMetricReader(metric_exporter, export_interval_millis=10_000)],
+        )
+        self.tracer = self.tracer_provider.get_tracer(__name__)
+
+        meter = self.meter_provider.get_meter(__name__)
+        self.duration = meter.create_histogram("kernel.function.duration", unit="ms", description="wall time of a function invocation")
+        self.queue_time = meter.create_histogram("kernel.function.queue_time", unit="ms", description="time until the first model request")
+        self.round_trip_duration = meter.create_histogram("kernel.llm.duration", unit="ms", description="wall time of a model request")
+        self.tokens = meter.create_histogram("kernel.llm.tokens", unit="{token}", description="tokens of a model request")
+        self.round_trips = meter.create_counter("kernel.llm.round_trips", description="model requests")
+        self.cache_hits = meter.create_counter("kernel.function.cache_hits", description="invocations answered from a cache")
+        self.errors = meter.create_counter("kernel.function.errors", description="invocations that raised")
+
+        self.records = {}  # function name -> list of per invocation records
+
+    @classmethod
+    def from_env(cls, default_path: str = None) -> "KernelInstrumentation":
+        """OTLP when OTEL_EXPORTER_OTLP_ENDPOINT is set, otherwise the KERNEL_TELEMETRY_FILE / default_path file."""
+        return cls(
+            path=os.getenv("KERNEL_TELEMETRY_FILE", default_path),
+            otlp_endpoint=os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT"),
+            service_name=os.getenv("OTEL_SERVICE_NAME", "semantic-kernel-samples"),
+        )
+
+    def instrument(self, kernel: Kernel) -> "KernelInstrumentation":
+        kernel.add_filter(FilterTypes.FUNCTION_INVOCATION, self._function_invocation_filter)
+        for service in kernel.services.values():
+            if isinstance(service, ChatCompletionClientBase):
+                self._instrument_service(service)
+        return self
+
+    def _instrument_service(self, service: ChatCompletionClientBase):
+        model = getattr(service, "ai_model_id", None) or type(service).__name__
+
+        def wrap(inner):
+            async def instrumented(chat_history, settings):
+                with self._round_trip(model) as observe:
+                    messages = await inner(chat_history, settings)
+                    observe(messages)
+                    return messages
+
+            return instrumented
+
+        def wrap_streaming(inner_streaming):
+            async def instrumented_streaming(chat_history, settings, *args, **kwargs):
+                with self._round_trip(model) as observe:
+                    async for messages in inner_streaming(chat_history, settings, *args, **kwargs):
+                        observe(messages)
+                        yield messages
+
+            return instrumented_streaming
+
+        wrap_chat_requests(service, self, wrap, wrap_streaming)
+
+    @contextmanager
+    def _round_trip(self, model: str):
+        """Times one model request; the caller passes every response (or chunk) to the yielded observe()."""
+        record = _current_record.get()
+        start = time.perf_counter()
+        if record is not None and record["queue_ms"] is None:
+            record["queue_ms"] = (start - record["start"]) * 1000
+
+        # a leaf span that is never made current, a streaming request yields to its consumer while it is open
+        span = self.tracer.start_span(f"chat.completion {model}", attributes={"gen_ai.request.model": model})
+        usages = []
+
+        def observe(messages):
+            usage = next((message.metadata.get("usage") for message in messages if message.metadata.get("usage")), None)
+            if usage is not None:
+                usages.append(usage)
+
+        try:
+            yield observe
+        except Exception as exc:
+            span.record_exception(exc)
+            span.set_status(Status(StatusCode.ERROR, str(exc)))
+            raise
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            prompt_tokens = sum(usage.prompt_tokens or 0 for usage in usages)
+            completion_tokens = sum(usage.completion_tokens or 0 for usage in usages)
+            span.set_attributes({"gen_ai.usage.input_tokens": prompt_tokens, "gen_ai.usage.output_tokens": completion_tokens})
+            span.end()
+
+            attributes = {"model": model}
+            self.round_trips.add(1, attributes)
+            self.round_trip_duration.record(elapsed, attributes)
+            self.tokens.record(prompt_tokens, {**attributes, "token.type": "prompt"})
+            self.tokens.record(completion_tokens, {**attributes, "token.type": "completion"})
+            if record is not None:
+                record["llm_round_trips"] += 1
+                record["llm_ms"] += elapsed
+                record["prompt_tokens"] += prompt_tokens
+                record["completion_tokens"] += completion_tokens
+
+    async def _function_invocation_filter(self, context: FunctionInvocationContext, next):
+        function = context.function
+        name = function.fully_qualified_name
+        record = {
+            "start": time.perf_counter(),
+            "queue_ms": None,
+            "llm_round_trips": 0,
+            "llm_ms": 0.0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "cache_hit": False,
+            "error": None,
+        }
+        attributes = {"function": name, "plugin": function.plugin_name or "", "is_prompt": function.is_prompt}
+
+        with self.tracer.start_as_current_span(f"invoke {name}") as span:
+            span.set_attributes({**attributes, "streaming": context.is_streaming})
+            token = _current_record.set(record)
+            try:
+                await next(context)
+            except Exception as exc:
+                record["error"] = type(exc).__name__
+                span.record_exception(exc)
+                span.set_status(Status(StatusCode.ERROR, str(exc)))
+                self.errors.add(1, attributes)
+                raise
+            finally:
+                _current_record.reset(token)
+                record["wall_ms"] = (time.perf_counter() - record["start"]) * 1000
+                metadata = context.result.metadata if context.result is not None else {}
+                record["cache_hit"] = bool(metadata.get("cache_hit"))
+
+                span.set_attributes({
+                    "wall_ms": round(record["wall_ms"], 3),
+                    "queue_ms": round(record["queue_ms"] or 0.0, 3),
+                    "llm.round_trips": record["llm_round_trips"],
+                    "llm.prompt_tokens": record["prompt_tokens"],
+                    "llm.completion_tokens": record["completion_tokens"],
+                    "cache_hit": record["cache_hit"],
+                })
+                status = {**attributes, "status": "error" if record["error"] else "ok"}
+                self.duration.record(record["wall_ms"], status)
+                if record["queue_ms"] is not None:
+                    self.queue_time.record(record["queue_ms"], attributes)
+                if record["cache_hit"]:
+                    self.cache_hits.add(1, attributes)
+                self.records.setdefault(name, []).append(record)
+
+    def summary(self) -> dict:
+        """Per function: calls, wall time percentiles and totals, model round trips, tokens, cache hits, errors."""
+        summary = {}
+        for name, records in self.records.items():
+            wall = sorted(record["wall_ms"] for record in records)
+            queue = [record["queue_ms"] for record in records if record["queue_ms"] is not None]
+            summary[name] = {
+                "calls": len(records),
+                "wall_ms_total": round(sum(wall), 2),
+                "wall_ms_p50": round(statistics.median(wall), 2),
+                "wall_ms_p95": round(wall[min(len(wall) - 1, int(len(wall) * 0.95))], 2),
+                "queue_ms_mean": round(statistics.fmean(queue), 2) if queue else None,
+                "llm_ms_total": round(sum(record["llm_ms"] for record in records), 2),
+                "llm_round_trips": sum(record["llm_round_trips"] for record in records),
+                "prompt_tokens": sum(record["prompt_tokens"] for record in records),
+                "completion_tokens": sum(record["completion_tokens"] for record in records),
+                "cache_hits": sum(record["cache_hit"] for record in records),
+                "errors": sum(record["error"] is not None for record in records),
+            }
+        # the function that took the most time first
+        return dict(sorted(summary.items(), key=lambda item: item[1]["wall_ms_total"], reverse=True))
+
+    def format_summary(self) -> str:
+        lines = [f"  {'function':<40} {'calls':>6} {'total ms':>10} {'p50 ms':>9} {'p95 ms':>9} {'llm':>5} {'tokens':>8} {'cached':>6}"]
+        for name, stats in self.summary().items():
+            lines.append(
+                f"  {name:<40} {stats['calls']:>6} {stats['wall_ms_total']:>10.1f} {stats['wall_ms_p50']:>9.1f} "
+                f"{stats['wall_ms_p95']:>9.1f} {stats['llm_round_trips']:>5} "
+                f"{stats['prompt_tokens'] + stats['completion_tokens']:>8} {stats['cache_hits']:>6}"
+            )
+        return "\n".join(lines)
+
+    def shutdown(self):
+        """Export what is still buffered and close the span and metric files; a second call does nothing."""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self.tracer_provider.shutdown()
+            self.meter_provider.shutdown()
+        finally:
+            for file in self._files:
+                file.close()
+
+    def __enter__(self) -> "KernelInstrumentation":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
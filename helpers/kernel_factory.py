@@ -0,0 +1,109 @@
+import os
+import threading
+
+import httpx
+from dotenv import load_dotenv
+from openai import AsyncAzureOpenAI, DefaultAsyncHttpxClient
+from semantic_kernel import Kernel
+from semantic_kernel.connectors.ai.open_ai import AzureChatCompletion
+from semantic_kernel.connectors.ai.open_ai.const import DEFAULT_AZURE_API_VERSION
+from semantic_kernel.functions import KernelPlugin
+
+from helpers.mock_chat_completion import MockChatCompletion
+from helpers.prompt_registry import PromptTemplateRegistry
+from helpers.service_hooks import service_view
+
+
+class KernelFactory:
+    """
+    Description: KernelFactory hands out ready to use kernels that share everything that is expensive to build.
+
+    The chat completion service is created once, on first use: MockChatCompletion when MOCK_CHAT_COMPLETION is
+    set, otherwise AzureChatCompletion over one AsyncAzureOpenAI client with a keep-alive connection pool of
+    max_connections, so every kernel reuses the same HTTP connections. Prompt plugins come from the
+    PromptTemplateRegistry (parsed once, reloaded when their files change) and native plugins are turned into
+    kernel functions once. create_kernel() then only builds the Kernel object around these shared parts.
+
+    Every kernel has its own services and plugins dictionaries, its own view of the chat service (service_view:
+    same client and connection pool, but request wrappers such as KernelInstrumentation's stay on that kernel)
+    and its own copy of every plugin (the kernel functions in them are shared, they are not changed once built),
+    so filters, services, plugins or functions added to one kernel do not show up in the others.
+
+    The shared service and its connection pool belong to the event loop that first uses them: keep-alive
+    connections opened on one loop cannot be used from another, so a script drives all of its kernels from a
+    single asyncio.run(main()), not from one asyncio.run() per call.
+
+    Usage:
+        factory = KernelFactory.default()
+        kernel = factory.create_kernel(prompt_plugins=["basic_plugin"], plugins={"MathPlugin": Math})
+    """
+
+    _default = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, service_id: str = "default", registry: PromptTemplateRegistry = None, max_connections: int = 100):
+        load_dotenv()
+        self.service_id = service_id
+        self.registry = registry or PromptTemplateRegistry.default()
+        self.max_connections = max_connections
+        self._services = None
+        self._native_plugins = {}  # plugin name -> (class or instance it was created from, plugin)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def default(cls) -> "KernelFactory":
+        """The process wide factory for the "default" service."""
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls()
+            return cls._default
+
+    def create_chat_service(self):
+        if os.getenv("MOCK_CHAT_COMPLETION"):
+            #offline run against the local stand-in service, see helpers/mock_chat_completion.py
+            return MockChatCompletion.from_env(self.service_id)
+
+        deployment_name = os.getenv("AZURE_OPENAI_CHAT_COMPLETION_MODEL")
+        client = AsyncAzureOpenAI(
+            api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+            azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+            azure_deployment=deployment_name,
+            api_version=os.getenv("AZURE_OPENAI_API_VERSION", DEFAULT_AZURE_API_VERSION),
+            http_client=DefaultAsyncHttpxClient(
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections)
+            ),
+        )
+        return AzureChatCompletion(service_id=self.service_id, deployment_name=deployment_name, async_client=client)
+
+    @property
+    def services(self) -> dict:
+        if self._services is None:
+            with self._lock:
+                if self._services is None:
+                    self._services = {self.service_id: self.create_chat_service()}
+        return self._services
+
+    def native_plugin(self, name: str, source) -> KernelPlugin:
+        """The plugin of a class (instantiated once) or of an instance, created on first use."""
+        entry = self._native_plugins.get(name)
+        if entry is not None and entry[0] is source:
+            return entry[1]
+
+        with self._lock:
+            instance = source() if isinstance(source, type) else source
+            plugin = KernelPlugin.from_object(plugin_name=name, plugin_instance=instance)
+            self._native_plugins[name] = (source, plugin)
+            return plugin
+
+    @staticmethod
+    def _copy_plugin(plugin: KernelPlugin) -> KernelPlugin:
+        # a new plugin around a new functions dictionary, without validating (and copying) every function again
+        return KernelPlugin.model_construct(name=plugin.name, description=plugin.description, functions=dict(plugin.functions))
+
+    def create_kernel(self, prompt_plugins=(), plugins: dict = None) -> Kernel:
+        """A kernel with the shared services, the named prompt plugins and the native plugins {name: class or instance}."""
+        kernel_plugins = {name: self._copy_plugin(self.registry.plugin(name)) for name in prompt_plugins}
+        for name, source in (plugins or {}).items():
+            kernel_plugins[name] = self._copy_plugin(self.native_plugin(name, source))
+        services = {service_id: service_view(service) for service_id, service in self.services.items()}
+        return Kernel(services=services, plugins=kernel_plugins)
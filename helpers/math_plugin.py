@@ -0,0 +1,196 @@
+import ast
+import math
+import operator
+from typing import Annotated
+
+import numpy as np
+from semantic_kernel.functions.kernel_function_decorator import kernel_function
+
+MAX_EXPRESSION_LENGTH = 2000
+MAX_EXPONENT = 1000
+# nesting of the parsed expression, "-" * 1990 + "1" fits in MAX_EXPRESSION_LENGTH but not in the Python stack
+MAX_DEPTH = 250
+
+_BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+}
+_UNARY_OPERATORS = {ast.UAdd: operator.pos, ast.USub: operator.neg}
+_FUNCTIONS = {
+    "sqrt": math.sqrt,
+    "abs": abs,
+    "round": round,
+    "min": min,
+    "max": max,
+    "floor": math.floor,
+    "ceil": math.ceil,
+    "log": math.log,
+    "log10": math.log10,
+    "exp": math.exp,
+    "sin": math.sin,
+    "cos": math.cos,
+    "tan": math.tan,
+}
+_CONSTANTS = {"pi": math.pi, "e": math.e}
+
+
+def _evaluate_node(node: ast.AST, depth: int = 0) -> float:
+    if depth > MAX_DEPTH:
+        raise ValueError(f"expression is nested deeper than {MAX_DEPTH} levels")
+    depth += 1
+    if isinstance(node, ast.Expression):
+        return _evaluate_node(node.body, depth)
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        # floats only, so 9 ** 999 overflows instead of building a huge integer
+        return float(node.value)
+    if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPERATORS:
+        left, right = _evaluate_node(node.left, depth), _evaluate_node(node.right, depth)
+        if isinstance(node.op, ast.Pow) and abs(right) > MAX_EXPONENT:
+            raise ValueError(f"exponent {right:g} is larger than {MAX_EXPONENT}")
+        return float(_BINARY_OPERATORS[type(node.op)](left, right))
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPERATORS:
+        return _UNARY_OPERATORS[type(node.op)](_evaluate_node(node.operand, depth))
+    if isinstance(node, ast.Name) and node.id in _CONSTANTS:
+        return _CONSTANTS[node.id]
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in _FUNCTIONS and not node.keywords:
+        return float(_FUNCTIONS[node.func.id](*[_evaluate_node(argument, depth) for argument in node.args]))
+    raise ValueError(f"unsupported element: {ast.unparse(node) if isinstance(node, ast.AST) else node}")
+
+
+def evaluate(expression: str) -> float:
+    """
+    Value of an arithmetic expression: numbers, + - * / // % ** and parentheses, the constants pi and e and the
+    functions sqrt, abs, round, min, max, floor, ceil, log, log10, exp, sin, cos and tan. Nothing else is
+    evaluated: the expression is parsed, never passed to eval. Raises ValueError for anything else.
+    """
+    if len(expression) > MAX_EXPRESSION_LENGTH:
+        raise ValueError(f"expression is longer than {MAX_EXPRESSION_LENGTH} characters")
+    try:
+        tree = ast.parse(expression.strip().replace("^", "**"), mode="eval")
+        return _evaluate_node(tree)
+    except SyntaxError as exc:
+        raise ValueError(f"not an arithmetic expression: {exc.msg}") from exc
+    except (ZeroDivisionError, OverflowError, TypeError) as exc:
+        raise ValueError(str(exc)) from exc
+    except (RecursionError, MemoryError) as exc:
+        # the parser itself can run out of stack or memory on pathological input
+        raise ValueError("expression is too complex") from exc
+
+
+def _operands(numbers1: list[float], numbers2: list[float]):
+    left = np.asarray(numbers1, dtype=np.float64)
+    right = np.asarray(numbers2, dtype=np.float64)
+    if left.shape != right.shape and right.size != 1:
+        raise ValueError(f"numbers1 has {left.size} numbers and numbers2 {right.size}, give as many or just one")
+    return left, right
+
+
+class BatchMath:
+    """
+    Description: BatchMath holds Math plugin functions that do many calculations in one tool call, so a request
+    with fifty calculations does not take fifty tool calls and several model round trips.
+
+    - AddBatch, SubtractBatch, MultiplyBatch, DivideBatch and SqrtBatch work on lists of operands with NumPy,
+      element by element (a single number2 applies to every number1); a division by zero gives inf or nan
+    - Evaluate and EvaluateAll compute whole arithmetic expressions, parsed safely (see evaluate)
+
+    The Math plugins of the samples extend it, so the scalar functions stay as they are.
+
+    Usage:
+        class Math(BatchMath):
+            ...scalar kernel functions...
+        kernel.add_plugin(Math(), plugin_name="MathPlugin")
+    """
+
+    @kernel_function(
+        description="Add many pairs of numbers in one call: returns numbers1[i] + numbers2[i] for every i.",
+        name="AddBatch",
+    )
+    def add_batch(
+        self,
+        numbers1: Annotated[list[float], "the first numbers to add"],
+        numbers2: Annotated[list[float], "the numbers to add to them, as many as numbers1 or just one"],
+    ) -> Annotated[list[float], "the sums, in the order of the operands"]:
+        left, right = _operands(numbers1, numbers2)
+        return np.add(left, right).tolist()
+
+    @kernel_function(
+        description="Subtract many pairs of numbers in one call: returns numbers1[i] - numbers2[i] for every i.",
+        name="SubtractBatch",
+    )
+    def subtract_batch(
+        self,
+        numbers1: Annotated[list[float], "the numbers to subtract from"],
+        numbers2: Annotated[list[float], "the numbers to subtract, as many as numbers1 or just one"],
+    ) -> Annotated[list[float], "the differences, in the order of the operands"]:
+        left, right = _operands(numbers1, numbers2)
+        return np.subtract(left, right).tolist()
+
+    @kernel_function(
+        description="Multiply many pairs of numbers in one call: returns numbers1[i] * numbers2[i] for every i.",
+        name="MultiplyBatch",
+    )
+    def multiply_batch(
+        self,
+        numbers1: Annotated[list[float], "the first numbers to multiply"],
+        numbers2: Annotated[list[float], "the numbers to multiply them by, as many as numbers1 or just one"],
+    ) -> Annotated[list[float], "the products, in the order of the operands"]:
+        left, right = _operands(numbers1, numbers2)
+        return np.multiply(left, right).tolist()
+
+    @kernel_function(
+        description="Divide many pairs of numbers in one call: returns numbers1[i] / numbers2[i] for every i.",
+        name="DivideBatch",
+    )
+    def divide_batch(
+        self,
+        numbers1: Annotated[list[float], "the numbers to divide"],
+        numbers2: Annotated[list[float], "the numbers to divide by, as many as numbers1 or just one"],
+    ) -> Annotated[list[float], "the quotients, in the order of the operands"]:
+        left, right = _operands(numbers1, numbers2)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.divide(left, right).tolist()
+
+    @kernel_function(
+        description="Take the square root of many numbers in one call.",
+        name="SqrtBatch",
+    )
+    def square_root_batch(
+        self,
+        numbers1: Annotated[list[float], "the numbers to take the square root of"],
+    ) -> Annotated[list[float], "the square roots, in the order of the numbers"]:
+        with np.errstate(invalid="ignore"):
+            return np.sqrt(np.asarray(numbers1, dtype=np.float64)).tolist()
+
+    @kernel_function(
+        description="Compute an arithmetic expression such as (12.5 * 4 - 3) / sqrt(16) in one call. Supports "
+        "+ - * / // % ** and parentheses, pi, e, sqrt, abs, round, min, max, floor, ceil, log, log10, exp, sin, cos, tan.",
+        name="Evaluate",
+    )
+    def evaluate(
+        self,
+        expression: Annotated[str, "the arithmetic expression"],
+    ) -> Annotated[float, "the value of the expression"]:
+        return evaluate(expression)
+
+    @kernel_function(
+        description="Compute many arithmetic expressions in one call, see Evaluate for what an expression can contain.",
+        name="EvaluateAll",
+    )
+    def evaluate_all(
+        self,
+        expressions: Annotated[list[str], "the arithmetic expressions"],
+    ) -> Annotated[list, "the value of every expression, or the reason it could not be computed"]:
+        results = []
+        for expression in expressions:
+            try:
+                results.append(evaluate(expression))
+            except ValueError as exc:
+                # one bad expression does not cost the results of the others
+                results.append(f"error: {exc}")
+        return results
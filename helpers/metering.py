@@ -0,0 +1,143 @@
+import contextvars
+import time
+from contextlib import contextmanager
+
+from semantic_kernel import Kernel
+from semantic_kernel.connectors.ai.chat_completion_client_base import ChatCompletionClientBase
+from semantic_kernel.filters import AutoFunctionInvocationContext, FilterTypes, FunctionInvocationContext
+
+from helpers.service_hooks import wrap_chat_requests
+
+# counters of the unit of work (a query, a batch item) the current task belongs to
+_current_counters = contextvars.ContextVar("chat_completion_meter_counters", default=None)
+# the plan whose steps are being counted: names of its step functions and (start, end) of every step that ran
+_current_plan = contextvars.ContextVar("chat_completion_meter_plan", default=None)
+# set while a plan step runs, functions it calls itself are not steps
+_in_plan_step = contextvars.ContextVar("chat_completion_meter_in_plan_step", default=False)
+
+
+def new_counters() -> dict:
+    return {
+        "llm_round_trips": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "tool_calls": 0,
+        "parallel_tool_calls": 0,
+        "serial_tool_calls": 0,
+        "tool_rounds": 0,
+    }
+
+
+class ChatCompletionMeter:
+    """
+    Description: ChatCompletionMeter counts what a chat completion service actually sends to the model.
+
+    The service's own request methods are wrapped, so every round trip is counted, including the extra requests
+    of the auto function calling loop, and the token usage reported by the model is added up. Tool calls are
+    counted by an auto function invocation filter: calls that were requested together in one round run in
+    parallel, a single call per round is serial. The steps of a plan run inside plan_steps() are counted by a
+    function invocation filter as they actually run: a step that overlapped another step ran in parallel.
+
+    Counters are kept in total and, inside track(), for the current unit of work only, so concurrent queries
+    do not mix their numbers.
+
+    Usage:
+        meter = ChatCompletionMeter(kernel.get_service(service_id)).attach(kernel)
+        with meter.track() as counters:
+            await kernel.invoke_prompt(query, arguments=arguments)
+        print(counters, meter.totals)
+    """
+
+    def __init__(self, service: ChatCompletionClientBase):
+        self.service = service
+        self.totals = new_counters()
+
+        def wrap(inner):
+            async def metered(chat_history, settings):
+                messages = await inner(chat_history, settings)
+                self._count_request(messages)
+                return messages
+
+            return metered
+
+        def wrap_streaming(inner_streaming):
+            async def metered_streaming(chat_history, settings, *args, **kwargs):
+                usage_seen = False
+                async for messages in inner_streaming(chat_history, settings, *args, **kwargs):
+                    if not usage_seen and any(message.metadata.get("usage") for message in messages):
+                        # the usage is sent once per request, on the last chunk
+                        usage_seen = True
+                        self._count_request(messages)
+                    yield messages
+                if not usage_seen:
+                    self._count_request([])
+
+            return metered_streaming
+
+        wrap_chat_requests(service, self, wrap, wrap_streaming)
+
+    def _add(self, name: str, value: int = 1):
+        self.totals[name] += value
+        counters = _current_counters.get()
+        if counters is not None:
+            counters[name] += value
+
+    def _count_request(self, messages: list):
+        self._add("llm_round_trips")
+        usage = next((message.metadata.get("usage") for message in messages if message.metadata.get("usage")), None)
+        if usage is not None:
+            self._add("prompt_tokens", usage.prompt_tokens or 0)
+            self._add("completion_tokens", usage.completion_tokens or 0)
+
+    async def _auto_function_invocation_filter(self, context: AutoFunctionInvocationContext, next):
+        self._add("tool_calls")
+        self._add("parallel_tool_calls" if context.function_count > 1 else "serial_tool_calls")
+        if context.function_sequence_index == 0:
+            self._add("tool_rounds")
+        await next(context)
+
+    async def _function_invocation_filter(self, context: FunctionInvocationContext, next):
+        plan = _current_plan.get()
+        if plan is None or _in_plan_step.get() or context.function.fully_qualified_name not in plan["functions"]:
+            await next(context)
+            return
+
+        token = _in_plan_step.set(True)
+        start = time.perf_counter()
+        try:
+            await next(context)
+        finally:
+            # a step that raised was still called
+            plan["steps"].append((start, time.perf_counter()))
+            _in_plan_step.reset(token)
+
+    def attach(self, kernel: Kernel) -> "ChatCompletionMeter":
+        kernel.add_filter(FilterTypes.AUTO_FUNCTION_INVOCATION, self._auto_function_invocation_filter)
+        kernel.add_filter(FilterTypes.FUNCTION_INVOCATION, self._function_invocation_filter)
+        return self
+
+    @contextmanager
+    def plan_steps(self, plan):
+        """
+        Count the steps of plan that run inside the block (Plan.invoke or ParallelPlanExecutor), when they run:
+        a plan that fails part-way only counts the steps it got to.
+        """
+        steps = []
+        token = _current_plan.set({"functions": {step.metadata.fully_qualified_name for step in plan._steps}, "steps": steps})
+        try:
+            yield
+        finally:
+            _current_plan.reset(token)
+            for index, (start, end) in enumerate(steps):
+                overlapped = any(other != index and other_start < end and start < other_end for other, (other_start, other_end) in enumerate(steps))
+                self._add("tool_calls")
+                self._add("parallel_tool_calls" if overlapped else "serial_tool_calls")
+
+    @contextmanager
+    def track(self):
+        counters = new_counters()
+        token = _current_counters.set(counters)
+        try:
+            yield counters
+        finally:
+            _current_counters.reset(token)
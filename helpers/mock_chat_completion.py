@@ -0,0 +1,471 @@
+import asyncio
+import contextvars
+import itertools
+import json
+import os
+import random
+import re
+import time
+from collections import deque
+from typing import Any, Callable, ClassVar
+from xml.sax.saxutils import quoteattr
+
+import httpx
+import openai
+from pydantic import Field, PrivateAttr
+
+from semantic_kernel.connectors.ai.chat_completion_client_base import ChatCompletionClientBase
+from semantic_kernel.connectors.ai.completion_usage import CompletionUsage
+from semantic_kernel.connectors.ai.function_calling_utils import update_settings_from_function_call_configuration
+from semantic_kernel.connectors.ai.open_ai import OpenAIChatPromptExecutionSettings
+from semantic_kernel.contents import (
+    AuthorRole,
+    ChatHistory,
+    ChatMessageContent,
+    FunctionCallContent,
+    FunctionResultContent,
+    StreamingChatMessageContent,
+)
+from semantic_kernel.contents.utils.finish_reason import FinishReason
+from semantic_kernel.exceptions import ServiceResponseException
+from semantic_kernel.functions import KernelFunctionMetadata
+
+# the kernel of the current request, the base class only hands it to the function calling loop
+_current_kernel = contextvars.ContextVar("mock_chat_completion_kernel", default=None)
+# how many mock requests are on the stack: prompt functions called as tools run inside the caller's request
+_depth = contextvars.ContextVar("mock_chat_completion_depth", default=0)
+
+_WORD = re.compile(r"[A-Za-z]+|\d+(?:\.\d+)?")
+_NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+_STOP_WORDS = {"a", "an", "and", "the", "to", "of", "is", "who", "me", "my", "for", "how", "much", "what", "by", "tell"}
+
+
+# region latency distributions, each returns a callable(rng) -> seconds
+
+
+def fixed(seconds: float) -> Callable:
+    return lambda rng: seconds
+
+
+def uniform(low: float, high: float) -> Callable:
+    return lambda rng: rng.uniform(low, high)
+
+
+def lognormal(median: float, sigma: float = 0.5) -> Callable:
+    """Long tailed like a real endpoint: most calls close to the median, a few much slower."""
+    return lambda rng: median * rng.lognormvariate(0, sigma) if median > 0 else 0.0
+
+
+# endregion
+
+
+def approx_tokens(text: str) -> int:
+    # ~4 characters per token for English, good enough to compare runs without a tokenizer download
+    return max(1, len(text or "") // 4)
+
+
+class MockReply:
+    """What the mock answers with: text, or function calls given as (fully qualified name, arguments) pairs."""
+
+    def __init__(self, content: str = "", function_calls=()):
+        self.content = content
+        self.function_calls = list(function_calls)
+
+
+class MockRequest:
+    """Everything a responder can look at to decide on a reply."""
+
+    def __init__(self, chat_history: ChatHistory, settings, kernel, functions: list, nested: bool = False):
+        self.chat_history = chat_history
+        self.settings = settings
+        self.kernel = kernel
+        self.functions = functions  # metadata of the functions the model may call, empty without function calling
+        self.nested = nested  # True for a prompt function that was itself called as a tool
+
+        messages = chat_history.messages
+        self.last_message = messages[-1] if messages else None
+        self.text = "\n".join(str(message.content) for message in messages if message.role == AuthorRole.USER)
+        self.prompt = "\n".join(str(message.content) for message in messages)
+
+
+# region responders: callable(MockRequest) -> MockReply | str | None, the first one that answers wins
+
+
+def rule(pattern: str, reply) -> Callable:
+    """Canned reply for requests whose user text matches pattern; reply is a str, a MockReply or a callable."""
+    compiled = re.compile(pattern, re.IGNORECASE | re.DOTALL)
+
+    def responder(request: MockRequest):
+        match = compiled.search(request.text)
+        if not match:
+            return None
+        return reply(request, match) if callable(reply) else reply
+
+    return responder
+
+
+def _name_words(name: str) -> set:
+    return {word.lower() for word in re.findall(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])", name) if len(word) >= 3}
+
+
+def _refers_to(word: str, name: str) -> bool:
+    word = word.lower()
+    shared = len(os.path.commonprefix([word, name]))
+    # "divided", "multiplied" and "greet" all refer to their function, "add" and "address" do not
+    return word == name or (shared >= 4 and shared >= min(len(word), len(name) - 1))
+
+
+def _mentions(text_words: list, function: KernelFunctionMetadata):
+    """Position of the first word in the text that refers to the function name ("divided" -> Divide), or None."""
+    names = _name_words(function.name)
+    for position, word in enumerate(text_words):
+        if any(_refers_to(word, name) for name in names):
+            return position
+    return None
+
+
+def _unmentioned_words(text_words: list, function: KernelFunctionMetadata) -> int:
+    """Words of the function name the text does not use: "add 4 and 5" is Add (0), not AddBatch (1)."""
+    return sum(not any(_refers_to(word, name) for word in text_words) for name in _name_words(function.name))
+
+
+def _is_numeric(parameter) -> bool:
+    if parameter.type_ in ("int", "float", "number", "integer"):
+        return True
+    schema_type = (parameter.schema_data or {}).get("type")
+    return schema_type in ("number", "integer")
+
+
+def route(text: str, functions: list) -> list:
+    """
+    Pick the functions a request mentions by name and fill their arguments from the text: "<parameter> <value>"
+    when the parameter is named, otherwise the next unused number for numeric parameters and the word after the
+    function mention for the others. Returns (metadata, arguments) pairs in the order they are mentioned.
+    """
+    words = _WORD.findall(text)
+    lowered = [word.lower() for word in words]
+    # of the functions mentioned by the same word, the one whose whole name the text uses
+    best = {}
+    for function in functions:
+        position = _mentions(words, function)
+        if position is None:
+            continue
+        if position not in best or _unmentioned_words(words, function) < _unmentioned_words(words, best[position]):
+            best[position] = function
+    mentioned = sorted(best.items(), key=lambda item: item[0])
+
+    used = set()
+    calls = []
+    for position, function in mentioned:
+        arguments = {}
+        for parameter in function.parameters:
+            if parameter.name in lowered:
+                index = lowered.index(parameter.name) + 1
+                if index < len(words):
+                    arguments[parameter.name] = words[index]
+                    used.add(index)
+                    continue
+            if _is_numeric(parameter):
+                index = next((i for i, word in enumerate(words) if i not in used and _NUMBER.fullmatch(word)), None)
+            else:
+                index = next(
+                    (
+                        i
+                        for i in range(position + 1, len(words))
+                        if i not in used and lowered[i] not in _STOP_WORDS and not _NUMBER.fullmatch(words[i])
+                    ),
+                    None,
+                )
+            if index is not None:
+                arguments[parameter.name] = words[index]
+                used.add(index)
+            elif parameter.is_required and parameter.default_value is None:
+                arguments[parameter.name] = "1" if _is_numeric(parameter) else parameter.name
+        calls.append((function, arguments))
+    return calls
+
+
+def _result_text(result) -> str:
+    # prompt functions return their chat messages, native functions their value
+    if isinstance(result, list) and result:
+        return str(result[0])
+    return str(result)
+
+
+def tool_router(request: MockRequest):
+    """With FunctionChoiceBehavior.Auto: call the mentioned functions in one turn, then summarise their results."""
+    # a prompt function called as a tool inherits the caller's settings, a model would just answer it
+    if not request.functions or request.nested or request.last_message is None:
+        return None
+
+    if request.last_message.role == AuthorRole.TOOL:
+        results = [
+            f"{item.function_name} returned {_result_text(item.result)}"
+            for message in request.chat_history.messages
+            for item in message.items
+            if isinstance(item, FunctionResultContent)
+        ]
+        return MockReply("Here is what I found: " + "; ".join(results) + ".")
+
+    calls = route(request.text, request.functions)
+    if not calls:
+        return None
+    return MockReply(function_calls=[(function.fully_qualified_name, arguments) for function, arguments in calls])
+
+
+def sequential_plan_router(request: MockRequest):
+    """Answer SequentialPlanner prompts with a <plan> that calls the functions the goal mentions, in order."""
+    goals = re.findall(r"<goal>([^<]*)</goal>", request.prompt)
+    if not goals or "[AVAILABLE FUNCTIONS]" not in request.prompt or request.kernel is None:
+        return None
+
+    available = []
+    for name in re.findall(r"^([\w.]+-[\w.]+):\n\s+description:", request.prompt, re.MULTILINE):
+        plugin_name, function_name = name.split("-", 1)
+        available.append(request.kernel.get_function(plugin_name, function_name).metadata)
+
+    steps = []
+    for index, (function, arguments) in enumerate(route(goals[-1], available)):
+        attributes = " ".join(f"{name}={quoteattr(str(value))}" for name, value in arguments.items())
+        steps.append(f'    <function.{function.fully_qualified_name} {attributes} appendToResult="RESULT__STEP_{index}"/>')
+    return "<plan>\n" + "\n".join(steps) + "\n</plan><!-- END -->"
+
+
+def echo(request: MockRequest):
+    last = str(request.last_message.content) if request.last_message is not None else ""
+    return f"Mock response to: {last[:200]}"
+
+
+DEFAULT_RESPONDERS = (tool_router, sequential_plan_router, echo)
+
+# endregion
+
+
+class MockChatCompletion(ChatCompletionClientBase):
+    """
+    Description: MockChatCompletion is an offline stand-in for AzureChatCompletion, for running and load-testing
+    the samples without network access.
+
+    - replies come from a chain of responders: canned rule() replies, tool_router (function calls for
+      FunctionChoiceBehavior.Auto), sequential_plan_router (plans for SequentialPlanner) and echo
+    - every request waits for latency(rng) seconds plus token_latency per completion token; streaming spreads
+      the token latency over the chunks
+    - rate_limit_rate (random) and rpm_limit (per 60 second window) raise the same error AzureChatCompletion raises
+      on a 429, with a Retry-After header
+    - stats counts requests, rate limits, function calls, tokens and the peak number of concurrent requests
+
+    Usage:
+        kernel.add_service(MockChatCompletion(service_id="default", latency=lognormal(0.8), rules=[rule("hello", "hi")]))
+    """
+
+    SUPPORTS_FUNCTION_CALLING: ClassVar[bool] = True
+
+    rules: list = Field(default_factory=list)
+    responders: list = Field(default_factory=lambda: list(DEFAULT_RESPONDERS))
+    latency: Any = Field(default_factory=lambda: fixed(0.0))
+    token_latency: float = 0.0
+    chunk_tokens: int = 4
+    rate_limit_rate: float = 0.0
+    rpm_limit: int | None = None
+    retry_after: float = 1.0
+    seed: int | None = None
+    stats: dict = Field(default_factory=dict)
+
+    _rng: random.Random = PrivateAttr()
+    _request_times: deque = PrivateAttr(default_factory=deque)
+    # a dict, not an int, so the per-kernel views of one service (helpers/service_hooks.py) count together
+    _in_flight: dict = PrivateAttr(default_factory=lambda: {"requests": 0})
+    _call_ids: Any = PrivateAttr(default_factory=itertools.count)
+
+    def __init__(self, service_id: str = "default", ai_model_id: str = "mock-gpt-4o", **kwargs):
+        super().__init__(service_id=service_id, ai_model_id=ai_model_id, **kwargs)
+        self._rng = random.Random(self.seed)
+        self.reset_stats()
+
+    @classmethod
+    def from_env(cls, service_id: str = "default", **kwargs) -> "MockChatCompletion":
+        """MOCK_LATENCY_MS (median), MOCK_LATENCY_SIGMA, MOCK_TOKEN_LATENCY_MS, MOCK_RATE_LIMIT_RATE, MOCK_RPM_LIMIT, MOCK_SEED."""
+        latency_ms = float(os.getenv("MOCK_LATENCY_MS", "0"))
+        options = {
+            "latency": lognormal(latency_ms / 1000, float(os.getenv("MOCK_LATENCY_SIGMA", "0.5"))),
+            "token_latency": float(os.getenv("MOCK_TOKEN_LATENCY_MS", "0")) / 1000,
+            "rate_limit_rate": float(os.getenv("MOCK_RATE_LIMIT_RATE", "0")),
+            "rpm_limit": int(os.getenv("MOCK_RPM_LIMIT")) if os.getenv("MOCK_RPM_LIMIT") else None,
+            "seed": int(os.getenv("MOCK_SEED")) if os.getenv("MOCK_SEED") else None,
+        }
+        return cls(service_id=service_id, **{**options, **kwargs})
+
+    def reset_stats(self):
+        self.stats.clear()
+        self.stats.update(
+            {
+                "requests": 0,
+                "streaming_requests": 0,
+                "rate_limited": 0,
+                "function_calls": 0,
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "max_concurrency": 0,
+            }
+        )
+
+    def get_prompt_execution_settings_class(self):
+        return OpenAIChatPromptExecutionSettings
+
+    def _update_function_choice_settings_callback(self):
+        return update_settings_from_function_call_configuration
+
+    def _reset_function_choice_settings(self, settings) -> None:
+        settings.tools = None
+        settings.tool_choice = None
+
+    async def get_chat_message_contents(self, chat_history, settings, **kwargs):
+        kernel_token, depth_token = _current_kernel.set(kwargs.get("kernel")), _depth.set(_depth.get() + 1)
+        try:
+            return await super().get_chat_message_contents(chat_history, settings, **kwargs)
+        finally:
+            _current_kernel.reset(kernel_token)
+            _depth.reset(depth_token)
+
+    async def get_streaming_chat_message_contents(self, chat_history, settings, **kwargs):
+        kernel_token, depth_token = _current_kernel.set(kwargs.get("kernel")), _depth.set(_depth.get() + 1)
+        try:
+            async for messages in super().get_streaming_chat_message_contents(chat_history, settings, **kwargs):
+                yield messages
+        finally:
+            try:
+                _current_kernel.reset(kernel_token)
+                _depth.reset(depth_token)
+            except ValueError:
+                # closed from another context (an abandoned generator being garbage collected), nothing to restore
+                pass
+
+    # region request handling
+
+    def _check_rate_limit(self):
+        now = time.monotonic()
+        retry_after = None
+
+        if self.rpm_limit is not None:
+            while self._request_times and now - self._request_times[0] >= 60:
+                self._request_times.popleft()
+            if len(self._request_times) >= self.rpm_limit:
+                retry_after = 60 - (now - self._request_times[0])
+
+        if retry_after is None and self.rate_limit_rate and self._rng.random() < self.rate_limit_rate:
+            retry_after = self.retry_after
+
+        if retry_after is None:
+            self._request_times.append(now)
+            return
+
+        self.stats["rate_limited"] += 1
+        response = httpx.Response(
+            429,
+            headers={"retry-after": f"{retry_after:.3f}"},
+            request=httpx.Request("POST", "https://mock.openai.azure.com/chat/completions"),
+        )
+        error = openai.RateLimitError("Rate limit is exceeded.", response=response, body=None)
+        raise ServiceResponseException(f"{type(self)} service failed to complete the prompt", error) from error
+
+    def _reply(self, chat_history: ChatHistory, settings) -> MockReply:
+        kernel = _current_kernel.get()
+        functions = []
+        if settings.function_choice_behavior is not None and settings.tools and kernel is not None:
+            functions = settings.function_choice_behavior.get_config(kernel).available_functions or []
+
+        request = MockRequest(chat_history, settings, kernel, functions, nested=_depth.get() > 1)
+        for responder in (*self.rules, *self.responders):
+            reply = responder(request)
+            if reply is not None:
+                return MockReply(reply) if isinstance(reply, str) else reply
+        return MockReply("")
+
+    def _function_call_items(self, reply: MockReply) -> list:
+        items = []
+        for index, (name, arguments) in enumerate(reply.function_calls):
+            call_id = f"call_mock_{next(self._call_ids)}"
+            items.append(
+                FunctionCallContent(
+                    id=call_id, call_id=call_id, index=index, name=name, arguments=json.dumps(arguments)
+                )
+            )
+        self.stats["function_calls"] += len(items)
+        return items
+
+    def _usage(self, chat_history: ChatHistory, reply: MockReply, settings=None) -> CompletionUsage:
+        prompt_tokens = sum(approx_tokens(str(message.content)) for message in chat_history.messages)
+        # the schemas of the advertised functions are part of the prompt, like with the real service
+        tools = getattr(settings, "tools", None)
+        if tools:
+            prompt_tokens += approx_tokens(json.dumps(tools))
+        completion_tokens = approx_tokens(reply.content) if reply.content else 10 * len(reply.function_calls)
+        self.stats["prompt_tokens"] += prompt_tokens
+        self.stats["completion_tokens"] += completion_tokens
+        return CompletionUsage(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+
+    def _enter(self):
+        self.stats["requests"] += 1
+        self._in_flight["requests"] += 1
+        self.stats["max_concurrency"] = max(self.stats["max_concurrency"], self._in_flight["requests"])
+
+    async def _inner_get_chat_message_contents(self, chat_history, settings):
+        self._enter()
+        try:
+            self._check_rate_limit()
+            reply = self._reply(chat_history, settings)
+            usage = self._usage(chat_history, reply, settings)
+            await asyncio.sleep(self.latency(self._rng) + usage.completion_tokens * self.token_latency)
+
+            items = self._function_call_items(reply)
+            return [
+                ChatMessageContent(
+                    role=AuthorRole.ASSISTANT,
+                    items=items,
+                    content=None if items else reply.content,
+                    ai_model_id=self.ai_model_id,
+                    finish_reason=FinishReason.TOOL_CALLS if items else FinishReason.STOP,
+                    metadata={"usage": usage},
+                )
+            ]
+        finally:
+            self._in_flight["requests"] -= 1
+
+    async def _inner_get_streaming_chat_message_contents(self, chat_history, settings, function_invoke_attempt=0):
+        self._enter()
+        self.stats["streaming_requests"] += 1
+        try:
+            self._check_rate_limit()
+            reply = self._reply(chat_history, settings)
+            usage = self._usage(chat_history, reply, settings)
+            await asyncio.sleep(self.latency(self._rng))
+
+            def chunk(**kwargs):
+                return [
+                    StreamingChatMessageContent(
+                        role=AuthorRole.ASSISTANT,
+                        choice_index=0,
+                        ai_model_id=self.ai_model_id,
+                        function_invoke_attempt=function_invoke_attempt,
+                        **kwargs,
+                    )
+                ]
+
+            if reply.function_calls:
+                yield chunk(items=self._function_call_items(reply), finish_reason=FinishReason.TOOL_CALLS, metadata={"usage": usage})
+                return
+
+            words = re.findall(r"\S+\s*", reply.content) or [""]
+            step = max(1, self.chunk_tokens)
+            for start in range(0, len(words), step):
+                await asyncio.sleep(step * self.token_latency)
+                last = start + step >= len(words)
+                yield chunk(
+                    content="".join(words[start:start + step]),
+                    finish_reason=FinishReason.STOP if last else None,
+                    metadata={"usage": usage} if last else {},
+                )
+        finally:
+            self._in_flight["requests"] -= 1
+
+    # endregion
@@ -0,0 +1,242 @@
+import hashlib
+import inspect
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Annotated
+from urllib.parse import quote
+
+import httpx
+from semantic_kernel.functions import KernelFunctionFromMethod, KernelPlugin, kernel_function
+
+_SCHEMA_TYPES = {"string": str, "integer": int, "number": float, "boolean": bool}
+_HTTP_METHODS = ("get", "post", "put", "patch", "delete")
+
+# resolved specs of this process, keyed on (path, mtime, size) so an edited spec is resolved again
+_resolved_specs = {}
+
+
+def load_spec(path: str, cache_dir: str = None) -> dict:
+    """
+    The OpenAPI spec at path with every $ref resolved. The resolved spec is kept in cache_dir (default:
+    .openapi_cache next to the spec) under the hash of the spec's content, so jsonref only runs when the spec
+    changed, and in memory for the rest of the process.
+    """
+    stat = os.stat(path)
+    signature = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    if signature in _resolved_specs:
+        return _resolved_specs[signature]
+
+    with open(path, "rb") as file:
+        raw = file.read()
+    cache_dir = cache_dir or os.path.join(os.path.dirname(os.path.abspath(path)), ".openapi_cache")
+    name = os.path.splitext(os.path.basename(path))[0]
+    cached_path = os.path.join(cache_dir, f"{name}.{hashlib.sha256(raw).hexdigest()[:16]}.json")
+
+    if os.path.exists(cached_path):
+        with open(cached_path, "r", encoding="utf-8") as file:
+            spec = json.load(file)
+    else:
+        import jsonref
+
+        # plain dicts instead of lazy proxies, so the result can be written out as JSON
+        spec = jsonref.replace_refs(json.loads(raw), proxies=False, lazy_load=False)
+        os.makedirs(cache_dir, exist_ok=True)
+        temp_path = f"{cached_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(spec, file)
+        os.replace(temp_path, cached_path)
+
+    _resolved_specs[signature] = spec
+    return spec
+
+
+class TTLCache:
+    """Least recently used entries, each expiring ttl seconds after it was stored."""
+
+    def __init__(self, ttl: float, maxsize: int = 1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "expired": 0}
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        expires_at, value = entry
+        if time.monotonic() > expires_at:
+            del self._entries[key]
+            self.stats["expired"] += 1
+            self.stats["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return value
+
+    def put(self, key, value):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+def _python_name(name: str) -> str:
+    name = re.sub(r"\W", "_", name)
+    return f"_{name}" if name[0].isdigit() else name
+
+
+class OpenApiPlugin:
+    """
+    Description: OpenApiPlugin turns the operations of an OpenAPI spec into native async kernel functions, so an
+    agent calls the API from this process instead of through a remote OpenApiTool.
+
+    - one kernel function per operation, named after its operationId; path, query and header parameters become
+      the function's parameters (with the spec's descriptions, types and defaults, a parameter with a default is
+      optional for the model)
+    - the spec is resolved once and cached on disk (load_spec)
+    - every call goes through one pooled keep-alive httpx.AsyncClient
+    - successful responses are cached per operation and arguments (case and surrounding blanks of string
+      arguments ignored) for ttl seconds, a repeated lookup of the same city does not touch the network
+    - a documented error response (404 "Location not found") is returned to the model as text, any other error
+      status raises
+
+    base_url replaces the spec's server, for example with a local stand-in server in tests.
+
+    Usage:
+        weather = OpenApiPlugin.from_file("./weather_openapi.json", plugin_name="weather", ttl=600)
+        agent = AzureAIAgent(client=project_client, definition=agent_definition, plugins=[weather.plugin()])
+        ...
+        await weather.aclose()
+    """
+
+    def __init__(
+        self,
+        spec: dict,
+        plugin_name: str,
+        base_url: str = None,
+        ttl: float = 600,
+        cache_size: int = 1024,
+        max_connections: int = 20,
+        timeout: float = 30,
+    ):
+        self.spec = spec
+        self.plugin_name = plugin_name
+        self.base_url = (base_url or spec["servers"][0]["url"]).rstrip("/")
+        self.cache = TTLCache(ttl, cache_size)
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.request_count = 0
+        self._client = None
+        self._functions = None
+
+    @classmethod
+    def from_file(cls, path: str, plugin_name: str, cache_dir: str = None, **kwargs) -> "OpenApiPlugin":
+        return cls(load_spec(path, cache_dir), plugin_name, **kwargs)
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+            )
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def operations(self):
+        """(path, method, operation, parameters) of every operation in the spec."""
+        for path, item in self.spec.get("paths", {}).items():
+            for method in _HTTP_METHODS:
+                operation = item.get(method)
+                if operation is None:
+                    continue
+                # operation parameters override path level ones with the same name and location
+                parameters = {(parameter["name"], parameter["in"]): parameter for parameter in item.get("parameters", [])}
+                parameters.update({(parameter["name"], parameter["in"]): parameter for parameter in operation.get("parameters", [])})
+                yield path, method, operation, [parameter for parameter in parameters.values() if parameter["in"] != "cookie"]
+
+    async def _call(self, path: str, method: str, operation: dict, parameters: list, arguments: dict) -> str:
+        key = (
+            operation.get("operationId", path),
+            tuple(sorted((name, value.strip().casefold() if isinstance(value, str) else value) for name, value in arguments.items())),
+        )
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        url, query, headers = path, {}, {}
+        for parameter in parameters:
+            value = arguments.get(_python_name(parameter["name"]))
+            if value is None:
+                continue
+            if parameter["in"] == "path":
+                url = url.replace(f"{{{parameter['name']}}}", quote(str(value).strip(), safe=""))
+            elif parameter["in"] == "query":
+                query[parameter["name"]] = value
+            elif parameter["in"] == "header":
+                headers[parameter["name"]] = str(value)
+
+        self.request_count += 1
+        response = await self.client.request(method.upper(), url, params=query, headers=headers)
+        if response.is_success:
+            self.cache.put(key, response.text)
+            return response.text
+
+        documented = operation.get("responses", {}).get(str(response.status_code))
+        if documented is not None:
+            return f"{response.status_code}: {documented.get('description', response.reason_phrase)}"
+        response.raise_for_status()
+
+    def _function(self, path: str, method: str, operation: dict, parameters: list) -> KernelFunctionFromMethod:
+        signature_parameters = []
+        defaults = {}
+        for parameter in sorted(parameters, key=lambda parameter: "default" in parameter.get("schema", {})):
+            schema = parameter.get("schema", {})
+            annotation = Annotated[_SCHEMA_TYPES.get(schema.get("type"), str), parameter.get("description", "")]
+            if "default" in schema:
+                default = defaults[_python_name(parameter["name"])] = schema["default"]
+            elif parameter.get("required", parameter["in"] == "path"):
+                default = inspect.Parameter.empty
+            else:
+                default = None
+            signature_parameters.append(
+                inspect.Parameter(_python_name(parameter["name"]), inspect.Parameter.KEYWORD_ONLY, default=default, annotation=annotation)
+            )
+
+        async def call(**arguments) -> str:
+            # the kernel only passes the arguments it has, the spec's defaults fill in the rest
+            return await self._call(path, method, operation, parameters, {**defaults, **arguments})
+
+        name = _python_name(operation.get("operationId") or f"{method}_{path}")
+        call.__signature__ = inspect.Signature(signature_parameters, return_annotation=Annotated[str, "The response body"])
+        call.__name__ = name
+        description = operation.get("description") or operation.get("summary") or f"{method.upper()} {path}"
+        return KernelFunctionFromMethod(kernel_function(call, name=name, description=description), plugin_name=self.plugin_name)
+
+    def functions(self) -> list[KernelFunctionFromMethod]:
+        if self._functions is None:
+            self._functions = [self._function(*operation) for operation in self.operations()]
+        return self._functions
+
+    def plugin(self) -> KernelPlugin:
+        return KernelPlugin(
+            name=self.plugin_name,
+            description=self.spec.get("info", {}).get("description"),
+            functions=self.functions(),
+        )
+
+    @property
+    def stats(self) -> dict:
+        return {"requests": self.request_count, **self.cache.stats}
@@ -0,0 +1,207 @@
+import asyncio
+import logging
+import time
+from typing import AsyncIterable, Callable, Iterable
+
+from semantic_kernel.agents import Agent
+from semantic_kernel.contents import ChatMessageContent
+
+logger = logging.getLogger(__name__)
+
+
+class _Stage:
+    """One member of the pipeline: how many workers it has and what they have been doing."""
+
+    def __init__(self, agent: Agent, concurrency: int):
+        self.agent = agent
+        self.concurrency = concurrency
+        self.running = concurrency
+        self.items = 0
+        self.errors = 0
+        self.busy = 0.0  # seconds a worker was waiting for the agent
+        self.starved = 0.0  # seconds a worker was waiting for an item from the stage before
+        self.blocked = 0.0  # seconds a worker was waiting for room in the next stage's queue (backpressure)
+
+    def report(self, elapsed: float) -> dict:
+        return {
+            "agent": self.agent.name,
+            "workers": self.concurrency,
+            "items": self.items,
+            "errors": self.errors,
+            "items_per_s": round(self.items / elapsed, 3) if elapsed else 0.0,
+            "mean_s": round(self.busy / self.items, 3) if self.items else None,
+            # share of the workers' time spent on items, the stage with the highest occupancy is the bottleneck
+            "occupancy": round(self.busy / (elapsed * self.concurrency), 3) if elapsed else 0.0,
+            "starved_s": round(self.starved, 3),
+            "blocked_s": round(self.blocked, 3),
+        }
+
+
+class PipelinedOrchestration:
+    """
+    Description: PipelinedOrchestration runs a sequence of agents, like SequentialOrchestration, over a stream of
+    tasks instead of one task at a time.
+
+    Every member is a stage with its own worker(s) and a bounded queue in front of it: while the second agent works
+    on task k the first one already works on task k + 1, so the pipeline finishes a task about every time the
+    slowest agent finishes one, instead of once per the sum of all the agents' times. A full queue holds the stage before it back
+    (backpressure), so a slow agent never has more than queue_size tasks waiting for it. A slow stage can be given
+    more workers with concurrency=[1, 2, ...]; with more than one worker results may come out of order, every result
+    has the index of its task.
+
+    Each agent gets the previous agent's answer as its task, every task runs in its own agent threads, which are
+    deleted once the task has left the last stage (or the pipeline was stopped).
+    invoke_stream yields {"index", "task", "result", "messages", "latency_s"} per task, or {"index", "task",
+    "error"} when an agent failed (the later agents are skipped). When the task source itself raises, the tasks
+    fed before are finished and yielded, then invoke_stream raises the source's error. report() has per stage throughput, mean time per
+    item, occupancy and the time spent starved and blocked.
+
+    Usage:
+        pipeline = PipelinedOrchestration(members=[weather_agent, summariser_agent], queue_size=4)
+        async for result in pipeline.invoke_stream(tasks):
+            print(result["index"], result["result"])
+        print(pipeline.report())
+    """
+
+    def __init__(
+        self,
+        members: list[Agent],
+        queue_size: int = 4,
+        concurrency: int | list[int] = 1,
+        agent_response_callback: Callable[[ChatMessageContent], None] = None,
+    ):
+        if isinstance(concurrency, int):
+            concurrency = [concurrency] * len(members)
+        if len(concurrency) != len(members):
+            raise ValueError("concurrency needs one worker count per member")
+        self.members = members
+        self.queue_size = queue_size
+        self.concurrency = concurrency
+        self.agent_response_callback = agent_response_callback
+        self.stages = []
+        self.elapsed = 0.0
+        self._started = None
+        self._live = {}  # task index -> item between being fed and leaving the last stage
+
+    def _new_item(self, index: int, task) -> dict:
+        item = {"index": index, "task": task, "input": task, "messages": [], "threads": [], "start": time.perf_counter()}
+        self._live[index] = item
+        return item
+
+    async def _delete_threads(self, item: dict):
+        """Delete the agent threads the stages created for an item, once it has left the pipeline."""
+        self._live.pop(item["index"], None)
+        threads, item["threads"] = item["threads"], []
+        for thread in threads:
+            try:
+                await thread.delete()
+            except Exception as exc:
+                logger.warning(f"could not delete the thread {thread.id} of task {item['index']}: {exc}")
+
+    async def _feed(self, tasks, queue: asyncio.Queue, stage: _Stage):
+        index = 0
+        cancelled = False
+        try:
+            if hasattr(tasks, "__aiter__"):
+                async for task in tasks:
+                    await queue.put(self._new_item(index, task))
+                    index += 1
+            else:
+                for task in tasks:
+                    await queue.put(self._new_item(index, task))
+                    index += 1
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        finally:
+            # also when the task source fails, so the workers finish what was fed and invoke_stream re-raises the error
+            if not cancelled:
+                for _ in range(stage.concurrency):
+                    await queue.put(None)
+
+    async def _work(self, stage: _Stage, inbox: asyncio.Queue, outbox: asyncio.Queue, next_workers: int):
+        while True:
+            waiting = time.perf_counter()
+            item = await inbox.get()
+            stage.starved += time.perf_counter() - waiting
+            if item is None:
+                break
+
+            if "error" not in item:
+                start = time.perf_counter()
+                try:
+                    response = await stage.agent.get_response(messages=item["input"])
+                    # a new thread per item and stage (for an AzureAIAgent one on the service), deleted when the item is done
+                    item["threads"].append(response.thread)
+                    message = response.message
+                    item["input"] = message.content
+                    item["messages"].append((message.name or stage.agent.name, message.content))
+                    if self.agent_response_callback:
+                        self.agent_response_callback(message)
+                except Exception as exc:
+                    stage.errors += 1
+                    logger.warning(f"{stage.agent.name} failed on task {item['index']}: {exc}")
+                    item["error"] = f"{stage.agent.name}: {type(exc).__name__}: {exc}"
+                stage.busy += time.perf_counter() - start
+                stage.items += 1
+
+            waiting = time.perf_counter()
+            await outbox.put(item)
+            stage.blocked += time.perf_counter() - waiting
+
+        # the last worker of a stage tells every worker of the next one that there is nothing more to come
+        stage.running -= 1
+        if stage.running == 0:
+            for _ in range(next_workers):
+                await outbox.put(None)
+
+    async def invoke_stream(self, tasks: AsyncIterable[str] | Iterable[str]):
+        self.stages = [_Stage(agent, workers) for agent, workers in zip(self.members, self.concurrency)]
+        queues = [asyncio.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        self._started = time.perf_counter()
+        self._live = {}
+
+        running = [asyncio.create_task(self._feed(tasks, queues[0], self.stages[0]))]
+        for number, stage in enumerate(self.stages):
+            # the consumer of the last queue is invoke_stream itself
+            next_workers = self.stages[number + 1].concurrency if number + 1 < len(self.stages) else 1
+            for _ in range(stage.concurrency):
+                running.append(asyncio.create_task(self._work(stage, queues[number], queues[number + 1], next_workers)))
+
+        try:
+            while (item := await queues[-1].get()) is not None:
+                result = {"index": item["index"], "task": item["task"]}
+                if "error" in item:
+                    result["error"] = item["error"]
+                else:
+                    result["result"] = item["input"]
+                    result["messages"] = item["messages"]
+                    result["latency_s"] = round(time.perf_counter() - item["start"], 3)
+                await self._delete_threads(item)
+                yield result
+            await asyncio.gather(*running)
+        finally:
+            self.elapsed = time.perf_counter() - self._started
+            for task in running:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+            # items still in the pipeline when it stopped early
+            for item in list(self._live.values()):
+                await self._delete_threads(item)
+
+    async def invoke(self, tasks: AsyncIterable[str] | Iterable[str]) -> list[dict]:
+        """All results, in the order of the tasks."""
+        results = [result async for result in self.invoke_stream(tasks)]
+        return sorted(results, key=lambda result: result["index"])
+
+    def report(self) -> dict:
+        elapsed = self.elapsed or (time.perf_counter() - self._started if self._started else 0.0)
+        stages = [stage.report(elapsed) for stage in self.stages]
+        finished = stages[-1]["items"] if stages else 0
+        return {
+            "elapsed_s": round(elapsed, 3),
+            "items_per_s": round(finished / elapsed, 3) if elapsed else 0.0,
+            "bottleneck": max(stages, key=lambda stage: stage["occupancy"])["agent"] if stages else None,
+            "stages": stages,
+        }
@@ -0,0 +1,229 @@
+import hashlib
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+
+from semantic_kernel import Kernel
+from semantic_kernel.functions import KernelArguments
+from semantic_kernel.planners import SequentialPlanner
+from semantic_kernel.planners.plan import Plan
+
+# parts of a goal that change from one run to the next without changing the shape of the plan
+DEFAULT_VARIABLE_PATTERNS = (
+    r'"([^"]*)"',  # quoted strings
+    r"\b[\w.+-]+@[\w-]+\.[\w.-]+\b",  # email addresses
+    r"https?://\S+",  # urls
+    r"(?<![\w.])-?\d+(?:\.\d+)?(?![\w.])",  # numbers
+)
+
+
+def plugins_fingerprint(kernel: Kernel, excluded_plugins=(SequentialPlanner.RESTRICTED_PLUGIN_NAME,)) -> str:
+    """Hash of every registered function signature; any plugin change produces a different fingerprint."""
+    manifest = []
+    for plugin_name, plugin in sorted(kernel.plugins.items()):
+        if plugin_name in excluded_plugins:
+            continue
+        for function_name, function in sorted(plugin.functions.items()):
+            manifest.append(
+                {
+                    "function": f"{plugin_name}-{function_name}",
+                    "description": function.description,
+                    "parameters": [
+                        [parameter.name, parameter.type_, parameter.description, parameter.is_required]
+                        for parameter in function.metadata.parameters
+                    ],
+                }
+            )
+    return hashlib.sha256(json.dumps(manifest, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class PlanCache:
+    """
+    Description: PlanCache stores SequentialPlanner plans so that a goal that was planned before is not sent to
+    the LLM again.
+
+    - the key is the normalised goal with its variable parts (numbers, emails, quoted strings, urls and any
+      extra variable_patterns) templated out, plus the fingerprint of the registered plugins
+    - a hit binds the values of the new goal into the parameters of the cached steps
+    - entries are evicted least recently used first (maxsize) and expire after ttl seconds
+    - with a path the entries are also kept on disk as JSON files, so the cache survives restarts
+
+    Usage:
+        planner = CachedSequentialPlanner(SequentialPlanner(kernel, service_id), kernel, PlanCache(path=".plan_cache"))
+        plan = await planner.create_plan(goal)
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 24 * 3600, path: str = None, variable_patterns=()):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.path = path
+        # extra patterns come first; a pattern with a group only templates out the group
+        self.variable_patterns = [re.compile(pattern, re.IGNORECASE) for pattern in (*variable_patterns, *DEFAULT_VARIABLE_PATTERNS)]
+
+        self._entries = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "unbindable": 0, "evictions": 0}
+
+        if path:
+            os.makedirs(path, exist_ok=True)
+
+    def template(self, goal: str):
+        """Split a goal into its normalised template and the values of its variable parts."""
+        spans = []
+        for pattern in self.variable_patterns:
+            for match in pattern.finditer(goal):
+                group = 1 if match.groups() else 0
+                start, end = match.span(group)
+                if start < end and not any(start < taken_end and taken_start < end for taken_start, taken_end in spans):
+                    spans.append((start, end))
+        spans.sort()
+
+        parts, values, position = [], [], 0
+        for start, end in spans:
+            parts.append(goal[position:start])
+            parts.append("{}")
+            values.append(goal[start:end])
+            position = end
+        parts.append(goal[position:])
+
+        template = re.sub(r"\s+", " ", "".join(parts)).strip().lower().rstrip(" ?.!")
+        return template, values
+
+    def key(self, goal: str, kernel: Kernel):
+        template, values = self.template(goal)
+        key = hashlib.sha256(f"{template}\n{plugins_fingerprint(kernel)}".encode("utf-8")).hexdigest()
+        return key, values
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, f"{key}.json")
+
+    def get(self, key: str):
+        entry = self._entries.get(key)
+
+        if entry is None and self.path and os.path.exists(self._file(key)):
+            try:
+                with open(self._file(key), "r", encoding="utf-8") as file:
+                    entry = json.load(file)
+                if not isinstance(entry, dict) or not {"created_at", "values", "bound", "steps", "results"} <= entry.keys():
+                    raise ValueError("not a plan cache entry")
+            except (OSError, ValueError):
+                # cut off by a crash or written by something else: a miss, the plan is created and cached again
+                self.delete(key)
+                return None
+            self._remember(key, entry)
+
+        if entry is None:
+            return None
+
+        if time.time() - entry["created_at"] > self.ttl:
+            self.delete(key)
+            return None
+
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: str, entry: dict):
+        entry = {**entry, "created_at": time.time()}
+        self._remember(key, entry)
+
+        if self.path:
+            temp_path = f"{self._file(key)}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as file:
+                json.dump(entry, file, default=str)
+            os.replace(temp_path, self._file(key))
+
+    def delete(self, key: str):
+        self._entries.pop(key, None)
+        if self.path:
+            try:
+                os.remove(self._file(key))
+            except FileNotFoundError:
+                pass
+
+    def _remember(self, key: str, entry: dict):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+
+def _bind(value, mapping: dict):
+    if not isinstance(value, str) or not mapping:
+        return value
+    pattern = re.compile("|".join(rf"(?<!\w){re.escape(old)}(?!\w)" for old in sorted(mapping, key=len, reverse=True)))
+    return pattern.sub(lambda match: mapping[match.group(0)], value)
+
+
+def plan_to_steps(plan: Plan, values: list) -> dict:
+    """Serializable description of a plan, plus which goal values its step parameters refer to."""
+    steps = []
+    for step in plan._steps:
+        steps.append(
+            {
+                "plugin_name": step.metadata.plugin_name,
+                "function_name": step.metadata.name,
+                "parameters": {name: value for name, value in step._parameters.items()},
+                "outputs": list(step._outputs),
+            }
+        )
+
+    parameter_text = json.dumps([step["parameters"] for step in steps], default=str)
+    bound = [index for index, value in enumerate(values) if re.search(rf"(?<!\w){re.escape(value)}(?!\w)", parameter_text)]
+
+    return {"steps": steps, "results": list(plan._outputs), "values": values, "bound": bound}
+
+
+def steps_to_plan(entry: dict, goal: str, values: list, kernel: Kernel):
+    """Rebuild a fresh Plan from a cache entry with the values of the new goal, or None if they cannot be bound."""
+    mapping = {}
+    unchanged = {old for old, new in zip(entry["values"], values) if old == new}
+    for index, (old, new) in enumerate(zip(entry["values"], values)):
+        if old == new:
+            continue
+        # a value the planner did not copy verbatim into a parameter cannot be swapped safely,
+        # and the same old value can not be bound to two different new values
+        if index not in entry["bound"] or old in unchanged or mapping.get(old, new) != new:
+            return None
+        mapping[old] = new
+
+    plan = Plan.from_goal(goal)
+    for step in entry["steps"]:
+        plan_step = Plan.from_function(kernel.get_function(step["plugin_name"], step["function_name"]))
+        plan_step._parameters = KernelArguments(
+            **{name: _bind(value, mapping) for name, value in step["parameters"].items()}
+        )
+        plan_step._outputs = list(step["outputs"])
+        plan.add_steps([plan_step])
+    plan._outputs.extend(entry["results"])
+
+    return plan
+
+
+class CachedSequentialPlanner:
+    """
+    Description: drop-in wrapper around SequentialPlanner.create_plan that answers from a PlanCache when it can
+    and only asks the LLM for a plan on a miss.
+    """
+
+    def __init__(self, planner: SequentialPlanner, kernel: Kernel, cache: PlanCache = None):
+        self.planner = planner
+        self.kernel = kernel
+        self.cache = cache or PlanCache()
+
+    async def create_plan(self, goal: str) -> Plan:
+        key, values = self.cache.key(goal, self.kernel)
+
+        entry = self.cache.get(key)
+        if entry is not None and len(entry["values"]) == len(values):
+            plan = steps_to_plan(entry, goal, values, self.kernel)
+            if plan is not None:
+                self.cache.stats["hits"] += 1
+                return plan
+            self.cache.stats["unbindable"] += 1
+
+        self.cache.stats["misses"] += 1
+        plan = await self.planner.create_plan(goal)
+        self.cache.put(key, plan_to_steps(plan, values))
+        return plan
@@ -0,0 +1,232 @@
+import asyncio
+import re
+import time
+from copy import copy
+
+from semantic_kernel import Kernel
+from semantic_kernel.exceptions import KernelInvokeException
+from semantic_kernel.functions import FunctionResult, KernelArguments
+from semantic_kernel.planners.plan import Plan
+
+from helpers.streaming import can_stream, chunk_text
+
+_VARIABLE = re.compile(r"\$(\w+)")
+
+# stands in for the results of steps the current step does not depend on, it is never read
+_NOT_READ = "<result of an independent step>"
+
+
+def _reads(step: Plan, arguments: dict, state: dict) -> set:
+    """
+    Which entries of arguments / state a step's function parameters are resolved from, following the priority of
+    Plan.get_next_step_arguments: arguments, then state, then the step's own parameter value with its
+    $variables expanded from arguments. State values may be empty at run time, so both of the last two count.
+    """
+    reads = set()
+    for parameter in step.metadata.parameters:
+        name = parameter.name
+        if name in arguments:
+            reads.add(arguments[name])
+            continue
+        if name in state:
+            reads.add(state[name])
+        for variable in _VARIABLE.findall(str(step._parameters.get(name) or "")):
+            if variable in arguments:
+                reads.add(arguments[variable])
+    return reads
+
+
+def _replay(plan: Plan, initial: dict, count: int, value_of):
+    """
+    Replay the bookkeeping Plan.invoke does for the first count steps and return (arguments, state) as they are
+    before step count. value_of(index) is what step index's result contributes. Note that an output variable keeps
+    the value of its first writer: Plan.update_arguments_with_outputs prefers the copy that is already in state.
+    """
+    arguments = dict(initial)
+    state = dict(plan._state)
+    for index in range(count):
+        for name in arguments:
+            state.setdefault(name, arguments[name])
+        value = value_of(index)
+        state["input"] = value
+        state[Plan.DEFAULT_RESULT_KEY] = value
+        arguments["input"] = value
+        for name in plan._steps[index]._outputs:
+            arguments[name] = state.get(name, value)
+    for name in arguments:
+        state.setdefault(name, arguments[name])
+    return arguments, state
+
+
+def plan_dependencies(plan: Plan, initial_arguments=()) -> list:
+    """For every step, the indices of the earlier steps whose results end up in its function's parameters."""
+    initial = {name: None for name in initial_arguments}
+    dependencies = []
+    for index, step in enumerate(plan._steps):
+        # the same replay as at run time, with the index of the producing step (None: a plan argument) as value
+        arguments, state = _replay(plan, initial, index, value_of=lambda earlier: earlier)
+        for name in plan._state:
+            if name not in initial:
+                state[name] = None
+        dependencies.append(sorted(source for source in _reads(step, arguments, state) if source is not None))
+    return dependencies
+
+
+class ParallelPlanExecutor:
+    """
+    Description: ParallelPlanExecutor runs the steps of a SequentialPlanner plan as a DAG instead of one after
+    the other.
+
+    A step depends on the earlier steps whose results reach its function's parameters: outputs of earlier steps
+    (setContextVariable / appendToResult) read as parameters or $variables, and for functions with an "input"
+    parameter the result of the step right before it. Steps without pending dependencies run concurrently, at
+    most max_concurrency at a time.
+
+    Every step gets the same arguments it would get from Plan.invoke (the plan's own argument resolution is
+    reused), so the result is identical to sequential execution: the value of the last step, with all step
+    results in metadata["results"]. metadata["timings"] has the per step breakdown. The plan itself is not
+    modified and can be run again.
+
+    With on_chunk (or invoke_stream) prompt functions and native functions with a stream method are run with
+    kernel.invoke_stream, so partial output is visible as soon as the first model call starts answering.
+
+    Usage:
+        executor = ParallelPlanExecutor(kernel, max_concurrency=4)
+        result = await executor.invoke(plan)
+        print(executor.format_timings(result))
+
+        async for step_index, text in executor.invoke_stream(plan):
+            print(text, end="")
+    """
+
+    def __init__(self, kernel: Kernel, max_concurrency: int = 4):
+        self.kernel = kernel
+        self.max_concurrency = max_concurrency
+
+    def _step_arguments(self, plan: Plan, index: int, initial: KernelArguments, results: dict) -> KernelArguments:
+        """The arguments Plan.invoke would build for step index, from the results of the steps it depends on."""
+        arguments, state = _replay(
+            plan, initial, index, value_of=lambda earlier: str(results[earlier]) if earlier in results else _NOT_READ
+        )
+
+        # reuse the plan's own resolution of parameters, $variables and input against that state
+        resolver = Plan.from_goal(plan.description or "")
+        resolver._state = KernelArguments(**state)
+        return resolver.get_next_step_arguments(KernelArguments(**arguments), plan._steps[index])
+
+    async def _invoke_step(self, step: Plan, index: int, arguments: KernelArguments, on_chunk) -> FunctionResult:
+        if on_chunk is None or not can_stream(step._function):
+            return await step.invoke(self.kernel, arguments)
+
+        # stream the step and hand its full text to the steps that depend on it, as Plan.invoke would
+        parts = []
+        async for chunk in self.kernel.invoke_stream(step._function, arguments):
+            text = chunk_text(chunk)
+            if text:
+                parts.append(text)
+                on_chunk(index, text)
+        return FunctionResult(function=step.metadata, value="".join(parts))
+
+    async def invoke(self, plan: Plan, arguments: KernelArguments = None, on_chunk=None) -> FunctionResult:
+        """Run the plan; with on_chunk(step_index, text) every step that can stream reports its output as it comes."""
+        initial = copy(arguments) if arguments else copy(plan._state)
+        dependencies = plan_dependencies(plan, initial)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        results = {}
+        timings = [None] * len(plan._steps)
+        tasks = []
+        start = time.perf_counter()
+
+        async def run(index: int):
+            if dependencies[index]:
+                await asyncio.gather(*[tasks[dependency] for dependency in dependencies[index]])
+            ready = time.perf_counter()
+
+            async with semaphore:
+                started = time.perf_counter()
+                step = plan._steps[index]
+                # only the results this step depends on are visible to it
+                visible = {dependency: results[dependency] for dependency in dependencies[index]}
+                step_arguments = self._step_arguments(plan, index, initial, visible)
+                try:
+                    result = await self._invoke_step(step, index, step_arguments, on_chunk)
+                except Exception as exc:
+                    raise KernelInvokeException("Error occurred while running plan step: " + str(exc), exc) from exc
+                finished = time.perf_counter()
+
+            results[index] = result
+            timings[index] = {
+                "step": index,
+                "function": step.metadata.fully_qualified_name,
+                "depends_on": dependencies[index],
+                "ready_ms": round((ready - start) * 1000, 2),
+                "queued_ms": round((started - ready) * 1000, 2),
+                "run_ms": round((finished - started) * 1000, 2),
+                "finished_ms": round((finished - start) * 1000, 2),
+            }
+            return result
+
+        for index in range(len(plan._steps)):
+            tasks.append(asyncio.create_task(run(index)))
+
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+        partial_results = [results[index] for index in range(len(plan._steps))]
+        result_string = str(partial_results[-1]) if partial_results else ""
+
+        total_ms = (time.perf_counter() - start) * 1000
+        return FunctionResult(
+            function=plan.metadata,
+            value=result_string,
+            metadata={
+                "results": partial_results,
+                "timings": timings,
+                "total_ms": round(total_ms, 2),
+                "sequential_ms": round(sum(timing["run_ms"] for timing in timings), 2),
+            },
+        )
+
+    async def invoke_stream(self, plan: Plan, arguments: KernelArguments = None):
+        """
+        Run the plan and yield (step_index, text) chunks while the steps are running. Steps that run at the same
+        time interleave; the chunks of the last step are the plan's result.
+        """
+        queue = asyncio.Queue()
+        done = object()
+
+        async def run():
+            try:
+                await self.invoke(plan, arguments, on_chunk=lambda index, text: queue.put_nowait((index, text)))
+            finally:
+                queue.put_nowait(done)
+
+        task = asyncio.create_task(run())
+        try:
+            while (item := await queue.get()) is not done:
+                yield item
+            await task
+        finally:
+            if not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+
+    @staticmethod
+    def format_timings(result: FunctionResult) -> str:
+        lines = []
+        for timing in result.metadata.get("timings", []):
+            depends_on = ", ".join(str(dependency) for dependency in timing["depends_on"]) or "-"
+            lines.append(
+                f"  [{timing['step']}] {timing['function']:<40} after: {depends_on:<8} "
+                f"start {timing['ready_ms'] + timing['queued_ms']:>9.1f} ms  run {timing['run_ms']:>9.1f} ms"
+            )
+        lines.append(
+            f"  total {result.metadata.get('total_ms', 0):.1f} ms, "
+            f"{result.metadata.get('sequential_ms', 0):.1f} ms when run one after the other"
+        )
+        return "\n".join(lines)
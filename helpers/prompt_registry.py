@@ -0,0 +1,89 @@
+import os
+import threading
+import time
+
+from semantic_kernel.functions import KernelPlugin
+
+PROMPT_TEMPLATES_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "plugins", "prompt_templates"))
+
+
+def _signature(plugin_directory: str) -> tuple:
+    """(path, mtime, size) of every file of a plugin directory; a changed, added or removed file changes it."""
+    entries = []
+    for directory, _, files in os.walk(plugin_directory):
+        for name in files:
+            path = os.path.join(directory, name)
+            stat = os.stat(path)
+            entries.append((path, stat.st_mtime_ns, stat.st_size))
+    return tuple(sorted(entries))
+
+
+class PromptTemplateRegistry:
+    """
+    Description: PromptTemplateRegistry loads the prompt plugins under plugins/prompt_templates (one folder per
+    plugin, one skprompt.txt + config.json folder per function) once per process.
+
+    Loading a plugin reads its files, validates the configs and parses every template into blocks; the resulting
+    KernelPlugin is kept and handed to every kernel that asks for it, the functions hold no kernel state. A plugin
+    is reloaded when one of its files changed (mtime or size), was added or was removed. The files are checked
+    at most every check_interval seconds, so a lookup in between costs a dictionary access.
+
+    The plugins are shared: do not add functions to a plugin taken from the registry.
+
+    Usage:
+        registry = PromptTemplateRegistry.default()
+        kernel.add_plugin(registry.plugin("basic_plugin"))
+        greeting_function = registry.function("basic_plugin", "greeting")
+    """
+
+    _default = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, root: str = PROMPT_TEMPLATES_DIR, check_interval: float = 1.0):
+        self.root = os.path.abspath(root)
+        self.check_interval = check_interval
+        self._plugins = {}  # plugin name -> (signature, checked at, plugin)
+        self._lock = threading.Lock()
+        self.stats = {"loads": 0, "reloads": 0, "hits": 0}
+
+    @classmethod
+    def default(cls) -> "PromptTemplateRegistry":
+        """The process wide registry over plugins/prompt_templates."""
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls()
+            return cls._default
+
+    def plugin_names(self) -> list:
+        return sorted(
+            name for name in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, name)) and not name.startswith((".", "_"))
+        )
+
+    def plugin(self, name: str) -> KernelPlugin:
+        now = time.monotonic()
+        entry = self._plugins.get(name)
+        if entry is not None and now - entry[1] < self.check_interval:
+            self.stats["hits"] += 1
+            return entry[2]
+
+        with self._lock:
+            entry = self._plugins.get(name)
+            signature = _signature(os.path.join(self.root, name))
+            if entry is not None and entry[0] == signature:
+                self._plugins[name] = (signature, now, entry[2])
+                self.stats["hits"] += 1
+                return entry[2]
+
+            plugin = KernelPlugin.from_directory(plugin_name=name, parent_directory=self.root)
+            self._plugins[name] = (signature, now, plugin)
+            self.stats["reloads" if entry is not None else "loads"] += 1
+            return plugin
+
+    def function(self, plugin_name: str, function_name: str):
+        return self.plugin(plugin_name)[function_name]
+
+    def preload(self, names=None) -> "PromptTemplateRegistry":
+        """Load plugins up front (all of them by default), so the first request does not pay for it."""
+        for name in names or self.plugin_names():
+            self.plugin(name)
+        return self
@@ -0,0 +1,254 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Callable
+
+from semantic_kernel import Kernel
+from semantic_kernel.contents import AuthorRole, ChatMessageContent
+from semantic_kernel.filters import FilterTypes, FunctionInvocationContext, PromptRenderContext
+from semantic_kernel.functions import FunctionResult, KernelFunction
+
+_RECORD_HEADER = struct.Struct("<32sII")  # sha256 key, payload length, crc32 of the payload
+
+
+class DiskResponseStore:
+    """
+    Description: append-only response file read through a memory map.
+
+    Every record is <32 byte key><4 byte length><4 byte crc32><utf-8 payload>. The index (key -> offset) is rebuilt
+    by scanning the map when the file is opened; lookups are a dict access plus a slice of the map, so they never
+    touch the Python heap with the whole file. The scan stops at the first torn or corrupt record (a crash in the
+    middle of a write) and cuts the file off there, so later records are never appended after garbage. Only one
+    process should write to a store at a time.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._index = {}
+        self._map = None
+        self._mapped_size = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, "a+b")
+        self._remap()
+        self._scan()
+
+    def _remap(self):
+        size = os.fstat(self._file.fileno()).st_size
+        if size == self._mapped_size:
+            return
+        if self._map is not None:
+            self._map.close()
+        self._map = mmap.mmap(self._file.fileno(), size, access=mmap.ACCESS_READ) if size else None
+        self._mapped_size = size
+
+    def _scan(self):
+        offset = 0
+        while offset + _RECORD_HEADER.size <= self._mapped_size:
+            key, length, crc = _RECORD_HEADER.unpack_from(self._map, offset)
+            start = offset + _RECORD_HEADER.size
+            if start + length > self._mapped_size or zlib.crc32(self._map[start:start + length]) != crc:
+                break
+            self._index[key] = (start, length)
+            offset = start + length
+
+        if offset < self._mapped_size:
+            # a torn or corrupt record: drop it and everything after it before anything is appended
+            self._map.close()
+            self._map = None
+            self._mapped_size = 0
+            self._file.truncate(offset)
+            self._remap()
+
+    def get(self, key: bytes):
+        with self._lock:
+            location = self._index.get(key)
+            if location is None:
+                return None
+            start, length = location
+            if start + length > self._mapped_size:
+                self._remap()
+            return self._map[start:start + length].decode("utf-8")
+
+    def put(self, key: bytes, value: str):
+        payload = value.encode("utf-8")
+        with self._lock:
+            self._file.seek(0, os.SEEK_END)
+            offset = self._file.tell()
+            self._file.write(_RECORD_HEADER.pack(key, len(payload), zlib.crc32(payload)) + payload)
+            self._file.flush()
+            self._index[key] = (offset + _RECORD_HEADER.size, len(payload))
+
+    def __len__(self):
+        return len(self._index)
+
+    def close(self):
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+            self._file.close()
+
+
+def cache_below_temperature(max_temperature: float = 0.0) -> Callable:
+    """Default policy: only cache functions whose settings make the answer (close to) deterministic."""
+
+    def policy(function: KernelFunction, settings) -> bool:
+        temperature = getattr(settings, "temperature", None)
+        if temperature is None:
+            temperature = settings.extension_data.get("temperature")
+        return temperature is not None and float(temperature) <= max_temperature
+
+    return policy
+
+
+class ResponseCache:
+    """
+    Description: ResponseCache answers repeated prompt function calls without going to the model.
+
+    The key is the rendered prompt plus the selected service and execution settings (config.json), so a change to
+    the template, the arguments or the settings is a different entry. Lookups go to an in-memory LRU first and to
+    an optional memory-mapped file (DiskResponseStore) second.
+
+    Which functions are cached is decided per function:
+        - include / exclude: fully qualified names ("basic_plugin-greeting") that are always / never cached
+        - policy(function, settings): for everything else, by default only temperature 0 functions are cached
+    Calls with function calling enabled and streaming calls are never cached.
+
+    Usage:
+        response_cache = ResponseCache(disk_path=".response_cache/responses.bin", include={"basic_plugin-greeting"})
+        response_cache.register(kernel)
+        print(response_cache.report())
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        disk_path: str = None,
+        include=(),
+        exclude=(),
+        policy: Callable = None,
+    ):
+        self.maxsize = maxsize
+        self.include = set(include)
+        self.exclude = set(exclude)
+        self.policy = policy or cache_below_temperature()
+        self.disk = DiskResponseStore(disk_path) if disk_path else None
+
+        self._memory = OrderedDict()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "bypassed": 0, "stores": 0}
+
+    def register(self, kernel: Kernel) -> "ResponseCache":
+        kernel.add_filter(FilterTypes.PROMPT_RENDERING, self._prompt_rendering_filter)
+        kernel.add_filter(FilterTypes.FUNCTION_INVOCATION, self._function_invocation_filter)
+        return self
+
+    def _enabled(self, function: KernelFunction, settings) -> bool:
+        if getattr(settings, "function_choice_behavior", None) is not None:
+            return False
+        name = function.fully_qualified_name
+        if name in self.exclude:
+            return False
+        if name in self.include:
+            return True
+        return self.policy(function, settings)
+
+    def _key(self, kernel: Kernel, function: KernelFunction, arguments, rendered_prompt: str):
+        service, settings = kernel.select_ai_service(function=function, arguments=arguments)
+        if not self._enabled(function, settings):
+            return None
+        material = json.dumps(
+            {
+                "prompt": rendered_prompt,
+                "service": service.service_id,
+                "model": service.ai_model_id,
+                "settings": settings.model_dump(exclude_none=True, exclude={"service_id"}),
+            },
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(material.encode("utf-8")).digest()
+
+    def get(self, key: bytes):
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self.stats["memory_hits"] += 1
+            return self._memory[key]
+
+        if self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.stats["disk_hits"] += 1
+                self._remember(key, value)
+                return value
+
+        return None
+
+    def put(self, key: bytes, value: str):
+        self._remember(key, value)
+        if self.disk is not None:
+            self.disk.put(key, value)
+        self.stats["stores"] += 1
+
+    def _remember(self, key: bytes, value: str):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+
+    async def _prompt_rendering_filter(self, context: PromptRenderContext, next):
+        await next(context)
+
+        if context.is_streaming or context.rendered_prompt is None:
+            return
+
+        key = self._key(context.kernel, context.function, context.arguments, context.rendered_prompt)
+        if key is None:
+            self.stats["bypassed"] += 1
+            return
+
+        value = self.get(key)
+        if value is None:
+            self.stats["misses"] += 1
+            return
+
+        # setting the function result here skips the call to the model
+        context.function_result = FunctionResult(
+            function=context.function.metadata,
+            value=[ChatMessageContent(role=AuthorRole.ASSISTANT, content=value)],
+            rendered_prompt=context.rendered_prompt,
+            metadata={"cache_hit": True},
+        )
+
+    async def _function_invocation_filter(self, context: FunctionInvocationContext, next):
+        await next(context)
+
+        result = context.result
+        if (
+            not context.function.is_prompt
+            or context.is_streaming
+            or result is None
+            or result.metadata.get("cache_hit")
+            or result.rendered_prompt is None
+            or not isinstance(result.value, list)
+        ):
+            return
+
+        key = self._key(context.kernel, context.function, context.arguments, result.rendered_prompt)
+        if key is not None:
+            self.put(key, str(result))
+
+    def report(self) -> dict:
+        lookups = self.stats["memory_hits"] + self.stats["disk_hits"] + self.stats["misses"]
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        return {
+            **self.stats,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "disk_entries": len(self.disk) if self.disk is not None else 0,
+        }
@@ -0,0 +1,44 @@
+from typing import Callable
+
+from semantic_kernel.connectors.ai.chat_completion_client_base import ChatCompletionClientBase
+
+_WRAPPED_ATTRIBUTES = ("_request_wrappers", "_inner_get_chat_message_contents", "_inner_get_streaming_chat_message_contents")
+
+
+def service_view(service: ChatCompletionClientBase) -> ChatCompletionClientBase:
+    """
+    A shallow copy of a chat completion service for one kernel: it shares the client, its connection pool and
+    every other field with service, but request wrappers added to it (wrap_chat_requests) stay on the copy.
+    """
+    view = service.model_copy()
+    for name in _WRAPPED_ATTRIBUTES:
+        view.__dict__.pop(name, None)
+    return view
+
+
+def wrap_chat_requests(service: ChatCompletionClientBase, owner, wrap: Callable, wrap_streaming: Callable) -> bool:
+    """
+    Wrap the request methods of one chat completion service, every model round trip goes through them:
+    wrap(inner) and wrap_streaming(inner_streaming) return the replacements of _inner_get_chat_message_contents
+    and _inner_get_streaming_chat_message_contents. Each owner wraps a service once, a second call with the same
+    owner changes nothing and returns False; different owners stack.
+
+    Only this service object is wrapped, so it should belong to one kernel: kernels from KernelFactory get their
+    own service_view() of the shared service, wrapping one of them does not touch the model calls of the others.
+    _inner_get_chat_message_contents and _inner_get_streaming_chat_message_contents are the two methods every
+    ChatCompletionClientBase connector implements, the base class sends every request through them.
+    """
+    owners = service.__dict__.get("_request_wrappers")
+    if owners is None:
+        owners = []
+        # pydantic models refuse unknown attributes, the instance attributes shadow the methods only on this service
+        object.__setattr__(service, "_request_wrappers", owners)
+    if any(existing is owner for existing in owners):
+        return False
+    owners.append(owner)
+
+    object.__setattr__(service, "_inner_get_chat_message_contents", wrap(service._inner_get_chat_message_contents))
+    object.__setattr__(
+        service, "_inner_get_streaming_chat_message_contents", wrap_streaming(service._inner_get_streaming_chat_message_contents)
+    )
+    return True
@@ -0,0 +1,129 @@
+import asyncio
+import json
+from typing import Any, Awaitable, Callable
+
+from semantic_kernel import Kernel
+from semantic_kernel.filters import FilterTypes, FunctionInvocationContext
+from semantic_kernel.functions import KernelArguments, KernelFunction
+
+
+def default_key(function: KernelFunction, arguments: KernelArguments) -> str:
+    """The function and all of its arguments and execution settings: only exactly the same call is shared."""
+    settings = {service_id: settings.model_dump(exclude_none=True) for service_id, settings in (arguments.execution_settings or {}).items()}
+    return json.dumps([function.fully_qualified_name, dict(arguments), settings], sort_keys=True, default=str)
+
+
+def normalised_key(*parameters: str) -> Callable:
+    """
+    Key on the named parameters only, with case and surrounding blanks of string values ignored, so
+    "latest news for India" and "Latest news for india " share a call.
+    """
+
+    def key(function: KernelFunction, arguments: KernelArguments) -> str:
+        values = [arguments.get(parameter) for parameter in parameters]
+        return json.dumps(
+            [function.fully_qualified_name, [" ".join(value.split()).casefold() if isinstance(value, str) else value for value in values]],
+            default=str,
+        )
+
+    return key
+
+
+class _Call:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Description: SingleFlight lets concurrent identical calls share one execution: while a call is in flight, a
+    call with the same key waits for its result instead of running again, so a burst of requests for the same
+    topic costs one agent run, Graph fetch or completion instead of one per request.
+
+    - as a kernel filter it coalesces invocations of the functions it was given (fully qualified names), keyed on
+      the function and its arguments (default_key) or on a key function per function; a key function returning
+      None lets that call run on its own
+    - do(key, factory) coalesces any awaitable, for example a fetch inside a function
+    - only calls that overlap are shared, nothing is kept once the call is done (see ResponseCache for that);
+      an error is raised to every caller of the call
+    - the shared call runs in its own task: a caller that is cancelled stops waiting, the call is only cancelled
+      when no caller is left
+    - coalesced callers get a copy of the FunctionResult with metadata["coalesced"] = True
+
+    Usage:
+        single_flight = SingleFlight(functions={"Agents-WebSearchAgent": normalised_key("query")}).register(kernel)
+        results = await asyncio.gather(*[kernel.invoke(web_search, query=topic) for topic in topics])
+        print(single_flight.report())
+    """
+
+    def __init__(self, functions=(), key: Callable[[KernelFunction, KernelArguments], Any] = default_key):
+        # fully qualified name -> key function, a list of names uses key for all of them
+        self.functions = {name: (function_key or key) for name, function_key in functions.items()} if isinstance(functions, dict) else dict.fromkeys(functions, key)
+        self._in_flight = {}
+        self.stats = {"calls": 0, "executed": 0, "collapsed": 0, "bypassed": 0, "max_in_flight": 0}
+        self.per_function = {}
+
+    def register(self, kernel: Kernel) -> "SingleFlight":
+        kernel.add_filter(FilterTypes.FUNCTION_INVOCATION, self._function_invocation_filter)
+        return self
+
+    def _join(self, key, factory: Callable[[], Awaitable], name: str):
+        call = self._in_flight.get(key)
+        joined = call is not None
+        if not joined:
+            call = self._in_flight[key] = _Call(asyncio.ensure_future(factory()))
+            # the key is free again as soon as the call is done, the next call runs anew
+            call.task.add_done_callback(lambda _: self._in_flight.pop(key, None) if self._in_flight.get(key) is call else None)
+            self.stats["max_in_flight"] = max(self.stats["max_in_flight"], len(self._in_flight))
+
+        outcome = "collapsed" if joined else "executed"
+        self.stats["calls"] += 1
+        self.stats[outcome] += 1
+        counts = self.per_function.setdefault(name, {"executed": 0, "collapsed": 0})
+        counts[outcome] += 1
+        return call, joined
+
+    @staticmethod
+    async def _wait(call: _Call):
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # every caller was cancelled, nobody needs the result any more
+                call.task.cancel()
+
+    async def do(self, key, factory: Callable[[], Awaitable], name: str = "default"):
+        """The result of factory(), shared with every do() with the same key while it is in flight."""
+        call, _ = self._join(key, factory, name)
+        return await self._wait(call)
+
+    async def _function_invocation_filter(self, context: FunctionInvocationContext, next):
+        name = context.function.fully_qualified_name
+        key_function = self.functions.get(name)
+        key = key_function(context.function, context.arguments) if key_function is not None and not context.is_streaming else None
+        if key is None:
+            if key_function is not None:
+                self.stats["bypassed"] += 1
+            await next(context)
+            return
+
+        async def invoke():
+            await next(context)
+            return context.result
+
+        call, joined = self._join(key, invoke, name)
+        result = await self._wait(call)
+        if joined and result is not None:
+            result = result.model_copy(update={"metadata": {**result.metadata, "coalesced": True}})
+        context.result = result
+
+    def report(self) -> dict:
+        return {
+            **self.stats,
+            "collapse_rate": round(self.stats["collapsed"] / self.stats["calls"], 4) if self.stats["calls"] else 0.0,
+            "in_flight": len(self._in_flight),
+            "per_function": self.per_function,
+        }
@@ -0,0 +1,122 @@
+import atexit
+import builtins
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+
+class StartupProfiler:
+    """
+    Description: StartupProfiler shows where the cold start of a script goes: how long every module took to import
+    and how long the clients took to construct.
+
+    start() times every import that loads a module for the first time (total, and self time without the imports
+    it triggered in turn); measure(label) times a block such as a client construction. Nothing is recorded
+    before start() or when the profiler is disabled, measure() then costs one attribute check.
+
+    With STARTUP_PROFILE set, the module level profiler starts itself and prints its report when the process
+    exits (STARTUP_PROFILE=json prints JSON). Import it before anything heavy so those imports are seen.
+
+    Usage:
+        from helpers.startup_profile import profiler
+        profiler.start()
+        with profiler.measure("AIProjectClient"):
+            project_client = AIProjectClient.from_connection_string(...)
+        print(profiler.format())
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.started_at = None
+        self.imports = {}  # module name -> {"total_ms", "self_ms"} of the imports that loaded something
+        self.blocks = {}  # label -> total ms
+        self._original_import = None
+        self._local = threading.local()
+
+    def start(self) -> "StartupProfiler":
+        if not self.enabled or self._original_import is not None:
+            return self
+        self.started_at = time.perf_counter()
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._timed_import
+        return self
+
+    def stop(self):
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        # relative imports count towards the importing module
+        if level or (name in sys.modules and not fromlist):
+            return self._original_import(name, globals, locals, fromlist, level)
+
+        # the import time of the modules imported while this one loads is theirs, not this module's own time
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        stack.append(0.0)
+        modules_before = len(sys.modules)
+        start = time.perf_counter()
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - start
+            children = stack.pop()
+            # submodules loaded through a fromlist (from package import module) count towards the package
+            if len(sys.modules) > modules_before:
+                if stack:
+                    stack[-1] += elapsed
+                stats = self.imports.setdefault(name, {"total_ms": 0.0, "self_ms": 0.0})
+                stats["total_ms"] = round(stats["total_ms"] + elapsed * 1000, 3)
+                stats["self_ms"] = round(stats["self_ms"] + (elapsed - children) * 1000, 3)
+
+    @contextmanager
+    def measure(self, label: str):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.blocks[label] = round(self.blocks.get(label, 0.0) + (time.perf_counter() - start) * 1000, 3)
+
+    def report(self, top: int = 15) -> dict:
+        slowest = sorted(self.imports.items(), key=lambda item: item[1]["total_ms"], reverse=True)[:top]
+        return {
+            "since_start_ms": round((time.perf_counter() - self.started_at) * 1000, 3) if self.started_at else None,
+            "modules_imported": len(self.imports),
+            "import_self_ms": round(sum(stats["self_ms"] for stats in self.imports.values()), 3),
+            "slowest_imports": dict(slowest),
+            "clients_ms": dict(self.blocks),
+        }
+
+    def format(self, top: int = 15) -> str:
+        report = self.report(top)
+        lines = [
+            f"startup profile: {report['modules_imported']} modules imported in {report['import_self_ms']:.1f} ms, "
+            f"{report['since_start_ms'] or 0:.1f} ms since start"
+        ]
+        for name, stats in report["slowest_imports"].items():
+            lines.append(f"  import {name:<50} {stats['total_ms']:>9.1f} ms  (self {stats['self_ms']:.1f} ms)")
+        for label, elapsed in report["clients_ms"].items():
+            lines.append(f"  client {label:<50} {elapsed:>9.1f} ms")
+        return "\n".join(lines)
+
+
+profiler = StartupProfiler(enabled=bool(os.getenv("STARTUP_PROFILE")))
+if profiler.enabled:
+    profiler.start()
+
+    def _print_report():
+        if os.getenv("STARTUP_PROFILE") == "json":
+            import json
+
+            print(json.dumps(profiler.report(), indent=2), file=sys.stderr)
+        else:
+            print(profiler.format(), file=sys.stderr)
+
+    atexit.register(_print_report)
@@ -0,0 +1,49 @@
+import time
+
+from semantic_kernel.functions import KernelFunction
+from semantic_kernel.functions.kernel_function_from_method import KernelFunctionFromMethod
+
+
+def chunk_text(chunk) -> str:
+    """Text of one streamed chunk: prompt functions stream one list of message chunks per choice, native ones text."""
+    if isinstance(chunk, list):
+        return str(chunk[0]) if chunk else ""
+    return "" if chunk is None else str(chunk)
+
+
+def can_stream(function: KernelFunction) -> bool:
+    """Prompt functions always stream; native functions only when they have a stream method."""
+    if function.is_prompt:
+        return True
+    return isinstance(function, KernelFunctionFromMethod) and function.stream_method is not None
+
+
+def streaming_function(method, stream_method, plugin_name: str = None) -> KernelFunctionFromMethod:
+    """
+    A native kernel function with a separate streaming implementation: kernel.invoke returns method's result,
+    kernel.invoke_stream yields the chunks of stream_method. Both get the same arguments.
+    """
+    return KernelFunctionFromMethod(method=method, stream_method=stream_method, plugin_name=plugin_name)
+
+
+async def print_stream(chunks, end: str = "\n") -> dict:
+    """Print a stream of chunks as they arrive; returns the full text and the time to the first and last chunk."""
+    start = time.perf_counter()
+    first_chunk_ms = None
+    parts = []
+
+    async for chunk in chunks:
+        text = chunk_text(chunk)
+        if not text:
+            continue
+        if first_chunk_ms is None:
+            first_chunk_ms = (time.perf_counter() - start) * 1000
+        parts.append(text)
+        print(text, end="", flush=True)
+
+    print(end=end)
+    return {
+        "text": "".join(parts),
+        "time_to_first_chunk_ms": round(first_chunk_ms, 2) if first_chunk_ms is not None else None,
+        "total_ms": round((time.perf_counter() - start) * 1000, 2),
+    }
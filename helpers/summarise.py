@@ -0,0 +1,136 @@
+import asyncio
+from typing import Iterator
+
+from semantic_kernel import Kernel
+from semantic_kernel.functions import KernelArguments, KernelFunction
+
+from helpers.tokens import get_encoding
+
+
+def iter_chunks(path: str, chunk_tokens: int = 3000, encoding=None, block_size: int = 64 * 1024) -> Iterator[str]:
+    """
+    Read a text file block by block and yield chunks of at most chunk_tokens tokens, cut at a sentence or
+    word boundary where possible. Only one block plus one chunk is held in memory at a time.
+    """
+    encoding = encoding or get_encoding()
+    buffer = ""
+
+    with open(path, "r", encoding="utf-8") as file:
+        while True:
+            block = file.read(block_size)
+            buffer += block
+
+            while buffer:
+                tokens = encoding.encode(buffer)
+                if len(tokens) <= chunk_tokens:
+                    if block:
+                        break  # not a full chunk yet, read more
+                    yield buffer  # end of file, the rest is the last chunk
+                    buffer = ""
+                    break
+
+                head = encoding.decode_bytes(tokens[:chunk_tokens]).decode("utf-8", errors="ignore")
+                cut = max(head.rfind(". "), head.rfind("\n"))
+                if cut < len(head) // 2:
+                    cut = head.rfind(" ")
+                cut = cut + 1 if cut > 0 else len(head)
+
+                yield buffer[:cut]
+                buffer = buffer[cut:].lstrip()
+
+            if not block:
+                return
+
+
+class MapReduceSummariser:
+    """
+    Description: MapReduceSummariser summarises documents that are far bigger than the model's context window.
+
+    - map: the document is streamed in token sized chunks and every chunk is summarised with the summarise
+      prompt function, at most max_concurrency calls at a time
+    - reduce: as soon as fan_in partial summaries of a level are ready (in document order) they are summarised
+      again into one summary of the next level, until a single summary is left
+
+    Reading is throttled by the running calls, so memory stays flat no matter how large the file is.
+
+    Usage:
+        summariser = MapReduceSummariser(kernel, kernel.plugins["writerPlugin"]["summarise"])
+        summary = await summariser.summarise_file("../data/chatgpt.txt")
+    """
+
+    def __init__(
+        self,
+        kernel: Kernel,
+        summarise_function: KernelFunction,
+        chunk_tokens: int = 3000,
+        max_concurrency: int = 4,
+        fan_in: int = 8,
+        input_variable: str = "input",
+        model: str = None,
+    ):
+        self.kernel = kernel
+        self.summarise_function = summarise_function
+        self.chunk_tokens = chunk_tokens
+        self.max_concurrency = max_concurrency
+        self.fan_in = fan_in
+        self.input_variable = input_variable
+        self.encoding = get_encoding(model)
+
+        self.stats = {"chunks": 0, "reduce_calls": 0, "levels": 0}
+
+    async def _summarise(self, semaphore: asyncio.Semaphore, text: str) -> str:
+        async with semaphore:
+            result = await self.kernel.invoke(
+                self.summarise_function, KernelArguments(**{self.input_variable: text})
+            )
+        return str(result).strip()
+
+    async def _reduce(self, semaphore: asyncio.Semaphore, parts: list) -> str:
+        summaries = await asyncio.gather(*parts)
+        self.stats["reduce_calls"] += 1
+        return await self._summarise(semaphore, "\n\n".join(summaries))
+
+    def _push(self, levels: list, level: int, task: asyncio.Task, semaphore: asyncio.Semaphore):
+        if level == len(levels):
+            levels.append([])
+        levels[level].append(task)
+
+        if len(levels[level]) == self.fan_in:
+            parts, levels[level] = levels[level], []
+            self._push(levels, level + 1, asyncio.create_task(self._reduce(semaphore, parts)), semaphore)
+
+    async def summarise_chunks(self, chunks) -> str:
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        levels = []
+        running = set()
+
+        for chunk in chunks:
+            # backpressure: do not read further ahead than the calls that can actually run
+            while len(running) >= self.max_concurrency:
+                _, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+
+            task = asyncio.create_task(self._summarise(semaphore, chunk))
+            running.add(task)
+            self.stats["chunks"] += 1
+            self._push(levels, 0, task, semaphore)
+
+        if not levels:
+            return ""
+
+        # fold whatever is left on every level (fewer than fan_in parts) into the level above
+        level = 0
+        while level < len(levels):
+            parts = levels[level]
+            if level == len(levels) - 1 and len(parts) == 1:
+                break
+            if parts:
+                levels[level] = []
+                task = parts[0] if len(parts) == 1 else asyncio.create_task(self._reduce(semaphore, parts))
+                self._push(levels, level + 1, task, semaphore)
+            level += 1
+
+        self.stats["levels"] = len(levels)
+        return await levels[-1][0]
+
+    async def summarise_file(self, path: str) -> str:
+        return await self.summarise_chunks(iter_chunks(path, self.chunk_tokens, self.encoding))
@@ -0,0 +1,362 @@
+import asyncio
+import json
+import os
+import re
+import struct
+import zlib
+from collections import OrderedDict
+
+from semantic_kernel.contents import AuthorRole, ChatHistory, ChatMessageContent, TextContent
+
+from helpers.chat_history import is_summary
+
+_RECORD_HEADER = struct.Struct("<IIB")  # payload length, crc32 of the payload, flags
+_SNAPSHOT_HEADER = struct.Struct("<4sQI")  # magic, log offset the snapshot covers, message count
+_SNAPSHOT_MAGIC = b"SKT1"
+_TEXT_HEADER = struct.Struct("<BH")  # role, length of the name
+
+_COMPRESSED = 1
+_JSON = 2
+# payloads shorter than this are not worth compressing
+COMPRESS_MIN_BYTES = 256
+
+_ROLES = list(AuthorRole)
+_THREAD_ID = re.compile(r"^[\w.-]{1,128}$")
+
+
+def encode_message(message: ChatMessageContent) -> bytes:
+    """
+    One log record: a plain text message (the common case) as role, name and utf-8 text, anything else (function
+    calls and results, images, metadata such as the summary marker) as the JSON of the message; zlib compressed
+    when that makes it smaller.
+    """
+    items = message.items
+    if len(items) == 1 and type(items[0]) is TextContent and not message.metadata and not items[0].metadata and not message.encoding:
+        name = (message.name or "").encode("utf-8")
+        payload = _TEXT_HEADER.pack(_ROLES.index(message.role), len(name)) + name + (items[0].text or "").encode("utf-8")
+        flags = 0
+    else:
+        payload = json.dumps(message.model_dump(exclude_none=True, exclude={"inner_content"}), default=str, separators=(",", ":")).encode("utf-8")
+        flags = _JSON
+    if len(payload) >= COMPRESS_MIN_BYTES:
+        compressed = zlib.compress(payload, 6)
+        if len(compressed) < len(payload):
+            payload, flags = compressed, flags | _COMPRESSED
+    return _RECORD_HEADER.pack(len(payload), zlib.crc32(payload), flags) + payload
+
+
+def decode_message(payload: bytes, flags: int) -> ChatMessageContent:
+    if flags & _COMPRESSED:
+        payload = zlib.decompress(payload)
+    if flags & _JSON:
+        return ChatMessageContent.model_validate(json.loads(payload))
+    role, name_length = _TEXT_HEADER.unpack_from(payload)
+    start = _TEXT_HEADER.size
+    name = payload[start:start + name_length].decode("utf-8") or None
+    return ChatMessageContent(role=_ROLES[role], name=name, content=payload[start + name_length:].decode("utf-8"))
+
+
+def read_records(data, offset: int = 0):
+    """(payload, flags, end offset) of every intact record from offset on; stops at a torn or corrupt record."""
+    while offset + _RECORD_HEADER.size <= len(data):
+        length, crc, flags = _RECORD_HEADER.unpack_from(data, offset)
+        start = offset + _RECORD_HEADER.size
+        payload = bytes(data[start:start + length])
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            return
+        offset = start + length
+        yield payload, flags, offset
+
+
+class _ThreadState:
+    """What the store remembers of a thread it records: the last message written and when it snapshotted."""
+
+    def __init__(self):
+        self.last = None
+        self.summary = None
+        self.since_snapshot = 0
+
+
+class ThreadStore:
+    """
+    Description: ThreadStore keeps agent threads on local disk, so a restarted worker resumes its conversations
+    without losing them and without listing their messages from the service again.
+
+    Every thread has two files in the store directory:
+        <thread id>.log   append-only log, one record per message: <length><crc32><flags><payload>; plain text
+                          messages are stored as role, name and text, others as JSON, long ones zlib compressed
+        <thread id>.snap  the thread's messages at some point of the log plus the log offset it covers,
+                          replaced atomically
+
+    - record(thread_id, history) appends the messages added since the last call; a snapshot is written every
+      snapshot_every records and whenever a TokenBudgetChatHistory compacted its older turns into a summary, so
+      the snapshot stays as small as the history the model sees
+    - resume reads the snapshot and only the log records after it: O(recent turns), not O(conversation)
+    - all threads share one writer: appends queue up while a batch is being written and go to disk together,
+      one write per thread file per batch, an awaited append returns once its batch is written (and fsynced
+      with fsync=True)
+    - a torn record at the end of a log (crash in the middle of a write) is ignored on read and cut off before
+      the next append
+
+    Thread ids are used as file names, so they are limited to letters, digits, "_", "-" and ".". Only one
+    process should write to a store at a time.
+
+    Usage:
+        store = ThreadStore("../.thread_store")
+        history = await store.restore(thread_id, TokenBudgetChatHistory(service=chat_service, max_tokens=4000))
+        thread = ChatHistoryAgentThread(chat_history=history)
+        response = await agent.get_response(messages=user_input, thread=thread)
+        await store.record(thread_id, history)
+        ...
+        await store.close()
+    """
+
+    def __init__(self, path: str, snapshot_every: int = 64, fsync: bool = False, linger: float = 0.0, max_open_files: int = 256):
+        self.path = path
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync
+        self.linger = linger
+        self.max_open_files = max_open_files
+
+        self._threads = {}
+        self._files = OrderedDict()  # thread id -> log file open for appending, least recently used first
+        self._queue = None
+        self._writer = None
+        self.stats = {"appended": 0, "snapshots": 0, "batches": 0, "bytes_written": 0, "restored": 0, "records_replayed": 0}
+
+        os.makedirs(path, exist_ok=True)
+
+    def _file_path(self, thread_id: str, extension: str) -> str:
+        if not _THREAD_ID.match(thread_id or ""):
+            raise ValueError(f"thread id {thread_id!r} can only contain letters, digits, '_', '-' and '.'")
+        return os.path.join(self.path, f"{thread_id}.{extension}")
+
+    def thread_ids(self) -> list:
+        return sorted(name[:-4] for name in os.listdir(self.path) if name.endswith(".log"))
+
+    def _read_snapshot(self, thread_id: str):
+        """(messages, log offset) of the thread's snapshot, ([], 0) when there is none or it is unreadable."""
+        try:
+            with open(self._file_path(thread_id, "snap"), "rb") as file:
+                data = file.read()
+        except FileNotFoundError:
+            return [], 0
+        if len(data) < _SNAPSHOT_HEADER.size:
+            return [], 0
+        magic, offset, count = _SNAPSHOT_HEADER.unpack_from(data)
+        records = list(read_records(data, _SNAPSHOT_HEADER.size))
+        if magic != _SNAPSHOT_MAGIC or len(records) != count:
+            return [], 0
+        return [decode_message(payload, flags) for payload, flags, _ in records], offset
+
+    def _snapshot_offset(self, thread_id: str) -> int:
+        try:
+            with open(self._file_path(thread_id, "snap"), "rb") as file:
+                header = file.read(_SNAPSHOT_HEADER.size)
+        except FileNotFoundError:
+            return 0
+        if len(header) < _SNAPSHOT_HEADER.size or header[:4] != _SNAPSHOT_MAGIC:
+            return 0
+        return _SNAPSHOT_HEADER.unpack(header)[1]
+
+    def _read_tail(self, thread_id: str, offset: int):
+        """(payload, flags, end offset) of the log records from offset on."""
+        try:
+            with open(self._file_path(thread_id, "log"), "rb") as file:
+                file.seek(offset)
+                data = file.read()
+        except FileNotFoundError:
+            return []
+        return [(payload, flags, offset + end) for payload, flags, end in read_records(data)]
+
+    def load(self, thread_id: str) -> list:
+        """The thread's messages: its snapshot plus the log records written after it."""
+        return self._load(thread_id)[0]
+
+    def _load(self, thread_id: str):
+        messages, offset = self._read_snapshot(thread_id)
+        tail = self._read_tail(thread_id, offset)
+        messages.extend(decode_message(payload, flags) for payload, flags, _ in tail)
+        self.stats["records_replayed"] += len(tail)
+        return messages, len(tail)
+
+    async def restore(self, thread_id: str, history: ChatHistory = None) -> ChatHistory:
+        """The thread's messages in history (a new ChatHistory by default); later record() calls continue the log."""
+        messages, tail_records = await asyncio.to_thread(self._load, thread_id)
+        history = history if history is not None else ChatHistory()
+        # extended rather than added one by one, a TokenBudgetChatHistory counts their tokens when it needs to
+        history.messages.extend(messages)
+
+        state = self._threads[thread_id] = _ThreadState()
+        state.last = history.messages[-1] if history.messages else None
+        state.summary = next((message for message in history.messages if is_summary(message)), None)
+        state.since_snapshot = tail_records
+        self.stats["restored"] += 1
+        return history
+
+    async def restore_many(self, thread_ids, history_factory=ChatHistory, concurrency: int = 32) -> dict:
+        """thread id -> restored history of every thread, concurrency threads read at a time."""
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def restore(thread_id):
+            async with semaphore:
+                return thread_id, await self.restore(thread_id, history_factory())
+
+        return dict(await asyncio.gather(*[restore(thread_id) for thread_id in thread_ids]))
+
+    async def append(self, thread_id: str, messages) -> None:
+        """Append messages to the thread's log; returns once they are written."""
+        self._file_path(thread_id, "log")
+        await self._submit(thread_id, "append", [encode_message(message) for message in messages])
+        self.stats["appended"] += len(messages)
+
+    async def snapshot(self, thread_id: str, messages) -> None:
+        """Replace the thread's snapshot with messages, covering everything appended before."""
+        self._file_path(thread_id, "snap")
+        await self._submit(thread_id, "snapshot", [encode_message(message) for message in messages])
+        self.stats["snapshots"] += 1
+
+    async def record(self, thread_id: str, history: ChatHistory) -> int:
+        """Append the messages added to history since the last record() or restore(); the number appended."""
+        state = self._threads.setdefault(thread_id, _ThreadState())
+        messages = history.messages
+
+        start = 0
+        if state.last is not None:
+            start = next((index + 1 for index in range(len(messages) - 1, -1, -1) if messages[index] is state.last), None)
+            if start is None:
+                # the last recorded message was compacted away, the log cannot tell what remains of it
+                start = len(messages)
+                state.since_snapshot = self.snapshot_every or 0
+        new_messages = messages[start:]
+
+        if new_messages:
+            await self.append(thread_id, new_messages)
+            state.last = new_messages[-1]
+            state.since_snapshot += len(new_messages)
+
+        summary = next((message for message in messages if is_summary(message)), None)
+        if summary is not state.summary or (self.snapshot_every and state.since_snapshot >= self.snapshot_every):
+            await self.snapshot(thread_id, list(messages))
+            state.summary = summary
+            state.since_snapshot = 0
+        return len(new_messages)
+
+    async def _submit(self, thread_id: str, kind: str, records: list):
+        loop = asyncio.get_running_loop()
+        if self._writer is None or self._writer.done():
+            # writes still queued for a writer that stopped go to the new one, in order
+            pending = []
+            while self._queue is not None and not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item[3].get_loop() is loop and not item[3].done():
+                    pending.append(item)
+            self._queue = asyncio.Queue()
+            for item in pending:
+                self._queue.put_nowait(item)
+            self._writer = asyncio.create_task(self._write_loop())
+        future = loop.create_future()
+        self._queue.put_nowait((thread_id, kind, records, future))
+        await future
+
+    async def _write_loop(self):
+        while True:
+            batch = [await self._queue.get()]
+            try:
+                if self.linger:
+                    await asyncio.sleep(self.linger)
+                while not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                errors = await asyncio.to_thread(self._write_batch, batch)
+            except asyncio.CancelledError:
+                # the writes taken from the queue may or may not be on disk, their callers must not wait forever
+                for _, _, _, future in batch:
+                    future.cancel()
+                raise
+            except Exception as exc:
+                # whatever failed, the writes of this batch fail with it and the writer goes on with the next
+                errors = {thread_id: exc for thread_id, _, _, _ in batch}
+            self.stats["batches"] += 1
+            for thread_id, _, _, future in batch:
+                if future.done():
+                    continue
+                if thread_id in errors:
+                    future.set_exception(errors[thread_id])
+                else:
+                    future.set_result(None)
+
+    def _log_file(self, thread_id: str):
+        file = self._files.get(thread_id)
+        if file is not None:
+            self._files.move_to_end(thread_id)
+            return file
+
+        path = self._file_path(thread_id, "log")
+        file = open(path, "a+b")
+        # a torn record left by a crash would hide everything appended after it, cut it off first
+        offset = self._snapshot_offset(thread_id)
+        tail = self._read_tail(thread_id, offset)
+        end = tail[-1][2] if tail else offset
+        if os.fstat(file.fileno()).st_size > end:
+            file.truncate(end)
+
+        self._files[thread_id] = file
+        while len(self._files) > self.max_open_files:
+            self._files.popitem(last=False)[1].close()
+        return file
+
+    def _write_batch(self, batch: list) -> dict:
+        """Write a batch of appends and snapshots, in order per thread; thread id -> error of the failed threads."""
+        operations = {}
+        for thread_id, kind, records, _ in batch:
+            if kind == "barrier":
+                continue
+            operations.setdefault(thread_id, []).append((kind, records))
+
+        errors = {}
+        for thread_id, thread_operations in operations.items():
+            try:
+                file = self._log_file(thread_id)
+                pending = bytearray()
+                for kind, records in thread_operations:
+                    if kind == "append":
+                        pending += b"".join(records)
+                        continue
+                    file.write(pending)
+                    file.flush()
+                    self.stats["bytes_written"] += len(pending)
+                    pending.clear()
+                    self._write_snapshot(thread_id, records, file.tell())
+                file.write(pending)
+                file.flush()
+                self.stats["bytes_written"] += len(pending)
+                if self.fsync:
+                    os.fsync(file.fileno())
+            except OSError as exc:
+                errors[thread_id] = exc
+                file = self._files.pop(thread_id, None)
+                if file is not None:
+                    file.close()
+        return errors
+
+    def _write_snapshot(self, thread_id: str, records: list, offset: int):
+        path = self._file_path(thread_id, "snap")
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as file:
+            file.write(_SNAPSHOT_HEADER.pack(_SNAPSHOT_MAGIC, offset, len(records)))
+            file.write(b"".join(records))
+            if self.fsync:
+                file.flush()
+                os.fsync(file.fileno())
+        os.replace(temp_path, path)
+
+    async def close(self):
+        """Wait for the queued writes and close the log files."""
+        if self._writer is not None and not self._writer.done():
+            # queued after every pending write, so it completes once they are on disk
+            await self._submit(None, "barrier", [])
+            self._writer.cancel()
+        self._writer = None
+        for file in self._files.values():
+            file.close()
+        self._files.clear()
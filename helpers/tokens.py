@@ -0,0 +1,13 @@
+import tiktoken
+
+
+def get_encoding(model: str = None):
+    """Tokenizer for a model; Azure deployment names are not model names, so unknown names get o200k_base."""
+    try:
+        return tiktoken.encoding_for_model(model or "gpt-4o")
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def count_tokens(text: str, encoding=None) -> int:
+    return len((encoding or get_encoding()).encode(text))
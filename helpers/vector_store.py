@@ -0,0 +1,433 @@
+import fnmatch
+import hashlib
+import json
+import os
+import re
+import threading
+import zlib
+from typing import Annotated, Callable, Iterator
+
+import numpy as np
+from semantic_kernel.functions.kernel_function_decorator import kernel_function
+
+from helpers.function_index import terms
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n\s*\n")
+_TOKEN = re.compile(r"[^\W_]+")
+_MANIFEST_VERSION = 2
+# the data files of a generation of the store, a compaction writes the next generation
+_DATA_FILES = {"vectors": "vectors.{}.f32", "rows": "rows.{}.i64", "passages": "passages.{}.bin"}
+_DATA_FILE = re.compile(r"^(?:vectors|rows|passages)\.(\d+)\.(?:f32|i64|bin)$")
+
+
+def iter_passages(path: str, chunk_words: int = 200, overlap_words: int = 40, block_size: int = 64 * 1024) -> Iterator[str]:
+    """
+    Read a text file block by block and yield passages of about chunk_words words, cut at sentence ends where
+    possible. Consecutive passages share their last sentences up to overlap_words words, so an answer that spans
+    a cut is still found in one passage. Only one block plus one passage is held in memory at a time.
+    """
+    passage = []  # (sentence, words) of the passage being filled
+    fresh = 0  # sentences of the passage that were not in the previous one
+    buffer = ""
+
+    with open(path, "r", encoding="utf-8", errors="replace") as file:
+        while True:
+            block = file.read(block_size)
+            buffer += block
+            if block:
+                # the text after the last sentence end may continue in the next block
+                ends = list(_SENTENCE_END.finditer(buffer))
+                if not ends:
+                    continue
+                text, buffer = buffer[:ends[-1].end()], buffer[ends[-1].end():]
+            else:
+                text, buffer = buffer, ""
+
+            for sentence in _SENTENCE_END.split(text):
+                words = sentence.split()
+                # a sentence longer than a passage is cut at word boundaries
+                for start in range(0, len(words), chunk_words):
+                    part = words[start:start + chunk_words]
+                    passage.append((" ".join(part), len(part)))
+                    fresh += 1
+                    if sum(count for _, count in passage) < chunk_words:
+                        continue
+
+                    yield " ".join(sentence for sentence, _ in passage)
+                    kept = 0
+                    for index in range(len(passage), 0, -1):
+                        kept += passage[index - 1][1]
+                        if kept > overlap_words:
+                            passage = passage[index:]
+                            break
+                    fresh = 0
+
+            if not block:
+                break
+
+    if fresh:
+        yield " ".join(sentence for sentence, _ in passage)
+
+
+class HashingEmbedding:
+    """
+    Local embedding function: the word stems, word pairs and numbers of a text hashed into dim signed buckets, weighted
+    by log term frequency and normalised. No model and no network, good enough to find the passages that share
+    the words of a question. Any callable list[str] -> (len, dim) float array with a name attribute can take
+    its place, for example a sentence-transformers model.
+    """
+
+    def __init__(self, dim: int = 1024):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _features(self, text: str):
+        words = terms(text)
+        yield from words
+        # the stems drop digits, years and identifiers such as "2022" or "gpt4o" are kept whole
+        yield from (token for token in _TOKEN.findall(text.lower()) if not token.isalpha())
+        yield from (f"{first} {second}" for first, second in zip(words, words[1:]))
+
+    def __call__(self, texts: list) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                # crc32 rather than hash(), the buckets must be the same in every process
+                bucket = zlib.crc32(feature.encode("utf-8"))
+                vectors[row, bucket % self.dim] += 1.0 if bucket & 0x80000000 else -1.0
+        vectors = np.sign(vectors) * np.log1p(np.abs(vectors))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+
+class VectorStore:
+    """
+    Description: VectorStore keeps the passages of the files under a directory with their embeddings on disk and
+    finds the passages closest to a question, so a prompt carries those few passages instead of whole files.
+
+    Files in the store directory (default: .vector_store next to the data directory):
+        vectors.N.f32    float32 embeddings, one row per passage, read through np.memmap
+        rows.N.i64       per row: offset and length of its text in passages.N.bin and the id of its file
+        passages.N.bin   the passage texts, utf-8, read through np.memmap
+        manifest.json    dimension and embedding name, the generation N of the data files, every indexed
+                         file with its size, mtime, sha256 and rows
+
+    - update() is incremental: unchanged files are skipped on (size, mtime), touched files with the same
+      content on their sha256; the rows of a changed or removed file are retired and the new passages are
+      appended. When more than half of the rows are retired the files are rewritten (compact)
+    - vectors and passages are written before the manifest, which is replaced atomically, so an interrupted
+      update leaves the previous index intact (the unreferenced tail is cut off on the next open). A compaction
+      writes the next generation of the data files and switches to it with the manifest, the files of the
+      other generations are removed once the manifest is written or on the next open
+    - search() embeds all questions at once and scans the memory map block_rows rows at a time with one matrix
+      product per block, keeping the running top_k of every question; only one block is in memory, whatever
+      the size of the corpus
+    - a different embedding function (name or dimension) rebuilds the store from scratch
+
+    Only one process should update a store at a time.
+
+    Usage:
+        store = VectorStore("../data", embedding=HashingEmbedding())
+        store.update()
+        kernel.add_plugin(RetrievalPlugin(store), plugin_name="retrieval")
+    """
+
+    def __init__(
+        self,
+        data_dir: str,
+        store_dir: str = None,
+        embedding: Callable = None,
+        patterns=("*.txt", "*.md"),
+        chunk_words: int = 200,
+        overlap_words: int = 40,
+        batch_size: int = 64,
+        block_rows: int = 65536,
+    ):
+        self.data_dir = os.path.abspath(data_dir)
+        self.store_dir = store_dir or os.path.join(os.path.dirname(self.data_dir), ".vector_store")
+        self.embedding = embedding or HashingEmbedding()
+        self.patterns = tuple(patterns)
+        self.chunk_words = chunk_words
+        self.overlap_words = overlap_words
+        self.batch_size = batch_size
+        self.block_rows = block_rows
+
+        self._lock = threading.Lock()
+        self.stats = {"files_indexed": 0, "files_skipped": 0, "files_removed": 0, "passages_embedded": 0, "compactions": 0, "searches": 0}
+
+        os.makedirs(self.store_dir, exist_ok=True)
+        self._load()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.store_dir, name)
+
+    def _data_path(self, name: str, generation: int = None) -> str:
+        return self._path(_DATA_FILES[name].format(self.manifest["generation"] if generation is None else generation))
+
+    def _load(self):
+        manifest = None
+        if os.path.exists(self._path("manifest.json")):
+            with open(self._path("manifest.json"), "r", encoding="utf-8") as file:
+                manifest = json.load(file)
+        name = getattr(self.embedding, "name", type(self.embedding).__name__)
+        if manifest is None or manifest.get("version") != _MANIFEST_VERSION or manifest.get("embedding") != name:
+            manifest = {"version": _MANIFEST_VERSION, "embedding": name, "dim": None, "generation": 0, "rows": 0, "text_bytes": 0, "next_file_id": 0, "files": {}}
+        self.manifest = manifest
+
+        # whatever lies beyond what the manifest knows is left over from an interrupted update
+        dim = manifest["dim"] or 0
+        for name, size in (("vectors", manifest["rows"] * dim * 4), ("rows", manifest["rows"] * 3 * 8), ("passages", manifest["text_bytes"])):
+            with open(self._data_path(name), "a+b") as file:
+                file.truncate(size)
+        # and so are the data files of another generation: an interrupted compaction or one that could not remove them
+        self._remove_generations(keep=manifest["generation"])
+
+        self._open_maps()
+
+    def _remove_generations(self, keep: int):
+        for filename in os.listdir(self.store_dir):
+            match = _DATA_FILE.match(filename)
+            if match and int(match.group(1)) != keep:
+                try:
+                    os.remove(self._path(filename))
+                except OSError:
+                    # still mapped by a search on a platform that does not allow that, the next open removes it
+                    pass
+
+    def _open_maps(self):
+        rows, dim, text_bytes = self.manifest["rows"], self.manifest["dim"], self.manifest["text_bytes"]
+        if rows:
+            self.vectors = np.memmap(self._data_path("vectors"), dtype=np.float32, mode="r", shape=(rows, dim))
+            self.rows = np.memmap(self._data_path("rows"), dtype=np.int64, mode="r", shape=(rows, 3))
+        else:
+            self.vectors = np.zeros((0, dim or 0), dtype=np.float32)
+            self.rows = np.zeros((0, 3), dtype=np.int64)
+        # the maps stay valid for a search that holds them, whatever update or compaction does to the store meanwhile
+        if text_bytes:
+            self.passages = np.memmap(self._data_path("passages"), dtype=np.uint8, mode="r", shape=(text_bytes,))
+        else:
+            self.passages = np.zeros(0, dtype=np.uint8)
+
+        self.live = np.zeros(rows, dtype=bool)
+        self.file_names = {}
+        for relative_path, entry in self.manifest["files"].items():
+            self.live[entry["start"]:entry["end"]] = True
+            self.file_names[entry["id"]] = relative_path
+
+    def _write_manifest(self):
+        temp_path = self._path("manifest.json.tmp")
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(self.manifest, file)
+        os.replace(temp_path, self._path("manifest.json"))
+
+    def files(self) -> dict:
+        """Relative path -> absolute path of every file under data_dir that matches one of the patterns."""
+        found = {}
+        for directory, _, names in os.walk(self.data_dir):
+            for name in names:
+                if any(fnmatch.fnmatch(name, pattern) for pattern in self.patterns):
+                    path = os.path.join(directory, name)
+                    found[os.path.relpath(path, self.data_dir).replace(os.sep, "/")] = path
+        return found
+
+    @staticmethod
+    def _sha256(path: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, "rb") as file:
+            for block in iter(lambda: file.read(1024 * 1024), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _embed(self, texts: list) -> np.ndarray:
+        vectors = np.asarray(self.embedding(texts), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def _append(self, path: str, vectors_file, rows_file, passages_file) -> dict:
+        """Embed the passages of one file and append them; the manifest entry of the file."""
+        file_id = self.manifest["next_file_id"]
+        self.manifest["next_file_id"] += 1
+        start = self.manifest["rows"]
+
+        def flush(batch):
+            vectors = self._embed(batch)
+            if self.manifest["dim"] is None:
+                self.manifest["dim"] = vectors.shape[1]
+            elif vectors.shape[1] != self.manifest["dim"]:
+                raise ValueError(f"the embedding returned {vectors.shape[1]} dimensions, the store has {self.manifest['dim']}")
+            vectors_file.write(vectors.tobytes())
+            for text in batch:
+                payload = text.encode("utf-8")
+                rows_file.write(np.array([self.manifest["text_bytes"], len(payload), file_id], dtype=np.int64).tobytes())
+                passages_file.write(payload)
+                self.manifest["text_bytes"] += len(payload)
+            self.manifest["rows"] += len(batch)
+            self.stats["passages_embedded"] += len(batch)
+
+        batch = []
+        for passage in iter_passages(path, self.chunk_words, self.overlap_words):
+            batch.append(passage)
+            if len(batch) == self.batch_size:
+                flush(batch)
+                batch = []
+        if batch:
+            flush(batch)
+
+        stat = os.stat(path)
+        return {"id": file_id, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": self._sha256(path), "start": start, "end": self.manifest["rows"]}
+
+    def update(self) -> dict:
+        """Bring the index in line with the files under data_dir; the counts of this update."""
+        with self._lock:
+            counts = {"indexed": 0, "skipped": 0, "removed": 0}
+            files = self.files()
+            known = self.manifest["files"]
+
+            for relative_path in [relative_path for relative_path in known if relative_path not in files]:
+                del known[relative_path]
+                counts["removed"] += 1
+
+            with open(self._data_path("vectors"), "ab") as vectors_file, open(self._data_path("rows"), "ab") as rows_file, open(
+                self._data_path("passages"), "ab"
+            ) as passages_file:
+                for relative_path, path in sorted(files.items()):
+                    entry = known.get(relative_path)
+                    stat = os.stat(path)
+                    if entry is not None and (entry["size"], entry["mtime_ns"]) == (stat.st_size, stat.st_mtime_ns):
+                        counts["skipped"] += 1
+                        continue
+                    if entry is not None and entry["size"] == stat.st_size and entry["sha256"] == self._sha256(path):
+                        # touched, not changed
+                        entry["mtime_ns"] = stat.st_mtime_ns
+                        counts["skipped"] += 1
+                        continue
+                    known[relative_path] = self._append(path, vectors_file, rows_file, passages_file)
+                    counts["indexed"] += 1
+
+            self._write_manifest()
+            self._open_maps()
+
+            live_rows = int(self.live.sum())
+            if self.manifest["rows"] > 2 * live_rows:
+                self._compact()
+
+            for name, count in counts.items():
+                self.stats[f"files_{name}"] += count
+            return counts
+
+    def _compact(self):
+        """Rewrite the store with the live rows only, file by file, as the next generation of the data files."""
+        vectors, table, passages = self.vectors, self.rows, self.passages
+        generation = self.manifest["generation"] + 1
+        files = {}
+        text_bytes = 0
+        with open(self._data_path("vectors", generation), "wb") as vectors_file, open(self._data_path("rows", generation), "wb") as rows_file, open(
+            self._data_path("passages", generation), "wb"
+        ) as passages_file:
+            position = 0
+            for relative_path, entry in sorted(self.manifest["files"].items(), key=lambda item: item[1]["start"]):
+                start, end = entry["start"], entry["end"]
+                for block_start in range(start, end, self.block_rows):
+                    block_end = min(end, block_start + self.block_rows)
+                    vectors_file.write(np.ascontiguousarray(vectors[block_start:block_end]).tobytes())
+                    for offset, length, file_id in table[block_start:block_end]:
+                        passages_file.write(passages[int(offset):int(offset) + int(length)].tobytes())
+                        rows_file.write(np.array([text_bytes, length, file_id], dtype=np.int64).tobytes())
+                        text_bytes += int(length)
+                files[relative_path] = {**entry, "start": position, "end": position + end - start}
+                position += end - start
+
+        # the old generation stays the index until the manifest naming the new one is in place
+        self.manifest.update(generation=generation, rows=position, text_bytes=text_bytes, files=files)
+        self._write_manifest()
+        self._open_maps()
+        self._remove_generations(keep=generation)
+        self.stats["compactions"] += 1
+
+    def passage(self, row: int) -> str:
+        offset, length, _ = (int(value) for value in self.rows[row])
+        return self.passages[offset:offset + length].tobytes().decode("utf-8")
+
+    def search(self, queries: list, top_k: int = 4, min_score: float = 0.0) -> list:
+        """For every query the top_k passages, best first, as dicts {score, file, text}."""
+        with self._lock:
+            # one consistent snapshot: maps, liveness and texts of the same generation
+            vectors, table, live, file_names, passages = self.vectors, self.rows, self.live, self.file_names, self.passages
+        self.stats["searches"] += len(queries)
+        if not len(vectors) or not queries:
+            return [[] for _ in queries]
+
+        questions = self._embed(list(queries))
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+        for start in range(0, len(vectors), self.block_rows):
+            block = np.asarray(vectors[start:start + self.block_rows])
+            scores = questions @ block.T
+            scores[:, ~live[start:start + len(block)]] = -np.inf
+            # running top_k of every question: the previous best plus the best of this block
+            k = min(top_k, scores.shape[1])
+            candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            best_scores = np.concatenate([best_scores, np.take_along_axis(scores, candidates, axis=1)], axis=1)
+            best_rows = np.concatenate([best_rows, candidates + start], axis=1)
+            if best_scores.shape[1] > top_k:
+                keep = np.argpartition(-best_scores, top_k - 1, axis=1)[:, :top_k]
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        results = []
+        for query_scores, query_rows, query_order in zip(best_scores, best_rows, order):
+            hits = []
+            for index in query_order:
+                score = float(query_scores[index])
+                if not score > min_score:
+                    continue
+                offset, length, file_id = (int(value) for value in table[query_rows[index]])
+                hits.append({"score": round(score, 4), "file": file_names[file_id], "text": passages[offset:offset + length].tobytes().decode("utf-8")})
+            results.append(hits)
+        return results
+
+    def __len__(self):
+        return int(self.live.sum())
+
+
+class RetrievalPlugin:
+    """
+    Description: RetrievalPlugin makes a VectorStore available to the model as native functions, so it looks up
+    the passages it needs instead of being handed whole documents.
+
+    Usage:
+        kernel.add_plugin(RetrievalPlugin(store), plugin_name="retrieval")
+    """
+
+    def __init__(self, store: VectorStore, top_k: int = 4, min_score: float = 0.05):
+        self.store = store
+        self.top_k = top_k
+        self.min_score = min_score
+
+    @staticmethod
+    def _format(hits: list) -> str:
+        if not hits:
+            return "No relevant passage found."
+        return "\n\n".join(f"[{hit['file']}] {hit['text']}" for hit in hits)
+
+    @kernel_function(
+        description="Search the documents of the data directory and return the passages most relevant to a question.",
+        name="Search",
+    )
+    def search(
+        self,
+        query: Annotated[str, "the question or keywords to look up"],
+    ) -> Annotated[str, "the relevant passages, each prefixed with the file it comes from"]:
+        return self._format(self.store.search([query], self.top_k, self.min_score)[0])
+
+    @kernel_function(
+        description="Search the documents for several questions in one call, returns the passages of every question.",
+        name="SearchMany",
+    )
+    def search_many(
+        self,
+        queries: Annotated[list[str], "the questions to look up"],
+    ) -> Annotated[str, "the relevant passages of every question"]:
+        results = self.store.search(queries, self.top_k, self.min_score)
+        return "\n\n".join(f"## {query}\n{self._format(hits)}" for query, hits in zip(queries, results))
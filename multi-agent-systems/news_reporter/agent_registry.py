@@ -0,0 +1,227 @@
+import asyncio
+import hashlib
+import json
+from collections import deque
+from contextlib import asynccontextmanager
+
+
+def agent_key(model: str, name: str, instructions: str, tools=None) -> str:
+    """Build the registry key for an agent definition from its model deployment, name, instructions and tools."""
+    definition = {
+        "model": model,
+        "name": name,
+        "instructions": instructions,
+        "tools": [tool.as_dict() if hasattr(tool, "as_dict") else tool for tool in (tools or [])],
+    }
+    return hashlib.sha256(json.dumps(definition, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def last_message_only():
+    """truncation strategy of every run: the agent only looks at the latest message of its (reused) thread"""
+    #the SDK models are imported on first use, importing this module stays cheap
+    from azure.ai.projects.models import TruncationObject
+
+    return TruncationObject(type="last_messages", last_messages=1)
+
+
+class AsyncAgentRegistry:
+    """
+    Description: AsyncAgentRegistry keeps the Azure AI Agent Service resources used by the news reporter alive for
+    the whole process instead of rebuilding them on every kernel function call. It works on the async
+    AIProjectClient (azure.ai.projects.aio), so agent runs are awaited without blocking the event loop.
+
+    - connections are looked up once per connection name
+    - agents are created once per (model, name, instructions, tools) definition
+    - threads are handed out from a pool and reused; every run only looks at the latest message of the thread
+      (truncation strategy "last_messages") so a reused thread behaves like a fresh one
+    - run() raises with the run's last_error when the run does not complete, run_stream() yields the reply while
+      the agent is still writing it; a thread whose run did not finish (a failed run, a stream its consumer
+      stopped reading early) is deleted instead of going back to the pool
+    - close() deletes every agent and thread created through the registry
+
+    Usage:
+        registry = AsyncAgentRegistry(async_project_client)
+        agent = await registry.get_agent(model, "news-reporter", instructions)
+        answer = await registry.run(agent, "The topic is India and the latest information is ...")
+        await registry.close()
+    """
+
+    def __init__(self, project_client, max_idle_threads: int = 8):
+        self.project_client = project_client
+        self.max_idle_threads = max_idle_threads
+
+        self._create_lock = asyncio.Lock()
+        self._connections = {}
+        self._agents = {}
+        self._idle_threads = deque()
+        self._threads = {}
+        self._closed = False
+
+        self.stats = {
+            "connection_hits": 0,
+            "connection_misses": 0,
+            "agent_hits": 0,
+            "agent_misses": 0,
+            "thread_hits": 0,
+            "thread_misses": 0,
+        }
+
+    async def get_connection(self, connection_name: str):
+        async with self._create_lock:
+            if connection_name in self._connections:
+                self.stats["connection_hits"] += 1
+                return self._connections[connection_name]
+
+            self.stats["connection_misses"] += 1
+            connection = await self.project_client.connections.get(connection_name=connection_name)
+            self._connections[connection_name] = connection
+            return connection
+
+    async def get_agent(self, model: str, name: str, instructions: str, tools=None, headers=None):
+        key = agent_key(model, name, instructions, tools)
+
+        # the lock makes concurrent callers wait for the first create_agent instead of creating duplicates
+        async with self._create_lock:
+            if key in self._agents:
+                self.stats["agent_hits"] += 1
+                return self._agents[key]
+
+            self.stats["agent_misses"] += 1
+            agent = await self.project_client.agents.create_agent(
+                model=model,
+                name=name,
+                instructions=instructions,
+                tools=tools,
+                **({"headers": headers} if headers else {}),
+            )
+            self._agents[key] = agent
+            return agent
+
+    async def acquire_thread(self):
+        if self._idle_threads:
+            self.stats["thread_hits"] += 1
+            return self._idle_threads.popleft()
+
+        # every concurrent run needs its own thread, so misses are created in parallel
+        self.stats["thread_misses"] += 1
+        agent_thread = await self.project_client.agents.create_thread()
+        self._threads[agent_thread.id] = agent_thread
+        return agent_thread
+
+    async def release_thread(self, agent_thread):
+        if not self._closed and len(self._idle_threads) < self.max_idle_threads:
+            self._idle_threads.append(agent_thread)
+            return
+
+        self._threads.pop(agent_thread.id, None)
+        await self.project_client.agents.delete_thread(agent_thread.id)
+
+    async def discard_thread(self, agent_thread):
+        """Delete a thread that may still have an active run, it never goes back to the pool."""
+        self._threads.pop(agent_thread.id, None)
+        try:
+            await self.project_client.agents.delete_thread(agent_thread.id)
+        except Exception as e:
+            print(f"Could not delete thread {agent_thread.id}: {e}")
+
+    @asynccontextmanager
+    async def thread(self):
+        """
+        A pooled thread for one run. It goes back to the pool only when the block finished; when it raised, was
+        cancelled or (run_stream) its consumer stopped early, the run may still be queued or in progress on the
+        thread, so the thread is deleted instead.
+        """
+        agent_thread = await self.acquire_thread()
+        try:
+            yield agent_thread
+        except BaseException:
+            await self.discard_thread(agent_thread)
+            raise
+        await self.release_thread(agent_thread)
+
+    async def run(self, agent, content: str) -> str:
+        """Post a message on a pooled thread, run the agent on it and return the agent's reply."""
+        async with self.thread() as agent_thread:
+            await self.project_client.agents.create_message(
+                thread_id=agent_thread.id,
+                role="user",
+                content=content,
+            )
+
+            run = await self.project_client.agents.create_and_process_run(
+                thread_id=agent_thread.id,
+                assistant_id=agent.id,
+                truncation_strategy=last_message_only(),
+            )
+
+            if run.status != "completed":
+                raise RuntimeError(f"Agent run {run.status}: {run.last_error}")
+
+            messages = await self.project_client.agents.list_messages(
+                thread_id=agent_thread.id, run_id=run.id, limit=1
+            )
+
+        if not messages.data:
+            raise RuntimeError(f"Agent run {run.id} completed without a reply")
+        return messages.data[0].content[0].text.value
+
+    async def run_stream(self, agent, content: str):
+        """Like run(), but yields the agent's reply in text deltas as the run produces them."""
+        from azure.ai.projects.models import AgentStreamEvent, MessageDeltaChunk
+
+        async with self.thread() as agent_thread:
+            await self.project_client.agents.create_message(
+                thread_id=agent_thread.id,
+                role="user",
+                content=content,
+            )
+
+            async with await self.project_client.agents.create_stream(
+                thread_id=agent_thread.id,
+                assistant_id=agent.id,
+                truncation_strategy=last_message_only(),
+            ) as stream:
+                completed = False
+                async for event_type, event_data, _ in stream:
+                    if isinstance(event_data, MessageDeltaChunk):
+                        if event_data.text:
+                            yield event_data.text
+                    elif event_type == AgentStreamEvent.THREAD_RUN_COMPLETED:
+                        completed = True
+                    elif event_type in (AgentStreamEvent.THREAD_RUN_FAILED, AgentStreamEvent.ERROR):
+                        error = getattr(event_data, "last_error", None) or event_data
+                        raise RuntimeError(f"Agent run failed: {error}")
+
+            if not completed:
+                # cancelled, expired or cut off: the thread is not pooled again
+                raise RuntimeError("Agent run did not complete")
+
+    def report(self) -> dict:
+        """Hit/miss counters plus the number of control-plane round trips the registry saved."""
+        report = dict(self.stats)
+        report["agents"] = len(self._agents)
+        report["threads"] = len(self._threads)
+        report["round_trips_saved"] = self.stats["connection_hits"] + self.stats["agent_hits"] + self.stats["thread_hits"]
+        return report
+
+    async def close(self):
+        """Delete every agent and thread created through the registry."""
+        if self._closed:
+            return
+        self._closed = True
+
+        agents = list(self._agents.values())
+        threads = list(self._threads.values())
+        self._agents.clear()
+        self._threads.clear()
+        self._idle_threads.clear()
+        self._connections.clear()
+
+        results = await asyncio.gather(
+            *(self.project_client.agents.delete_thread(agent_thread.id) for agent_thread in threads),
+            *(self.project_client.agents.delete_agent(agent.id) for agent in agents),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                print(f"Could not clean up agent resource: {result}")
@@ -1,14 +1,22 @@
-from semantic_kernel import Kernel
 import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+#imported first, so STARTUP_PROFILE=1 sees every import below
+from helpers.startup_profile import profiler
+
+from semantic_kernel import Kernel
 import asyncio
-from semantic_kernel.connectors.ai.open_ai import AzureChatCompletion
 from dotenv import load_dotenv
-from semantic_kernel.planners import SequentialPlanner
 from typing import Annotated
 from semantic_kernel.functions.kernel_function_decorator import kernel_function
-from azure.ai.projects import AIProjectClient
-from azure.identity import DefaultAzureCredential
-from azure.ai.projects.models import BingGroundingTool
+import argparse
+import atexit
+import functools
+import time
+from contextlib import asynccontextmanager
+from agent_registry import AsyncAgentRegistry
+from helpers.streaming import streaming_function
 
 load_dotenv()
 azure_openai_key = os.getenv("AZURE_OPENAI_API_KEY")
@@ -17,51 +25,42 @@ azure_openai_deployment_name = os.getenv("AZURE_OPENAI_CHAT_COMPLETION_MODEL")
 ai_project_connection_string = os.getenv("AI_PROJECT_CONNECTION_STRING")
 bing_connection_name = os.getenv("BING_CONNECTION_NAME")
 
-project_client = AIProjectClient.from_connection_string(
-        credential=DefaultAzureCredential(),
-        conn_str=ai_project_connection_string
-        )
+#the Azure SDKs, the clients, the kernel and the planner are created on first use instead of at import,
+#a worker that never reaches them does not pay for them
+
+
+def bing_grounding_tool(connection_id: str):
+    from azure.ai.projects.models import BingGroundingTool
+    
+    return BingGroundingTool(connection_id=connection_id)
+
+NEWS_REPORTER_INSTRUCTIONS = """You are a helpful assistant that is meant to prepare a script for a news reporter based on the latest information for a specific topic both of which you will be given.
+            The news channel is named MSinghTV and the news reporter is named John. You will be given the topic and the latest information for that topic. Prepare a script for the news reporter John based on the latest information for the topic."""
+
 
-class Agents:
+class AsyncAgents:
+    """
+    async version of the Agents plugin built on the async AIProjectClient, so an agent run is awaited
+    instead of blocking the event loop while the kernel/planner is running
+    """
+    
+    def __init__(self, registry: AsyncAgentRegistry):
+        self.registry = registry
+    
     @kernel_function(
         description="This function will be used to use an azure ai agent with web grounding capability using Bing Search API",
         name="WebSearchAgent"
     )
-    def web_search_agent(
+    async def web_search_agent(
         self,
         query: Annotated[str, "The user query for which the contextual information needs to be fetched from the web"]
         
     ) -> Annotated[str, "The response from the web search agent"]:
-        bing_connection = project_client.connections.get(connection_name=bing_connection_name)
-        conn_id = bing_connection.id
-        
-        bing = BingGroundingTool(connection_id=conn_id)
-        
-        final_response: str = ""
-        
-        agent = project_client.agents.create_agent(
-        model=azure_openai_deployment_name,
-            name="bing-assistant",
-            instructions="You are a helpful assistant",
-            tools=bing.definitions,
-            headers={"x-ms-enable-preview": "true"},
-        )
-        thread = project_client.agents.create_thread()
+        agent = await self._web_search_agent()
             
-        message = project_client.agents.create_message(
-                thread_id=thread.id,
-                role="user",
-                content=query,
-            )
-            
-        run = project_client.agents.create_and_process_run(thread_id=thread.id, assistant_id=agent.id)
-            
-        messages = project_client.agents.list_messages(thread_id=thread.id)
-            
-        print(messages.data[0].content[0].text.value)
-            
-        final_response = messages.data[0].content[0].text.value
+        final_response = await self.registry.run(agent, query)
             
+        print(final_response)
             
         return final_response
     
@@ -69,86 +68,236 @@ class Agents:
        description="This function will use an azure ai agent to prepare a script for a news reporter based on latest information for a specific topic",
          name="NewsReporterAgent"
    )
-    def news_reporter_agent(
+    async def news_reporter_agent(
         self,
         topic: Annotated[str, "The topic for which the latest information/news has been fetched"],
         latest_news: Annotated[str,"The latest information for a specific topic"]
     ) -> Annotated[str, "the response from the NewsReporterAgent which is the script for a news reporter"]:
-        final_response: str = ""
-        
-        agent = project_client.agents.create_agent(
-        model=azure_openai_deployment_name,
-        name="news-reporter",
-        instructions="""You are a helpful assistant that is meant to prepare a script for a news reporter based on the latest information for a specific topic both of which you will be given.
-            The news channel is named MSinghTV and the news reporter is named John. You will be given the topic and the latest information for that topic. Prepare a script for the news reporter John based on the latest information for the topic.""",
-            headers={"x-ms-enable-preview": "true"},
-        )
-        thread = project_client.agents.create_thread()
-            
-        message = project_client.agents.create_message(
-                thread_id=thread.id,
-                role="user",
-                content=f"""The topic is {topic} and the latest information is {latest_news}""",
-            )
+        agent = await self._news_reporter_agent()
             
-        run = project_client.agents.create_and_process_run(thread_id=thread.id, assistant_id=agent.id)
-            
-        messages = project_client.agents.list_messages(thread_id=thread.id)
-            
-        print(messages.data[0].content[0].text.value)
-            
-        final_response = messages.data[0].content[0].text.value
+        final_response = await self.registry.run(agent, f"""The topic is {topic} and the latest information is {latest_news}""")
             
+        print(final_response)
             
         return final_response
-            
+    
+    async def web_search_agent_stream(self, query: str):
+        """streaming implementation of WebSearchAgent, yields the answer while the agent is writing it"""
+        agent = await self._web_search_agent()
+        async for text in self.registry.run_stream(agent, query):
+            yield text
+    
+    async def news_reporter_agent_stream(self, topic: str, latest_news: str):
+        """streaming implementation of NewsReporterAgent"""
+        agent = await self._news_reporter_agent()
+        async for text in self.registry.run_stream(agent, f"""The topic is {topic} and the latest information is {latest_news}"""):
+            yield text
+    
+    async def _web_search_agent(self):
+        bing_connection = await self.registry.get_connection(bing_connection_name)
         
+        bing = bing_grounding_tool(bing_connection.id)
+        
+        return await self.registry.get_agent(
+            model=azure_openai_deployment_name,
+            name="bing-assistant",
+            instructions="You are a helpful assistant",
+            tools=bing.definitions,
+            headers={"x-ms-enable-preview": "true"},
+        )
     
+    async def _news_reporter_agent(self):
+        return await self.registry.get_agent(
+            model=azure_openai_deployment_name,
+            name="news-reporter",
+            instructions=NEWS_REPORTER_INSTRUCTIONS,
+            headers={"x-ms-enable-preview": "true"},
+        )
     
+    def functions(self) -> list:
+        """the kernel functions of the plugin; kernel.invoke_stream on them streams the agent run deltas"""
+        return [
+            streaming_function(self.web_search_agent, self.web_search_agent_stream),
+            streaming_function(self.news_reporter_agent, self.news_reporter_agent_stream),
+        ]
+
+
+@functools.cache
+def get_kernel() -> Kernel:
+    kernel = Kernel()
     
+    if os.getenv("MOCK_CHAT_COMPLETION"):
+        #offline run of the planner against the local stand-in service, see helpers/mock_chat_completion.py;
+        #the agents still run on the Azure AI Agent Service
+        from helpers.mock_chat_completion import MockChatCompletion
         
+        kernel.add_service(MockChatCompletion.from_env(service_id))
+    else:
+        from semantic_kernel.connectors.ai.open_ai import AzureChatCompletion
+        
+        with profiler.measure("AzureChatCompletion"):
+            kernel.add_service(
+                AzureChatCompletion(service_id=service_id,
+                                    api_key=azure_openai_key,
+                                    deployment_name=azure_openai_deployment_name,
+                                    endpoint = azure_openai_endpoint
+                )
+            )
+    
+    #every agent call, planner call and model request as spans and histograms, see helpers/instrumentation.py
+    get_instrumentation().instrument(kernel)
+    #concurrent calls for the same topic share one agent run instead of starting one each
+    get_single_flight().register(kernel)
+    return kernel
 
-kernel = Kernel()
 
-service_id = "default"
+@functools.cache
+def get_single_flight():
+    from helpers.single_flight import SingleFlight, normalised_key
+    
+    return SingleFlight(functions={
+        "Agents-WebSearchAgent": normalised_key("query"),
+        "Agents-NewsReporterAgent": normalised_key("topic", "latest_news"),
+    })
 
 
-kernel.add_service(
-    AzureChatCompletion(service_id=service_id,
-                        api_key=azure_openai_key,
-                        deployment_name=azure_openai_deployment_name,
-                        endpoint = azure_openai_endpoint
+@functools.cache
+def get_instrumentation():
+    from helpers.instrumentation import KernelInstrumentation
+    
+    instrumentation = KernelInstrumentation.from_env(
+        default_path=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", ".telemetry", "spans.jsonl")
     )
-)
+    atexit.register(instrumentation.shutdown)
+    return instrumentation
 
 
-planner = SequentialPlanner(
-    kernel,
-    service_id
-)
+@functools.cache
+def get_planner():
+    from semantic_kernel.planners import SequentialPlanner
+    from helpers.plan_cache import PlanCache, CachedSequentialPlanner
+    
+    #"latest news for <topic>" goals share one cached plan, the topic is bound into the cached steps
+    return CachedSequentialPlanner(
+        SequentialPlanner(get_kernel(), service_id),
+        get_kernel(),
+        PlanCache(
+            path=os.getenv("PLAN_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", ".plan_cache")),
+            variable_patterns=[r"latest news for ([\w ]+?)\??$"]
+        )
+    )
 
-agents_plugin = kernel.add_plugin(Agents(), "Agents")
 
-goal = f"prepare a news script for John on latest news for India?"
-        
-async def call_planner():
-    return await planner.create_plan(goal)
+service_id = "default"
 
-sequential_plan = asyncio.run(call_planner())
 
-print("The plan's steps are:")
-for step in sequential_plan._steps:
-    print(
-        f"- {step.description.replace('.', '') if step.description else 'No description'} using {step.metadata.fully_qualified_name} with parameters: {step.parameters}"
-    )
+@asynccontextmanager
+async def async_agents_plugin(max_idle_threads: int = 8):
+    """adds the AsyncAgents plugin to the kernel for the lifetime of the async project client"""
+    from azure.ai.projects.aio import AIProjectClient as AsyncAIProjectClient
+    from azure.identity.aio import DefaultAzureCredential as AsyncDefaultAzureCredential
+    
+    with profiler.measure("async AIProjectClient"):
+        credential = AsyncDefaultAzureCredential()
+        async_project_client = AsyncAIProjectClient.from_connection_string(
+            credential=credential,
+            conn_str=ai_project_connection_string
+        )
+    
+    async with credential, async_project_client:
+        async_registry = AsyncAgentRegistry(async_project_client, max_idle_threads=max_idle_threads)
+        kernel = get_kernel()
+        try:
+            yield kernel.add_functions("Agents", AsyncAgents(async_registry).functions())
+        finally:
+            #the cached kernel outlives the client, its functions must not be called once the client is closed
+            kernel.plugins.pop("Agents", None)
+            print(f"Agent registry stats: {async_registry.report()}")
+            await async_registry.close()
 
-async def generate_answer():
-    return await sequential_plan.invoke(kernel)
 
-result = asyncio.run(generate_answer())
+async def run_batch(topics: list[str], max_concurrency: int = 8) -> dict:
+    """
+    prepares a news script for every topic; web search and script generation for up to
+    max_concurrency topics run at the same time. A failed topic maps to its exception.
+    """
+    async with async_agents_plugin(max_idle_threads=max_concurrency) as agents_plugin:
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        kernel = get_kernel()
+        
+        async def prepare_script(topic: str) -> str:
+            async with semaphore:
+                latest_news = await kernel.invoke(agents_plugin["WebSearchAgent"], query=f"latest news for {topic}")
+                script = await kernel.invoke(agents_plugin["NewsReporterAgent"], topic=topic, latest_news=str(latest_news))
+                return str(script)
+        
+        scripts = await asyncio.gather(*(prepare_script(topic) for topic in topics), return_exceptions=True)
+    
+    print(get_instrumentation().format_summary())
+    print(f"Coalesced calls: {get_single_flight().report()}")
+    
+    return dict(zip(topics, scripts))
 
-print(result)
 
+async def main(goal: str, stream: bool = False):
+    from helpers.plan_executor import ParallelPlanExecutor
+    
+    kernel = get_kernel()
+    planner = get_planner()
+    
+    async with async_agents_plugin():
+        sequential_plan = await planner.create_plan(goal)
+        
+        print(f"Plan cache: {planner.cache.stats}")
+
+        print("The plan's steps are:")
+        for step in sequential_plan._steps:
+            print(
+                f"- {step.description.replace('.', '') if step.description else 'No description'} using {step.metadata.fully_qualified_name} with parameters: {step.parameters}"
+            )
+
+        executor = ParallelPlanExecutor(kernel)
+        
+        if stream:
+            #every step's output is printed while the agents are still writing it
+            start = time.perf_counter()
+            first_chunk = None
+            current_step = None
+            async for step_index, text in executor.invoke_stream(sequential_plan):
+                if first_chunk is None:
+                    first_chunk = time.perf_counter() - start
+                if step_index != current_step:
+                    current_step = step_index
+                    print(f"\n--- {sequential_plan._steps[step_index].metadata.fully_qualified_name} ---")
+                print(text, end="", flush=True)
+            print(f"\n\ntime to first token: {first_chunk or 0:.2f}s, total: {time.perf_counter() - start:.2f}s")
+            return
 
+        #independent steps run concurrently, steps that chain on each other's output still run in order
+        result = await executor.invoke(sequential_plan)
 
+    print(ParallelPlanExecutor.format_timings(result))
+    print(get_instrumentation().format_summary())
+    print(result)
 
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="News reporter agentic system")
+    parser.add_argument("--goal", default="prepare a news script for John on latest news for India?")
+    parser.add_argument("--topics", help="file with one topic per line; prepares a news script for every topic concurrently")
+    parser.add_argument("--concurrency", type=int, default=8, help="how many topics are processed at the same time")
+    parser.add_argument("--stream", action="store_true", help="print the output of every step while it is generated")
+    args = parser.parse_args()
+    
+    if args.topics:
+        with open(args.topics, "r") as file:
+            topics = [line.strip() for line in file if line.strip()]
+        
+        scripts = asyncio.run(run_batch(topics, max_concurrency=args.concurrency))
+        
+        for topic, script in scripts.items():
+            print("-----------------")
+            print(f"{topic}:\n{script}")
+    else:
+        asyncio.run(main(args.goal, stream=args.stream))